@@ -1,15 +1,34 @@
 
 import json
 import os
+import re
+import shutil
+import hashlib
+import argparse
 import numpy as np
-from sentence_transformers import SentenceTransformer
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from embedders import EMBEDDER_BACKENDS, DEFAULT_BACKEND, load_embedder
 
 # Configuration
 DATA_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "phase_1_data_scraping", "final_courses_data.json"))
 EMBEDDING_DIR = os.path.dirname(__file__)
 CHUNKS_FILE = os.path.join(EMBEDDING_DIR, "chunks.json")
 EMBEDDINGS_FILE = os.path.join(EMBEDDING_DIR, "embeddings.npy")
+SQL_FILE = os.path.join(EMBEDDING_DIR, "embeddings.sql")
 MODEL_NAME = "all-MiniLM-L6-v2"
+# Texts per model call; batches are cut from length-sorted windows so padding stays small
+ENCODE_BATCH_SIZE = 64
+SORT_WINDOW_BATCHES = 16
+# "chars": SimpleTextSplitter (1000/200 characters); "tokens": TokenTextSplitter sized to the model
+SPLITTER_MODE = "chars"
+# Tokens shared by consecutive chunks in token mode
+TOKEN_OVERLAP = 32
+# Processes chunking courses in parallel (1 chunks inline)
+CHUNK_WORKERS = os.cpu_count() or 1
+# Courses submitted to the pool ahead of the consumer, per worker
+COURSES_IN_FLIGHT_PER_WORKER = 4
 
 class SimpleTextSplitter:
     def __init__(self, chunk_size=1000, chunk_overlap=200):
@@ -64,6 +83,224 @@ class SimpleTextSplitter:
 
         return chunks
 
+class TokenTextSplitter:
+    """
+    Splits by the embedding model's own tokens, so no chunk is silently truncated at encode
+    time. Each document is tokenized once; chunk boundaries are chosen on the token offsets
+    (preferring line breaks, then word starts) and every chunk is a single slice of the
+    original text. A chunk never holds more than max_tokens tokens.
+    """
+    def __init__(self, tokenizer, max_tokens, chunk_overlap=TOKEN_OVERLAP):
+        if chunk_overlap >= max_tokens:
+            raise ValueError("chunk_overlap must be smaller than max_tokens")
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.chunk_overlap = chunk_overlap
+
+    @classmethod
+    def from_model(cls, model, chunk_overlap=TOKEN_OVERLAP):
+        """
+        Sized for a loaded SentenceTransformer: max_seq_length minus the special tokens
+        ([CLS]/[SEP]) the model adds around every input.
+        """
+        max_tokens = model.max_seq_length - model.tokenizer.num_special_tokens_to_add(pair=False)
+        return cls(model.tokenizer, max_tokens, chunk_overlap=chunk_overlap)
+
+    def split_text(self, text):
+        if not text:
+            return []
+
+        offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                                 return_attention_mask=False, return_token_type_ids=False,
+                                 verbose=False)["offset_mapping"]
+        if not offsets:
+            return []
+        offsets = np.asarray(offsets, dtype=np.int64)
+        starts, ends = offsets[:, 0], offsets[:, 1]
+        num_tokens = len(offsets)
+
+        # Token indices where a chunk may begin: after whitespace (word starts) and after a newline
+        gap = starts[1:] > ends[:-1]
+        word_starts = np.concatenate(([0], np.nonzero(gap)[0] + 1))
+        newlines = np.array([match.start() for match in re.finditer("\n", text)], dtype=np.int64)
+        has_newline = np.searchsorted(newlines, ends[:-1]) < np.searchsorted(newlines, starts[1:])
+        line_starts = np.nonzero(has_newline)[0] + 1
+
+        chunks = []
+        start = 0
+        while start < num_tokens:
+            end = min(start + self.max_tokens, num_tokens)
+            if end < num_tokens:
+                # Last line break in the second half of the window, else the last word start
+                k = np.searchsorted(line_starts, end, side="right") - 1
+                if k >= 0 and line_starts[k] > start + self.max_tokens // 2:
+                    end = int(line_starts[k])
+                else:
+                    k = np.searchsorted(word_starts, end, side="right") - 1
+                    if word_starts[k] > start:
+                        end = int(word_starts[k])
+            chunks.append(text[starts[start]:ends[end - 1]])
+            if end >= num_tokens:
+                break
+
+            # Step back by the overlap, to the next word start so no word is cut in half
+            k = np.searchsorted(word_starts, end - self.chunk_overlap)
+            next_start = int(word_starts[k]) if k < len(word_starts) else end
+            start = next_start if start < next_start <= end else end
+
+        return chunks
+
+def chunk_hash(chunk):
+    """
+    Content hash of a chunk (text + metadata). Unchanged chunks keep their hash across runs,
+    so their embeddings can be reused instead of re-encoded.
+    """
+    payload = chunk["text"] + "\0" + json.dumps(chunk["metadata"], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def embedder_id(backend=DEFAULT_BACKEND, model_name=MODEL_NAME):
+    """
+    Identifies the embedder behind a set of vectors. Vectors with different ids are not comparable.
+    """
+    return f"{backend}:{model_name}"
+
+def manifest_path(embeddings_file=EMBEDDINGS_FILE):
+    # embeddings.manifest.json records which embedder wrote embeddings.npy
+    return os.path.splitext(embeddings_file)[0] + ".manifest.json"
+
+def saved_embedder(embeddings_file=EMBEDDINGS_FILE):
+    """
+    Embedder id recorded next to embeddings_file. Artifacts from before the manifest existed were
+    always written by the default torch model.
+    """
+    path = manifest_path(embeddings_file)
+    if not os.path.exists(path):
+        return embedder_id()
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)["embedder"]
+
+class JsonStream:
+    """
+    Decodes a JSON document value by value from a text file read read_size characters at a
+    time, so arrays of any length can be walked without holding the whole file.
+    """
+    def __init__(self, f, read_size=1 << 16):
+        self.f = f
+        self.read_size = read_size
+        self.decoder = json.JSONDecoder()
+        self.buffer, self.position, self.eof = "", 0, False
+
+    def _read(self):
+        if self.eof:
+            return False
+        data = self.f.read(self.read_size)
+        self.buffer = self.buffer[self.position:] + data
+        self.position = 0
+        self.eof = not data
+        return not self.eof
+
+    def peek(self):
+        """
+        Next non-whitespace character, or "" at the end of the file.
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\r\n":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._read():
+                return ""
+
+    def take(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in JSON, found {found or 'end of file'!r}")
+        self.position += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+                # A number that ends with the buffer may continue in the next read
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read()
+
+    def items(self):
+        """
+        Yields the elements of the array at the current position one at a time.
+        """
+        self.take("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            if separator == "]":
+                self.position += 1
+                return
+            if separator != ",":
+                raise ValueError("JSON array ends before the closing ]" if not separator
+                                 else f"Expected ',' or ']' in JSON array, found {separator!r}")
+            self.position += 1
+
+    def keys(self):
+        """
+        Yields the keys of the object at the current position. After each key the stream is at
+        its value, which the caller must consume (value() or items()) before asking for the next.
+        """
+        self.take("{")
+        while self.peek() != "}":
+            key = self.value()
+            self.take(":")
+            yield key
+            if self.peek() == ",":
+                self.position += 1
+        self.position += 1
+
+def iter_saved_chunks(chunks_file=CHUNKS_FILE, read_size=1 << 16):
+    """
+    Yields the chunks of a chunks.json array one at a time, reading read_size characters at a
+    time, so memory does not grow with the file.
+    """
+    with open(chunks_file, 'r', encoding='utf-8') as f:
+        stream = JsonStream(f, read_size)
+        if stream.peek() != "[":
+            raise ValueError(f"{chunks_file} does not hold a JSON array")
+        yield from stream.items()
+
+def load_previous_embeddings(chunks_file=CHUNKS_FILE, embeddings_file=EMBEDDINGS_FILE, embedder=None):
+    """
+    Returns ({hash: row}, matrix) from the last run's chunks.json / embeddings.npy, or ({}, None)
+    if unavailable or written by another embedder than embedder (an embedder_id). chunks.json is
+    streamed and only the hashes are kept; the matrix is memory-mapped, so only reused rows are
+    ever read.
+    """
+    if not (os.path.exists(chunks_file) and os.path.exists(embeddings_file)):
+        return {}, None
+    try:
+        if embedder is not None and saved_embedder(embeddings_file) != embedder:
+            print(f"Previous embeddings come from {saved_embedder(embeddings_file)}, not {embedder}; re-encoding everything.")
+            return {}, None
+        previous_embeddings = np.load(embeddings_file, mmap_mode='r')
+        previous_rows = {}
+        rows = 0
+        for chunk in iter_saved_chunks(chunks_file):
+            previous_rows[chunk.get("hash") or chunk_hash(chunk)] = rows
+            rows += 1
+    except Exception as e:
+        print(f"Warning: could not read previous embeddings ({e}), re-encoding everything.")
+        return {}, None
+    if rows != len(previous_embeddings):
+        return {}, None
+    return previous_rows, previous_embeddings
+
 def load_data():
     if not os.path.exists(DATA_FILE):
         print(f"Error: Data file not found at {DATA_FILE}")
@@ -71,251 +308,445 @@ def load_data():
     with open(DATA_FILE, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-def create_chunks(data):
-    s = SimpleTextSplitter(chunk_size=1000, chunk_overlap=200)
-    all_chunks = []
+def iter_courses(data_file=DATA_FILE, read_size=1 << 16):
+    """
+    Yields course records one at a time, so memory does not grow with the catalog. JSON Lines
+    files hold one course object per line; a .json file (the Phase 1 output) is an object whose
+    "courses" array is walked element by element.
+    """
+    if not os.path.exists(data_file):
+        print(f"Error: Data file not found at {data_file}")
+        return
+    if data_file.endswith(".jsonl"):
+        with open(data_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(data_file, 'r', encoding='utf-8') as f:
+        stream = JsonStream(f, read_size)
+        for key in stream.keys():
+            if key == "courses" and stream.peek() == "[":
+                yield from stream.items()
+                return
+            stream.value() # Other top-level values are skipped
+    print("Error: 'courses' key missing or not a list")
+
+# Splitter used by chunk_course in pool workers, installed once per process by the initializer
+_worker_splitter = None
+
+def _set_worker_splitter(splitter):
+    global _worker_splitter
+    _worker_splitter = splitter
+
+def chunk_course(course, splitter=None):
+    """
+    All chunks of one course. Pure function of the course record, so courses can be chunked
+    in separate processes.
+    """
+    s = splitter or _worker_splitter or SimpleTextSplitter(chunk_size=1000, chunk_overlap=200)
+    chunks = []
     
-    # Check if 'courses' exists
-    if not isinstance(data.get("courses"), list):
-        print("Error: 'courses' key missing or not a list")
-        return []
+    course_name = course.get("course_name", "Unknown Course")
+    course_url = course.get("course_url", "")
+    
+    # Process cohorts
+    cohorts = course.get("cohorts", [])
+    if not cohorts:
+        # Fallback if no cohorts? Just process course level info if any?
+        # Schema imposes cohorts.
+        pass
 
-    for course in data.get("courses", []):
-        course_name = course.get("course_name", "Unknown Course")
-        course_url = course.get("course_url", "")
+    for cohort in cohorts:
+        cohort_label = cohort.get("cohort_label", "")
+        details = cohort.get("cohort_details", {})
         
-        # Process cohorts
-        cohorts = course.get("cohorts", [])
-        if not cohorts:
-            # Fallback if no cohorts? Just process course level info if any?
-            # Schema imposes cohorts.
-            pass
-
-        for cohort in cohorts:
-            cohort_label = cohort.get("cohort_label", "")
-            details = cohort.get("cohort_details", {})
-            
-            # 1. Course Overview & Logistics
-            overview_lines = [f"Course: {course_name}"]
-            if cohort_label:
-                overview_lines.append(f"Cohort: {cohort_label}")
+        # 1. Course Overview & Logistics
+        overview_lines = [f"Course: {course_name}"]
+        if cohort_label:
+            overview_lines.append(f"Cohort: {cohort_label}")
+        
+        if "live_class_duration" in details: overview_lines.append(f"Duration: {details['live_class_duration']}")
+        if "fellowship_timeline" in details: overview_lines.append(f"Timeline: {details['fellowship_timeline']}")
+        if "mentorship" in details: overview_lines.append(f"Mentorship: {details['mentorship']}")
+        if "placement_support" in details: overview_lines.append(f"Placement Support: {details['placement_support']}")
+        if "cost" in details:
+             cost = details['cost']
+             overview_lines.append(f"Cost: {cost.get('amount', '')} {cost.get('currency', '')}")
+        
+        if "salary_ranges" in details:
+            salary = details['salary_ranges']
+            min_lpa = salary.get('min_lpa', '')
+            max_lpa = salary.get('max_lpa', '')
+            if min_lpa and max_lpa:
+                overview_lines.append(f"Expected Salary Range: {min_lpa}-{max_lpa} LPA")
+        
+        overview_text = "\n".join(overview_lines)
+        
+        for chunk_text in s.split_text(overview_text):
+            chunks.append({
+                "text": chunk_text,
+                "metadata": {"source": course_url, "course": course_name, "type": "overview"}
+            })
+        
+        # 2. Week-wise Curriculum (Grouped)
+        curriculum_lines = [f"Course: {course_name} - Curriculum"]
+        for week in details.get("weekwise_course_details", []):
+            week_num = week.get("week")
+            topics = ", ".join(week.get("topics", []))
+            outcomes = ", ".join(week.get("learning_outcomes", []))
+            curriculum_lines.append(f"Week {week_num}: Topics: {topics}. Outcomes: {outcomes}.")
+        
+        curriculum_text = "\n".join(curriculum_lines)
+
+        for chunk_text in s.split_text(curriculum_text):
+            chunks.append({
+                "text": chunk_text,
+                "metadata": {"source": course_url, "course": course_name, "type": "curriculum"}
+            })
+
+        # 3. Reviews (Individual)
+        for review in details.get("reviews", []):
+            review_lines = [f"Course: {course_name} Review"]
+            review_lines.append(f"Reviewer: {review.get('reviewer_name', 'Anonymous')}")
+            review_lines.append(f"Rating: {review.get('rating', '')}")
+            review_lines.append(f"Review: {review.get('review_text', '')}")
+            review_text = "\n".join(review_lines)
             
-            if "live_class_duration" in details: overview_lines.append(f"Duration: {details['live_class_duration']}")
-            if "fellowship_timeline" in details: overview_lines.append(f"Timeline: {details['fellowship_timeline']}")
-            if "mentorship" in details: overview_lines.append(f"Mentorship: {details['mentorship']}")
-            if "placement_support" in details: overview_lines.append(f"Placement Support: {details['placement_support']}")
-            if "cost" in details:
-                 cost = details['cost']
-                 overview_lines.append(f"Cost: {cost.get('amount', '')} {cost.get('currency', '')}")
+            for chunk_text in s.split_text(review_text):
+                chunks.append({
+                    "text": chunk_text,
+                    "metadata": {"source": course_url, "course": course_name, "type": "review"}
+                })
+
+        # 4. FAQs (Individual)
+        for faq in details.get("frequently_asked_questions", []):
+            faq_lines = [f"Course: {course_name} FAQ"]
+            faq_lines.append(f"Q: {faq.get('question', '')}")
+            faq_lines.append(f"A: {faq.get('answer', '')}")
+            faq_text = "\n".join(faq_lines)
             
-            if "salary_ranges" in details:
-                salary = details['salary_ranges']
-                min_lpa = salary.get('min_lpa', '')
-                max_lpa = salary.get('max_lpa', '')
-                if min_lpa and max_lpa:
-                    overview_lines.append(f"Expected Salary Range: {min_lpa}-{max_lpa} LPA")
+            for chunk_text in s.split_text(faq_text):
+                chunks.append({
+                    "text": chunk_text,
+                    "metadata": {"source": course_url, "course": course_name, "type": "faq"}
+                })
             
-            overview_text = "\n".join(overview_lines)
+        # 5. Success Stories (Individual)
+        for story in details.get("success_stories", []):
+            story_lines = [f"Course: {course_name} Success Story"]
+            story_lines.append(f"Name: {story.get('name', '')}")
+            story_lines.append(f"Background: {story.get('background', '')}")
+            story_lines.append(f"Outcome: {story.get('outcome', '')}")
+            story_text = "\n".join(story_lines)
             
-            for chunk_text in s.split_text(overview_text):
-                all_chunks.append({
+            for chunk_text in s.split_text(story_text):
+                chunks.append({
                     "text": chunk_text,
-                    "metadata": {"source": course_url, "course": course_name, "type": "overview"}
+                    "metadata": {"source": course_url, "course": course_name, "type": "success_story"}
                 })
+        
+        # 6. Instructors (Grouped)
+        instructors = details.get("instructors", [])
+        if instructors:
+            instructor_lines = [f"Course: {course_name} - Instructors"]
+            for instructor in instructors:
+                name = instructor.get("name", "")
+                designation = instructor.get("designation", "")
+                experience = instructor.get("experience", "")
+                instructor_lines.append(f"{name} - {designation}, {experience}")
             
-            # 2. Week-wise Curriculum (Grouped)
-            curriculum_lines = [f"Course: {course_name} - Curriculum"]
-            for week in details.get("weekwise_course_details", []):
-                week_num = week.get("week")
-                topics = ", ".join(week.get("topics", []))
-                outcomes = ", ".join(week.get("learning_outcomes", []))
-                curriculum_lines.append(f"Week {week_num}: Topics: {topics}. Outcomes: {outcomes}.")
+            instructor_text = "\n".join(instructor_lines)
+            for chunk_text in s.split_text(instructor_text):
+                chunks.append({
+                    "text": chunk_text,
+                    "metadata": {"source": course_url, "course": course_name, "type": "instructors"}
+                })
+        
+        # 7. Mentors (Grouped)
+        mentors = details.get("mentors", [])
+        if mentors:
+            mentor_lines = [f"Course: {course_name} - Mentors"]
+            for mentor in mentors:
+                name = mentor.get("name", "")
+                expertise = mentor.get("expertise", "")
+                experience = mentor.get("experience", "")
+                mentor_lines.append(f"{name} - {expertise}, {experience}")
             
-            curriculum_text = "\n".join(curriculum_lines)
-
-            for chunk_text in s.split_text(curriculum_text):
-                all_chunks.append({
+            mentor_text = "\n".join(mentor_lines)
+            for chunk_text in s.split_text(mentor_text):
+                chunks.append({
+                    "text": chunk_text,
+                    "metadata": {"source": course_url, "course": course_name, "type": "mentors"}
+                })
+        
+        # 8. Tools (Grouped)
+        tools = details.get("tools_you_learn", [])
+        if tools:
+            tools_text = f"Course: {course_name} - Tools You Learn\n" + ", ".join(tools)
+            for chunk_text in s.split_text(tools_text):
+                chunks.append({
                     "text": chunk_text,
-                    "metadata": {"source": course_url, "course": course_name, "type": "curriculum"}
+                    "metadata": {"source": course_url, "course": course_name, "type": "tools"}
                 })
 
-            # 3. Reviews (Individual)
-            for review in details.get("reviews", []):
-                review_lines = [f"Course: {course_name} Review"]
-                review_lines.append(f"Reviewer: {review.get('reviewer_name', 'Anonymous')}")
-                review_lines.append(f"Rating: {review.get('rating', '')}")
-                review_lines.append(f"Review: {review.get('review_text', '')}")
-                review_text = "\n".join(review_lines)
-                
-                for chunk_text in s.split_text(review_text):
-                    all_chunks.append({
-                        "text": chunk_text,
-                        "metadata": {"source": course_url, "course": course_name, "type": "review"}
-                    })
-
-            # 4. FAQs (Individual)
-            for faq in details.get("frequently_asked_questions", []):
-                faq_lines = [f"Course: {course_name} FAQ"]
-                faq_lines.append(f"Q: {faq.get('question', '')}")
-                faq_lines.append(f"A: {faq.get('answer', '')}")
-                faq_text = "\n".join(faq_lines)
-                
-                for chunk_text in s.split_text(faq_text):
-                    all_chunks.append({
-                        "text": chunk_text,
-                        "metadata": {"source": course_url, "course": course_name, "type": "faq"}
-                    })
-                
-            # 5. Success Stories (Individual)
-            for story in details.get("success_stories", []):
-                story_lines = [f"Course: {course_name} Success Story"]
-                story_lines.append(f"Name: {story.get('name', '')}")
-                story_lines.append(f"Background: {story.get('background', '')}")
-                story_lines.append(f"Outcome: {story.get('outcome', '')}")
-                story_text = "\n".join(story_lines)
-                
-                for chunk_text in s.split_text(story_text):
-                    all_chunks.append({
-                        "text": chunk_text,
-                        "metadata": {"source": course_url, "course": course_name, "type": "success_story"}
-                    })
-            
-            # 6. Instructors (Grouped)
-            instructors = details.get("instructors", [])
-            if instructors:
-                instructor_lines = [f"Course: {course_name} - Instructors"]
-                for instructor in instructors:
-                    name = instructor.get("name", "")
-                    designation = instructor.get("designation", "")
-                    experience = instructor.get("experience", "")
-                    instructor_lines.append(f"{name} - {designation}, {experience}")
-                
-                instructor_text = "\n".join(instructor_lines)
-                for chunk_text in s.split_text(instructor_text):
-                    all_chunks.append({
-                        "text": chunk_text,
-                        "metadata": {"source": course_url, "course": course_name, "type": "instructors"}
-                    })
-            
-            # 7. Mentors (Grouped)
-            mentors = details.get("mentors", [])
-            if mentors:
-                mentor_lines = [f"Course: {course_name} - Mentors"]
-                for mentor in mentors:
-                    name = mentor.get("name", "")
-                    expertise = mentor.get("expertise", "")
-                    experience = mentor.get("experience", "")
-                    mentor_lines.append(f"{name} - {expertise}, {experience}")
-                
-                mentor_text = "\n".join(mentor_lines)
-                for chunk_text in s.split_text(mentor_text):
-                    all_chunks.append({
-                        "text": chunk_text,
-                        "metadata": {"source": course_url, "course": course_name, "type": "mentors"}
-                    })
-            
-            # 8. Tools (Grouped)
-            tools = details.get("tools_you_learn", [])
-            if tools:
-                tools_text = f"Course: {course_name} - Tools You Learn\n" + ", ".join(tools)
-                for chunk_text in s.split_text(tools_text):
-                    all_chunks.append({
-                        "text": chunk_text,
-                        "metadata": {"source": course_url, "course": course_name, "type": "tools"}
-                    })
+    return chunks
 
+def create_chunks(data, splitter=None):
+    # Check if 'courses' exists
+    if not isinstance(data.get("courses"), list):
+        print("Error: 'courses' key missing or not a list")
+        return []
+
+    all_chunks = []
+    for course in data.get("courses", []):
+        all_chunks.extend(chunk_course(course, splitter))
     return all_chunks
 
-def main():
-    print("Loading data...")
-    data = load_data()
-    if not data:
+def iter_chunks(courses, workers=CHUNK_WORKERS, splitter=None):
+    """
+    Chunks courses in a process pool and yields the chunks in course order. Only a bounded
+    number of courses is submitted ahead of the consumer, so a large catalog is never held
+    in memory at once. splitter (default: SimpleTextSplitter) is sent to each worker once.
+    """
+    if workers <= 1:
+        for course in courses:
+            yield from chunk_course(course, splitter)
         return
 
-    print("Creating text chunks...")
-    chunks = create_chunks(data)
-    print(f"Created {len(chunks)} chunks.")
-    if len(chunks) == 0:
-        print("Warning: No chunks created. Check data file content.")
-        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_set_worker_splitter,
+                             initargs=(splitter,)) as executor:
+        pending = deque()
+        for course in courses:
+            pending.append(executor.submit(chunk_course, course))
+            if len(pending) >= workers * COURSES_IN_FLIGHT_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+def iter_batches(chunks, batch_size=ENCODE_BATCH_SIZE, window_batches=SORT_WINDOW_BATCHES):
+    """
+    Groups a chunk stream into fixed-size batches of similar text length. Chunks are buffered
+    window_batches batches at a time and sorted by length inside the window, which keeps
+    padding per model call low while memory stays bounded by the window.
+    """
+    window = []
+    for chunk in chunks:
+        window.append(chunk)
+        if len(window) >= batch_size * window_batches:
+            yield from _sorted_batches(window, batch_size)
+            window = []
+    if window:
+        yield from _sorted_batches(window, batch_size)
+
+def _sorted_batches(window, batch_size):
+    window.sort(key=lambda chunk: len(chunk["text"]))
+    for start in range(0, len(window), batch_size):
+        yield window[start:start + batch_size]
+
+class ArtifactWriter:
+    """
+    Appends chunks and vectors to chunks.json / embeddings.npy as each batch completes.
+    Both are written to .tmp files; close() prepends the .npy header (the row count is only
+    known at the end) and swaps the finished files into place, so a failed run leaves the
+    previous artifacts untouched. With an embedder id, close() also writes the manifest.
+    """
+    def __init__(self, chunks_file=CHUNKS_FILE, embeddings_file=EMBEDDINGS_FILE, embedder=None):
+        self.chunks_file = chunks_file
+        self.embeddings_file = embeddings_file
+        self.embedder = embedder
+        self.chunks_out = open(chunks_file + ".tmp", 'w', encoding='utf-8')
+        self.vectors_out = open(embeddings_file + ".raw.tmp", 'wb')
+        self.chunks_out.write("[")
+        self.rows = 0
+        self.dim = None
+
+    def write(self, chunks, vectors):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.dim = vectors.shape[1]
+        for chunk in chunks:
+            separator = ",\n  " if self.rows else "\n  "
+            self.chunks_out.write(separator + json.dumps(chunk, indent=2).replace("\n", "\n  "))
+            self.rows += 1
+        self.vectors_out.write(vectors.tobytes())
+
+    def close(self):
+        self.chunks_out.write("\n]" if self.rows else "]")
+        self.chunks_out.close()
+        self.vectors_out.close()
+
+        header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)), "fortran_order": False,
+                  "shape": (self.rows, self.dim or 0)}
+        with open(self.embeddings_file + ".tmp", 'wb') as out, open(self.embeddings_file + ".raw.tmp", 'rb') as raw:
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(raw, out)
+        os.remove(self.embeddings_file + ".raw.tmp")
+
+        os.replace(self.chunks_file + ".tmp", self.chunks_file)
+        os.replace(self.embeddings_file + ".tmp", self.embeddings_file)
+        if self.embedder:
+            manifest_file = manifest_path(self.embeddings_file)
+            with open(manifest_file + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump({"embedder": self.embedder, "rows": self.rows, "dim": self.dim}, f, indent=2)
+            os.replace(manifest_file + ".tmp", manifest_file)
+
+    def abort(self):
+        for handle in (self.chunks_out, self.vectors_out):
+            handle.close()
+        for path in (self.chunks_file + ".tmp", self.embeddings_file + ".raw.tmp", self.embeddings_file + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+
+def main(export_sql=True, incremental=True, data_file=DATA_FILE, workers=CHUNK_WORKERS,
+         batch_size=ENCODE_BATCH_SIZE, splitter_mode=SPLITTER_MODE, embedder_backend=DEFAULT_BACKEND):
+    """
+    Streaming pipeline: courses are read lazily, chunked in a process pool, encoded in
+    length-sorted fixed-size batches and each batch is appended to the output files as soon
+    as it is encoded. Peak memory is one sort window, not the whole corpus.
+    """
+    # Reuse vectors of unchanged chunks from the previous run, if the same embedder wrote them
+    embedder = embedder_id(embedder_backend)
+    previous_rows, previous_embeddings = load_previous_embeddings(embedder=embedder) if incremental else ({}, None)
 
-    print(f"Loading embedding model: {MODEL_NAME}...")
     try:
-        model = SentenceTransformer(MODEL_NAME)
+        model = load_embedder(embedder_backend, model_name=MODEL_NAME)
     except Exception as e:
         print(f"Error loading model: {e}")
         return
 
-    print("Generating embeddings...")
-    texts = [chunk["text"] for chunk in chunks]
+    # Simple verification query (simulated), scored batch by batch as the embeddings are produced
+    query = "What is the duration of the PM Fellowship?"
+    query_embedding = model.encode([query])[0]
+    # Cosine Similarity: (A . B) / (||A|| * ||B||)
+    norm_query = query_embedding / np.linalg.norm(query_embedding)
+    best_score, best_text = -np.inf, None
+
+    splitter = TokenTextSplitter.from_model(model) if splitter_mode == "tokens" else None
+    if splitter:
+        print(f"Splitting by model tokens: up to {splitter.max_tokens} per chunk, {splitter.chunk_overlap} overlap.")
+
+    writer = ArtifactWriter(embedder=embedder)
+    sql_writer = SqlDumpWriter(SQL_FILE) if export_sql else None
+    reused = encoded = 0
+
+    print(f"Chunking with {workers} worker(s) and encoding in batches of {batch_size}...")
     try:
-        embeddings = model.encode(texts, show_progress_bar=True)
+        for batch in iter_batches(iter_chunks(iter_courses(data_file), workers=workers, splitter=splitter), batch_size=batch_size):
+            for chunk in batch:
+                chunk["hash"] = chunk_hash(chunk)
+            to_encode = [i for i, chunk in enumerate(batch) if chunk["hash"] not in previous_rows]
+            
+            vectors = np.empty((len(batch), norm_query.shape[0]), dtype=np.float32)
+            if to_encode:
+                vectors[to_encode] = model.encode([batch[i]["text"] for i in to_encode], batch_size=batch_size)
+            for i, chunk in enumerate(batch):
+                if chunk["hash"] in previous_rows:
+                    vectors[i] = previous_embeddings[previous_rows[chunk["hash"]]]
+            reused += len(batch) - len(to_encode)
+            encoded += len(to_encode)
+
+            writer.write(batch, vectors)
+            if sql_writer:
+                sql_writer.write(batch, vectors)
+
+            similarities = np.dot(vectors / np.linalg.norm(vectors, axis=1, keepdims=True), norm_query)
+            best_idx = int(np.argmax(similarities))
+            if similarities[best_idx] > best_score:
+                best_score, best_text = float(similarities[best_idx]), batch[best_idx]["text"]
+            print(f"Processed {writer.rows} chunks (encoded {encoded}, reused {reused})...")
     except Exception as e:
-        print(f"Error during encoding: {e}")
+        print(f"Error during chunking/encoding: {e}")
+        writer.abort()
+        if sql_writer:
+            sql_writer.abort()
+        return
+
+    if writer.rows == 0:
+        print("Warning: No chunks created. Check data file content.")
+        writer.abort()
+        if sql_writer:
+            sql_writer.abort()
         return
-    
-    print(f"Embeddings shape: {embeddings.shape}")
 
+    # Unmap the previous embeddings.npy first; it cannot be replaced while mapped on Windows
+    del previous_embeddings
     print(f"Saving to {CHUNKS_FILE} and {EMBEDDINGS_FILE}...")
     try:
-        with open(CHUNKS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(chunks, f, indent=2)
-        np.save(EMBEDDINGS_FILE, embeddings)
+        writer.close()
+        if sql_writer:
+            sql_writer.close()
     except Exception as e:
         print(f"Error saving files: {e}")
         return
-    
-    # Simple verification query (simulated)
-    print("Verifying with a test query (Cosine Similarity)...")
-    query = "What is the duration of the PM Fellowship?"
-    query_embedding = model.encode([query])
-    
-    # Cosine Similarity: (A . B) / (||A|| * ||B||)
-    # Normalize vectors
-    norm_embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
-    norm_query = query_embedding / np.linalg.norm(query_embedding, axis=1, keepdims=True)
-    
-    similarities = np.dot(norm_embeddings, norm_query.T).flatten()
-    best_idx = np.argmax(similarities)
-    best_score = similarities[best_idx]
+    print(f"Embeddings shape: ({writer.rows}, {writer.dim}); encoded {encoded}, reused {reused}.")
     
     print(f"Top result (Score: {best_score:.4f}):")
-    print(chunks[best_idx]["text"][:200] + "...")
-
-    # Export to SQL
-    print("Exporting embeddings to SQL file...")
-    sql_file_path = os.path.join(EMBEDDING_DIR, "embeddings.sql")
-    export_to_sql(chunks, embeddings, sql_file_path)
+    print(best_text[:200] + "...")
 
     print("Done.")
 
-def export_to_sql(chunks, embeddings, output_file):
+class SqlDumpWriter:
+    """
+    Writes embeddings.sql incrementally (optional: phase_3_retrieval/init_db.py can bulk load
+    chunks.json + embeddings.npy directly). Goes to a .tmp file until close().
+    """
     table_name = "course_embeddings"
-    create_table_stmt = f"""
-CREATE TABLE IF NOT EXISTS {table_name} (
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.f = open(output_file + ".tmp", 'w', encoding='utf-8')
+        create_table_stmt = f"""
+CREATE TABLE IF NOT EXISTS {self.table_name} (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     content TEXT,
     metadata JSON,
     embedding_vector JSON -- Stored as JSON array
 );
 """
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write("-- Auto-generated SQL dump for NextLeap Course Embeddings\n")
-        f.write(create_table_stmt + "\n")
-        f.write("BEGIN TRANSACTION;\n")
-        
-        for i, chunk in enumerate(chunks):
+        self.f.write("-- Auto-generated SQL dump for NextLeap Course Embeddings\n")
+        self.f.write(create_table_stmt + "\n")
+        self.f.write("BEGIN TRANSACTION;\n")
+
+    def write(self, chunks, embeddings):
+        for chunk, embedding in zip(chunks, embeddings):
             content = chunk["text"].replace("'", "''") # Basic SQL escaping for single quotes
             metadata = json.dumps(chunk["metadata"]).replace("'", "''")
-            vector = json.dumps(embeddings[i].tolist())
-            
-            insert_stmt = f"INSERT INTO {table_name} (content, metadata, embedding_vector) VALUES ('{content}', '{metadata}', '{vector}');\n"
-            f.write(insert_stmt)
+            vector = json.dumps(embedding.tolist())
             
-        f.write("COMMIT;\n")
-    
-    print(f"SQL file created at: {output_file}")
+            insert_stmt = f"INSERT INTO {self.table_name} (content, metadata, embedding_vector) VALUES ('{content}', '{metadata}', '{vector}');\n"
+            self.f.write(insert_stmt)
+
+    def close(self):
+        self.f.write("COMMIT;\n")
+        self.f.close()
+        os.replace(self.output_file + ".tmp", self.output_file)
+        print(f"SQL file created at: {self.output_file}")
+
+    def abort(self):
+        self.f.close()
+        os.remove(self.output_file + ".tmp")
+
+def export_to_sql(chunks, embeddings, output_file):
+    writer = SqlDumpWriter(output_file)
+    writer.write(chunks, embeddings)
+    writer.close()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chunk course data and generate embeddings")
+    parser.add_argument("--skip-sql", action="store_true",
+                        help="Do not write embeddings.sql (init_db.py --source npy loads the .npy directly)")
+    parser.add_argument("--full", action="store_true",
+                        help="Re-encode every chunk instead of reusing unchanged embeddings from the last run")
+    parser.add_argument("--data", type=str, default=DATA_FILE,
+                        help="Course data: the Phase 1 JSON or a .jsonl file with one course per line (both are streamed)")
+    parser.add_argument("--workers", type=int, default=CHUNK_WORKERS, help="Chunking processes (1 = inline)")
+    parser.add_argument("--batch-size", type=int, default=ENCODE_BATCH_SIZE, help="Texts per encode call")
+    parser.add_argument("--splitter", choices=["chars", "tokens"], default=SPLITTER_MODE,
+                        help="chars: 1000-character chunks; tokens: chunks sized to the model's max sequence length")
+    parser.add_argument("--embedder", choices=EMBEDDER_BACKENDS, default=DEFAULT_BACKEND,
+                        help="torch: SentenceTransformer; onnx / onnx-int8: ONNX Runtime (see embedders.py). "
+                             "Vectors from another backend are never reused")
+    args = parser.parse_args()
+    main(export_sql=not args.skip_sql, incremental=not args.full, data_file=args.data, workers=args.workers,
+         batch_size=args.batch_size, splitter_mode=args.splitter, embedder_backend=args.embedder)
@@ -0,0 +1,343 @@
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import contextlib
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+# Configuration
+MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDING_DIR = os.path.dirname(os.path.abspath(__file__))
+# Exported graph, tokenizer files and reference vectors live here (created by --export)
+ONNX_DIR = os.path.join(EMBEDDING_DIR, "onnx")
+ONNX_FILE = "model.onnx"
+ONNX_INT8_FILE = "model.int8.onnx"
+ONNX_CONFIG_FILE = "embedder_config.json"
+REFERENCE_FILE = "reference_vectors.npy"
+ONNX_OPSET = 14
+# "torch": SentenceTransformer on PyTorch; "onnx": exported graph on ONNX Runtime;
+# "onnx-int8": the same graph with int8 dynamically quantized weights
+EMBEDDER_BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_BACKEND = "torch"
+# Intra-op threads per model instance (0 keeps the torch / ONNX Runtime default)
+ONNX_THREADS = 0
+# Lowest acceptable cosine similarity to the PyTorch vectors, per backend
+CONSISTENCY_THRESHOLDS = {"onnx": 0.999, "onnx-int8": 0.98}
+# Texts whose PyTorch vectors are stored at export time for the consistency check
+REFERENCE_TEXTS = [
+    "What is the duration of the PM Fellowship?",
+    "How much does the UI/UX Designer Fellowship cost?",
+    "Who are the mentors for the Data Analyst Fellowship?",
+    "Which tools will I learn: SQL, Excel, Tableau or Power BI?",
+    "Is there placement support after the Business Analyst Fellowship?",
+    "When does Cohort 29 of the Generative AI Bootcamp start?",
+    "Course: Product Management Fellowship\nWeek 3: Writing PRDs and prioritization frameworks.",
+    "The program is part-time with live classes on weekends, so it works alongside a full-time job.",
+]
+
+def mean_pool(hidden_states: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """
+    Average of the token vectors, ignoring padding (the Pooling module of all-MiniLM-L6-v2).
+    """
+    mask = attention_mask[..., np.newaxis].astype(np.float32)
+    return (hidden_states * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+class OnnxEmbedder:
+    """
+    all-MiniLM-L6-v2 on ONNX Runtime: tokenizer, exported transformer graph, then pooling and
+    normalization in numpy, matching the SentenceTransformer pipeline. encode() has the
+    SentenceTransformer signature and max_seq_length / tokenizer are exposed, so it can replace
+    the model everywhere (including TokenTextSplitter.from_model). PyTorch is not imported.
+    """
+    def __init__(self, model_dir: str = ONNX_DIR, quantized: bool = False, threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_file = os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"{model_file} not found. Run 'python embedders.py --export' in phase_2_embedding.")
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = [graph_input.name for graph_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model_file = model_file
+        self.max_seq_length = config["max_seq_length"]
+        self.dimension = config["dimension"]
+        self.pooling = config.get("pooling", "mean")
+        self.normalize = config.get("normalize", True)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, texts, batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        # Longest first, so each batch pads to similar lengths (as SentenceTransformer does)
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            features = self.tokenizer([texts[i] for i in rows], padding=True, truncation=True,
+                                      max_length=self.max_seq_length, return_tensors="np")
+            inputs = {name: features[name].astype(np.int64) for name in self.input_names}
+            hidden_states = self.session.run(None, inputs)[0]
+            if self.pooling == "cls":
+                embeddings[rows] = hidden_states[:, 0]
+            else:
+                embeddings[rows] = mean_pool(hidden_states, features["attention_mask"])
+        if self.normalize:
+            embeddings = l2_normalize(embeddings)
+        return embeddings[0] if single else embeddings
+
+def load_embedder(backend: str = DEFAULT_BACKEND, model_name: str = MODEL_NAME, model_dir: str = ONNX_DIR,
+                  threads: int = ONNX_THREADS):
+    """
+    Returns an object with a SentenceTransformer-style encode(texts) for the given backend.
+    The ONNX graph is exported on first use if model_dir does not have it yet.
+    """
+    if backend not in EMBEDDER_BACKENDS:
+        raise ValueError(f"Unknown embedder backend '{backend}'. Choose from: {', '.join(EMBEDDER_BACKENDS)}")
+    print(f"Loading embedding model: {model_name} ({backend})...")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return SentenceTransformer(model_name)
+
+    quantized = backend == "onnx-int8"
+    if not os.path.exists(os.path.join(model_dir, ONNX_INT8_FILE if quantized else ONNX_FILE)):
+        export_onnx(model_name, model_dir, quantize=quantized)
+    return OnnxEmbedder(model_dir, quantized=quantized, threads=threads)
+
+def export_onnx(model_name: str = MODEL_NAME, output_dir: str = ONNX_DIR, quantize: bool = True) -> Dict[str, str]:
+    """
+    Exports the SentenceTransformer's transformer to ONNX (dynamic batch and sequence axes),
+    optionally writes an int8 dynamically quantized copy, and stores the tokenizer, the pooling
+    config and PyTorch reference vectors for check_consistency(). Needs torch and, for
+    quantization, onnxruntime.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+    pooling = next((module for module in model if type(module).__name__ == "Pooling"), None)
+    pooling_mode = "mean"
+    if pooling is not None:
+        # Newer sentence-transformers keep the mode in the config, older ones only have the getter
+        pooling_mode = pooling.get_config_dict().get("pooling_mode") or pooling.get_pooling_mode_str()
+    if pooling_mode not in ("mean", "cls"):
+        raise ValueError(f"Pooling mode '{pooling_mode}' is not supported by the ONNX embedder")
+
+    class HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids=None):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask,
+                              token_type_ids=token_type_ids).last_hidden_state
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = model.tokenizer(REFERENCE_TEXTS[:2], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    paths = {"onnx": os.path.join(output_dir, ONNX_FILE)}
+    print(f"Exporting {model_name} to {paths['onnx']}...")
+    with torch.no_grad():
+        torch.onnx.export(HiddenStates(transformer), tuple(sample[name] for name in input_names), paths["onnx"],
+                          input_names=input_names, output_names=["last_hidden_state"], dynamic_axes=dynamic_axes,
+                          opset_version=ONNX_OPSET, do_constant_folding=True, dynamo=False)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        paths["onnx-int8"] = os.path.join(output_dir, ONNX_INT8_FILE)
+        print(f"Quantizing weights to int8: {paths['onnx-int8']}...")
+        quantize_dynamic(paths["onnx"], paths["onnx-int8"], weight_type=QuantType.QInt8)
+
+    model.tokenizer.save_pretrained(output_dir)
+    config = {
+        "model_name": model_name,
+        "max_seq_length": model.max_seq_length,
+        "dimension": model.get_sentence_embedding_dimension(),
+        "pooling": pooling_mode,
+        "normalize": any(type(module).__name__ == "Normalize" for module in model),
+    }
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    np.save(os.path.join(output_dir, REFERENCE_FILE), np.asarray(model.encode(REFERENCE_TEXTS), dtype=np.float32))
+    return paths
+
+def check_consistency(embedder, reference: Optional[np.ndarray] = None, texts: List[str] = None,
+                      threshold: float = CONSISTENCY_THRESHOLDS["onnx"]) -> Dict[str, Any]:
+    """
+    Cosine similarity between the embedder's vectors and the PyTorch vectors of the same texts
+    (by default the reference vectors stored at export time, so torch is not needed).
+    """
+    texts = texts or REFERENCE_TEXTS
+    if reference is None:
+        reference = np.load(os.path.join(ONNX_DIR, REFERENCE_FILE))
+    candidate = l2_normalize(np.asarray(embedder.encode(texts), dtype=np.float32))
+    cosines = np.sum(candidate * l2_normalize(np.asarray(reference, dtype=np.float32)), axis=1)
+    return {
+        "texts": len(texts),
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "threshold": threshold,
+        "passed": bool(cosines.min() >= threshold),
+    }
+
+def resident_mb() -> float:
+    """
+    Current resident set size of this process (Linux), else the peak from getrusage.
+    """
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def benchmark_backend(backend: str, texts: List[str], queries: List[str], batch_size: int = 32,
+                      threads: int = ONNX_THREADS, repeats: int = 3) -> Dict[str, Any]:
+    """
+    Load time, memory, single-query latency and batch throughput of one backend. Meant to run
+    in a fresh process so the memory numbers are not mixed with other backends.
+    """
+    rss_before = resident_mb()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        embedder = load_embedder(backend, threads=threads)
+    load_seconds = time.perf_counter() - started
+    rss_loaded = resident_mb()
+
+    embedder.encode(queries[:1]) # First call pays one-off initialization
+    latencies = []
+    for _ in range(repeats):
+        for query in queries:
+            started = time.perf_counter()
+            embedder.encode([query])
+            latencies.append(time.perf_counter() - started)
+    latencies = np.array(latencies) * 1000.0
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        embedder.encode(texts, batch_size=batch_size)
+    batch_seconds = (time.perf_counter() - started) / repeats
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 3),
+        "memory_mb": round(rss_loaded - rss_before, 1),
+        "peak_rss_mb": round(resident_mb(), 1),
+        "query_latency_ms_p50": round(float(np.percentile(latencies, 50)), 3),
+        "query_latency_ms_p95": round(float(np.percentile(latencies, 95)), 3),
+        "batch_texts_per_second": round(len(texts) / batch_seconds, 1),
+        "batch_size": batch_size,
+        "vectors": np.asarray(embedder.encode(REFERENCE_TEXTS), dtype=np.float32).tolist(),
+    }
+
+def benchmark_texts(num_texts: int) -> List[str]:
+    """
+    Chunk texts of the real catalog (chunks.json if Phase 2 has run, else chunked on the fly).
+    """
+    import create_embeddings
+    if os.path.exists(create_embeddings.CHUNKS_FILE):
+        chunks = create_embeddings.iter_saved_chunks(create_embeddings.CHUNKS_FILE)
+    else:
+        chunks = create_embeddings.iter_chunks(create_embeddings.iter_courses(), workers=1)
+    # Both are streamed, so only num_texts chunks are read
+    return [chunk["text"] for chunk in itertools.islice(chunks, num_texts)]
+
+def run_benchmark(backends: List[str], num_texts: int = 256, batch_size: int = 32, threads: int = ONNX_THREADS,
+                  repeats: int = 3) -> Dict[str, Any]:
+    """
+    Benchmarks every backend in its own process and compares their vectors with the PyTorch
+    ones (from the torch run when it is part of the comparison, else the export-time reference).
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    texts = benchmark_texts(num_texts)
+    queries = REFERENCE_TEXTS[:6]
+    results = []
+    for backend in backends:
+        print(f"Benchmarking {backend}...", file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results.append(pool.submit(benchmark_backend, backend, texts, queries, batch_size, threads, repeats).result())
+
+    torch_run = next((result for result in results if result["backend"] == "torch"), None)
+    reference = np.array(torch_run["vectors"]) if torch_run else None
+    if reference is None and os.path.exists(os.path.join(ONNX_DIR, REFERENCE_FILE)):
+        reference = np.load(os.path.join(ONNX_DIR, REFERENCE_FILE))
+    for result in results:
+        vectors = np.array(result.pop("vectors"), dtype=np.float32)
+        if reference is not None and result["backend"] != "torch":
+            cosines = np.sum(l2_normalize(vectors) * l2_normalize(reference), axis=1)
+            result["min_cosine_vs_torch"] = round(float(cosines.min()), 6)
+            result["consistent"] = bool(cosines.min() >= CONSISTENCY_THRESHOLDS[result["backend"]])
+    return {"config": {"num_texts": len(texts), "batch_size": batch_size, "threads": threads, "repeats": repeats},
+            "backends": results}
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, check and benchmark the query/document embedder backends")
+    parser.add_argument("--export", action="store_true", help="Export the model to ONNX (plus an int8 copy)")
+    parser.add_argument("--no-quantize", action="store_true", help="With --export, skip the int8 model")
+    parser.add_argument("--check", choices=["onnx", "onnx-int8"],
+                        help="Compare a backend's vectors with the PyTorch reference vectors")
+    parser.add_argument("--benchmark", type=str, help="Comma-separated backends to benchmark, e.g. torch,onnx,onnx-int8")
+    parser.add_argument("--num-texts", type=int, default=256, help="Chunk texts encoded per throughput run")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=ONNX_THREADS, help="ONNX Runtime intra-op threads (0 = default)")
+    parser.add_argument("--output", help="Write the benchmark JSON here instead of stdout")
+    args = parser.parse_args()
+
+    if not (args.export or args.check or args.benchmark):
+        parser.error("nothing to do: pass --export, --check and/or --benchmark")
+
+    if args.export:
+        paths = export_onnx(quantize=not args.no_quantize)
+        for backend in paths:
+            result = check_consistency(load_embedder(backend, threads=args.threads),
+                                       threshold=CONSISTENCY_THRESHOLDS[backend])
+            print(f"{backend}: min cosine vs PyTorch {result['min_cosine']:.5f} "
+                  f"({'ok' if result['passed'] else 'BELOW ' + str(result['threshold'])})")
+
+    if args.check:
+        result = check_consistency(load_embedder(args.check, threads=args.threads),
+                                   threshold=CONSISTENCY_THRESHOLDS[args.check])
+        print(json.dumps(result, indent=2))
+        if not result["passed"]:
+            sys.exit(1)
+
+    if args.benchmark:
+        report = run_benchmark(args.benchmark.split(","), num_texts=args.num_texts, batch_size=args.batch_size,
+                               threads=args.threads)
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output)
+            print(f"Report written to {args.output}", file=sys.stderr)
+        else:
+            print(output)
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,9 @@ import unittest
 import os
 import json
 import numpy as np
+import re
 import sys
+import tempfile
 
 # Add parent directory to path to allow importing modules if needed
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -70,5 +72,215 @@ class TestPhase2Embeddings(unittest.TestCase):
         except Exception as e:
             self.fail(f"Importing create_embeddings.py raised exception: {e}")
 
+class TestChunkHash(unittest.TestCase):
+    def test_hash_tracks_text_and_metadata(self):
+        """Content hashes are stable for unchanged chunks and change with text or metadata."""
+        from create_embeddings import chunk_hash
+        chunk = {"text": "Q: Duration?\nA: 16 weeks", "metadata": {"course": "PM", "type": "faq"}}
+        same = {"text": "Q: Duration?\nA: 16 weeks", "metadata": {"type": "faq", "course": "PM"}}
+        self.assertEqual(chunk_hash(chunk), chunk_hash(same))
+        self.assertNotEqual(chunk_hash(chunk), chunk_hash({**chunk, "text": "Q: Duration?\nA: 12 weeks"}))
+        self.assertNotEqual(chunk_hash(chunk), chunk_hash({**chunk, "metadata": {"course": "UX", "type": "faq"}}))
+
+class TestStreamingPipeline(unittest.TestCase):
+    def setUp(self):
+        import create_embeddings
+        self.ce = create_embeddings
+        self.courses = [
+            {"course_name": f"Course {i}", "course_url": f"https://example.com/{i}",
+             "cohorts": [{"cohort_label": "Cohort 1", "cohort_details": {
+                 "frequently_asked_questions": [{"question": f"Q{j}?", "answer": "A" * (10 * j)} for j in range(6)],
+                 "tools_you_learn": ["Figma", "SQL"]}}]}
+            for i in range(5)
+        ]
+
+    def test_parallel_chunking_matches_create_chunks(self):
+        """Chunks from the process pool equal the single-threaded create_chunks output, in order."""
+        expected = self.ce.create_chunks({"courses": self.courses})
+        self.assertEqual(list(self.ce.iter_chunks(iter(self.courses), workers=2)), expected)
+
+    def test_jsonl_courses_are_streamed(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "courses.jsonl")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("\n".join(json.dumps(course) for course in self.courses) + "\n")
+            self.assertEqual(list(self.ce.iter_courses(path)), self.courses)
+
+    def test_json_courses_are_streamed(self):
+        """The courses array of a .json catalog is read element by element, not loaded whole."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "courses.json")
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({"scraped_at": 1700000000, "source": {"pages": ["a", "b"]}, "courses": self.courses}, f, indent=2)
+            # A read size far below one course forces every value to span several reads
+            self.assertEqual(list(self.ce.iter_courses(path, read_size=7)), self.courses)
+
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            courses = self.ce.iter_courses(path, read_size=64)
+            self.assertEqual(next(courses), self.courses[0])
+            courses.close()
+
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text[:len(text) // 2])
+            with self.assertRaises(ValueError):
+                list(self.ce.iter_courses(path, read_size=64))
+
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({"pages": []}, f)
+            self.assertEqual(list(self.ce.iter_courses(path)), [])
+
+    def test_batches_are_fixed_size_and_length_sorted(self):
+        chunks = [{"text": "x" * n} for n in [5, 1, 9, 3, 7, 2, 8]]
+        batches = list(self.ce.iter_batches(chunks, batch_size=3, window_batches=2))
+        self.assertEqual([len(b) for b in batches], [3, 3, 1])
+        self.assertEqual([len(c["text"]) for c in batches[0] + batches[1]], [1, 2, 3, 5, 7, 9])
+
+    def test_artifact_writer_appends_batches(self):
+        """Batches written one at a time form the same chunks.json / embeddings.npy as one dump."""
+        chunks = self.ce.create_chunks({"courses": self.courses})
+        vectors = np.random.RandomState(0).normal(size=(len(chunks), 8)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            chunks_file = os.path.join(tmp_dir, "chunks.json")
+            embeddings_file = os.path.join(tmp_dir, "embeddings.npy")
+            writer = self.ce.ArtifactWriter(chunks_file, embeddings_file)
+            for start in range(0, len(chunks), 4):
+                writer.write(chunks[start:start + 4], vectors[start:start + 4])
+            writer.close()
+            with open(chunks_file, 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f), chunks)
+            np.testing.assert_array_equal(np.load(embeddings_file), vectors)
+            self.assertEqual(sorted(os.listdir(tmp_dir)), ["chunks.json", "embeddings.npy"])
+
+    def test_previous_embeddings_are_streamed(self):
+        """Saved chunks are read back one at a time; only their hashes and rows are kept."""
+        chunks = self.ce.create_chunks({"courses": self.courses})
+        for chunk in chunks:
+            chunk["hash"] = self.ce.chunk_hash(chunk)
+        vectors = np.random.RandomState(0).normal(size=(len(chunks), 8)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            chunks_file = os.path.join(tmp_dir, "chunks.json")
+            embeddings_file = os.path.join(tmp_dir, "embeddings.npy")
+            writer = self.ce.ArtifactWriter(chunks_file, embeddings_file)
+            writer.write(chunks, vectors)
+            writer.close()
+
+            # A read size far below one chunk forces every chunk to span several reads
+            self.assertEqual(list(self.ce.iter_saved_chunks(chunks_file, read_size=16)), chunks)
+            rows, matrix = self.ce.load_previous_embeddings(chunks_file, embeddings_file)
+            self.assertEqual(rows, {chunk["hash"]: i for i, chunk in enumerate(chunks)})
+            np.testing.assert_array_equal(matrix[rows[chunks[3]["hash"]]], vectors[3])
+
+            with open(chunks_file, 'r', encoding='utf-8') as f:
+                text = f.read()
+            with open(chunks_file, 'w', encoding='utf-8') as f:
+                f.write(text[:len(text) // 2])
+            with self.assertRaises(ValueError):
+                list(self.ce.iter_saved_chunks(chunks_file))
+            self.assertEqual(self.ce.load_previous_embeddings(chunks_file, embeddings_file), ({}, None))
+
+class WordTokenizer:
+    """
+    Minimal stand-in for a Hugging Face fast tokenizer: words and punctuation are tokens,
+    offsets are character spans. Counts calls.
+    """
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text, **kwargs):
+        self.calls += 1
+        return {"offset_mapping": [match.span() for match in re.finditer(r"\w+|[^\w\s]", text)]}
+
+    def count(self, text):
+        return len(re.findall(r"\w+|[^\w\s]", text))
+
+class TestTokenTextSplitter(unittest.TestCase):
+    def setUp(self):
+        import create_embeddings
+        self.tokenizer = WordTokenizer()
+        self.splitter = create_embeddings.TokenTextSplitter(self.tokenizer, max_tokens=20, chunk_overlap=4)
+        self.text = "\n".join(f"Week {i}: Topics: Discovery, user research and metrics for cohort {i}." for i in range(30))
+
+    def test_chunks_never_exceed_max_tokens(self):
+        chunks = self.splitter.split_text(self.text)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(self.tokenizer.count(chunk) <= 20 for chunk in chunks))
+        # One tokenizer pass per document
+        self.assertEqual(self.tokenizer.calls, 1)
+
+    def test_chunks_are_slices_covering_the_text(self):
+        chunks = self.splitter.split_text(self.text)
+        position = 0
+        for chunk in chunks:
+            found = self.text.find(chunk)
+            self.assertGreaterEqual(found, 0)
+            self.assertLessEqual(found, position) # Overlapping or adjacent, no gaps
+            position = found + len(chunk)
+            self.assertEqual(chunk, chunk.strip())
+        self.assertEqual(position, len(self.text))
+        # Prefers cutting at line breaks over mid-line
+        self.assertTrue(all(chunk.endswith(".") for chunk in chunks))
+
+    def test_short_text_is_one_chunk(self):
+        self.assertEqual(self.splitter.split_text("Cohort 29 starts soon."), ["Cohort 29 starts soon."])
+        self.assertEqual(self.splitter.split_text(""), [])
+
+def build_tiny_sentence_transformer(path):
+    """
+    Saves a randomly initialized 2-layer BERT with mean pooling, so export can run offline.
+    """
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, processors
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Transformer, Pooling, Normalize
+
+    tokens = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + [chr(c) for c in range(97, 123)] + ["what", "is", "the"]
+    vocab = {token: i for i, token in enumerate(tokens)}
+    tokenizer = Tokenizer(models.WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = processors.TemplateProcessing(single="[CLS] $A [SEP]",
+                                                             special_tokens=[("[CLS]", 2), ("[SEP]", 3)])
+    hf_dir = os.path.join(path, "hf")
+    BertTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]", pad_token="[PAD]", cls_token="[CLS]",
+                      sep_token="[SEP]", mask_token="[MASK]").save_pretrained(hf_dir)
+    BertModel(BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                         intermediate_size=64, max_position_embeddings=128)).save_pretrained(hf_dir)
+    model = SentenceTransformer(modules=[Transformer(hf_dir, max_seq_length=64), Pooling(32, "mean"), Normalize()])
+    model.save(os.path.join(path, "st"))
+    return model
+
+class TestEmbedders(unittest.TestCase):
+    def test_mean_pool_ignores_padding(self):
+        from embedders import mean_pool, l2_normalize
+        hidden = np.array([[[1.0, 1.0], [3.0, 5.0], [100.0, 100.0]]], dtype=np.float32)
+        pooled = mean_pool(hidden, np.array([[1, 1, 0]]))
+        np.testing.assert_allclose(pooled, [[2.0, 3.0]])
+        np.testing.assert_allclose(np.linalg.norm(l2_normalize(pooled), axis=1), [1.0], rtol=1e-6)
+
+    def test_unknown_backend_is_rejected(self):
+        from embedders import load_embedder
+        with self.assertRaises(ValueError):
+            load_embedder("tensorrt")
+
+    def test_onnx_export_matches_torch(self):
+        """The exported graph (fp32 and int8) reproduces the PyTorch sentence embeddings."""
+        try:
+            import onnx, onnxruntime  # noqa: F401
+        except ImportError:
+            self.skipTest("onnx / onnxruntime not installed")
+        import embedders
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model = build_tiny_sentence_transformer(tmp_dir)
+            onnx_dir = os.path.join(tmp_dir, "onnx")
+            embedders.export_onnx(os.path.join(tmp_dir, "st"), onnx_dir, quantize=True)
+            texts = ["what is the course", "a b c", "x"]
+            reference = model.encode(texts)
+            for quantized, threshold in ((False, 0.9999), (True, 0.95)):
+                embedder = embedders.OnnxEmbedder(onnx_dir, quantized=quantized)
+                self.assertEqual(embedder.encode(texts).shape, reference.shape)
+                result = embedders.check_consistency(embedder, reference, texts, threshold=threshold)
+                self.assertTrue(result["passed"], result)
+
 if __name__ == '__main__':
     unittest.main()
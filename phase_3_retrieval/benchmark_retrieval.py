@@ -0,0 +1,278 @@
+
+import os
+import gc
+import sys
+import copy
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+import numpy as np
+from typing import List, Dict, Any, Optional
+
+import vector_store
+from vector_index import INDEX_BACKENDS
+from lexical_index import tokenize
+from init_db import phase_2_module
+from retrieval_engine import RetrievalEngine
+
+# Configuration
+DEFAULT_SIZES = [50]
+DEFAULT_BACKENDS = ["brute", "int8", "float16", "hnsw", "ivfpq"]
+DEFAULT_K = 5
+LATENCY_ROUNDS = 3
+BATCH_SIZE = 32
+HASHING_DIM = 384
+
+class HashingEmbedder:
+    """
+    Model-free embedder for benchmarking the retrieval path: hashed bag of words, L2-normalized.
+    Deterministic and fast, so corpora of any size can be built without a GPU or network.
+    """
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                h = zlib.crc32(token.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return vector_store.normalize_rows(vectors)
+
+def load_embedder(name: str):
+    if name == "hashing":
+        return HashingEmbedder()
+    create_embeddings = phase_2_module()
+    backend = "torch" if name == "model" else name
+    with contextlib.redirect_stdout(sys.stderr):
+        return create_embeddings.load_embedder(backend, model_name=create_embeddings.MODEL_NAME)
+
+def synthetic_courses(base_courses: List[Dict[str, Any]], num_courses: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    num_courses records in the final_courses_data.json schema, cycling through the real courses
+    with a numbered name, a varied cost and a random subset of reviews per copy.
+    """
+    rng = np.random.RandomState(seed)
+    courses = []
+    for i in range(num_courses):
+        course = copy.deepcopy(base_courses[i % len(base_courses)])
+        if i >= len(base_courses):
+            course["course_name"] = f"{course['course_name']} {i // len(base_courses) + 1}"
+        for cohort in course.get("cohorts", []):
+            details = cohort.get("cohort_details", {})
+            if isinstance(details.get("cost"), dict) and isinstance(details["cost"].get("amount"), (int, float)):
+                details["cost"]["amount"] = int(details["cost"]["amount"] * rng.uniform(0.8, 1.2))
+            reviews = details.get("reviews", [])
+            if len(reviews) > 1:
+                keep = rng.choice(len(reviews), size=rng.randint(1, len(reviews) + 1), replace=False)
+                details["reviews"] = [reviews[j] for j in sorted(keep)]
+        courses.append(course)
+    return courses
+
+def labelled_questions(courses: List[Dict[str, Any]], max_questions: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Questions with known answers: catalog-style questions answered by one chunk type of one
+    course, and every FAQ question answered by its own FAQ chunk.
+    """
+    templates = [
+        ("How much does the {course} cost?", "overview"),
+        ("What tools will I learn in the {course}?", "tools"),
+        ("Who are the instructors of the {course}?", "instructors"),
+        ("Who are the mentors in the {course}?", "mentors"),
+        ("What topics does the {course} curriculum cover?", "curriculum"),
+    ]
+    questions = []
+    for course in courses:
+        name = course.get("course_name", "Unknown Course")
+        for template, chunk_type in templates:
+            questions.append({"question": template.format(course=name), "course": name, "type": chunk_type})
+        for cohort in course.get("cohorts", []):
+            for faq in cohort.get("cohort_details", {}).get("frequently_asked_questions", []):
+                if faq.get("question"):
+                    questions.append({"question": faq["question"], "course": name, "type": "faq",
+                                      "contains": f"Q: {faq['question']}"})
+
+    rng = np.random.RandomState(seed)
+    if len(questions) > max_questions:
+        questions = [questions[i] for i in sorted(rng.choice(len(questions), size=max_questions, replace=False))]
+    return questions
+
+def relevant_ids(question: Dict[str, Any], chunks: List[Dict[str, Any]]) -> set:
+    return {chunk["id"] for chunk in chunks
+            if chunk["metadata"].get("course") == question["course"]
+            and chunk["metadata"].get("type") == question["type"]
+            and question.get("contains", "") in chunk["content"]}
+
+def build_corpus(db_file: str, courses: List[Dict[str, Any]], embedder, batch_size: int = 256) -> Dict[str, Any]:
+    """
+    Chunks and embeds the courses into a fresh knowledge base at db_file (plus its mmap sidecar).
+    """
+    create_embeddings = phase_2_module()
+    chunks = create_embeddings.create_chunks({"courses": courses})
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_file)
+    vector_store.create_schema(conn)
+    with conn:
+        for offset in range(0, len(chunks), batch_size):
+            batch = chunks[offset:offset + batch_size]
+            vector_store.bulk_insert(conn, batch, embedder.encode([chunk["text"] for chunk in batch]))
+        vector_store.bump_version(conn)
+    vector_store.export_normalized_matrix(conn, *vector_store.sidecar_paths(db_file))
+    conn.close()
+    return {"courses": len(courses), "chunks": len(chunks), "build_seconds": time.perf_counter() - start}
+
+def resident_bytes() -> Optional[int]:
+    """
+    Current RSS from /proc (Linux); None elsewhere.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def percentile_ms(samples: List[float], q: float) -> float:
+    return 1000.0 * float(np.percentile(samples, q))
+
+def benchmark_backend(db_file: str, backend: str, embedder, questions: List[Dict[str, Any]], k: int,
+                      use_mmap: bool, fusion: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    gc.collect()
+    rss_before = resident_bytes()
+    tracemalloc.start()
+    start = time.perf_counter()
+    # Engine progress messages go to stderr so stdout stays pure JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        engine = RetrievalEngine(db_file=db_file, embedder=embedder, index_backend=backend, index_params=params,
+                                 use_mmap=use_mmap, fusion=fusion, query_cache_size=len(questions) + 1)
+    load_seconds = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resident_bytes()
+
+    texts = [q["question"] for q in questions]
+    # Embed once up front so latency measures retrieval, not the embedding model
+    engine.embed_queries(texts)
+
+    latencies = []
+    for _ in range(LATENCY_ROUNDS):
+        for text in texts:
+            started = time.perf_counter()
+            engine.search(text, k=k)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    batched = []
+    for offset in range(0, len(texts), BATCH_SIZE):
+        batched.extend(engine.search_batch(texts[offset:offset + BATCH_SIZE], k=k))
+    batch_seconds = time.perf_counter() - started
+
+    recalls, hits = [], 0
+    for question, results in zip(questions, batched):
+        relevant = relevant_ids(question, engine.chunks)
+        if not relevant:
+            continue
+        found = len(relevant & {r["id"] for r in results})
+        recalls.append(found / float(min(k, len(relevant))))
+        hits += found > 0
+
+    report = {
+        "backend": backend,
+        "params": engine.index.params,
+        "load_seconds": load_seconds,
+        "index_memory_mb": engine.index.memory_bytes() / 2**20,
+        "traced_peak_mb": traced_peak / 2**20,
+        "rss_delta_mb": (rss_after - rss_before) / 2**20 if rss_before is not None and rss_after is not None else None,
+        "latency_ms_p50": percentile_ms(latencies, 50),
+        "latency_ms_p95": percentile_ms(latencies, 95),
+        "latency_ms_p99": percentile_ms(latencies, 99),
+        "throughput_qps": len(latencies) / sum(latencies),
+        "batch_throughput_qps": len(texts) / batch_seconds,
+        f"recall_at_{k}": float(np.mean(recalls)) if recalls else None,
+        f"hit_rate_at_{k}": hits / float(len(recalls)) if recalls else None,
+        "labelled_questions": len(recalls),
+    }
+    if engine.batcher:
+        engine.batcher.close()
+    del engine
+    return report
+
+def run_benchmark(sizes: List[int], backends: List[str], embedder_name: str = "hashing", k: int = DEFAULT_K,
+                  num_questions: int = 200, use_mmap: bool = False, fusion: str = "none",
+                  params: Optional[Dict[str, Dict[str, Any]]] = None, data_file: Optional[str] = None,
+                  seed: int = 0) -> Dict[str, Any]:
+    """
+    Runs every backend on a synthetic corpus of each size (in courses) and returns one
+    JSON-serializable report.
+    """
+    create_embeddings = phase_2_module()
+    base_courses = list(create_embeddings.iter_courses(data_file or create_embeddings.DATA_FILE))
+    if not base_courses:
+        raise ValueError("No courses found to build synthetic corpora from")
+    embedder = load_embedder(embedder_name)
+
+    report = {
+        "config": {"sizes": sizes, "backends": backends, "embedder": embedder_name, "k": k,
+                   "num_questions": num_questions, "use_mmap": use_mmap, "fusion": fusion, "seed": seed},
+        "corpora": [],
+    }
+    for size in sizes:
+        courses = synthetic_courses(base_courses, size, seed=seed)
+        questions = labelled_questions(courses, num_questions, seed=seed)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, "benchmark.db")
+            print(f"Building corpus of {size} courses...", file=sys.stderr)
+            with contextlib.redirect_stdout(sys.stderr):
+                corpus = build_corpus(db_file, courses, embedder)
+            corpus["results"] = []
+            for backend in backends:
+                if backend not in INDEX_BACKENDS:
+                    corpus["results"].append({"backend": backend, "skipped": "unknown backend"})
+                    continue
+                print(f"  {backend}...", file=sys.stderr)
+                try:
+                    corpus["results"].append(benchmark_backend(db_file, backend, embedder, questions, k, use_mmap,
+                                                               fusion, (params or {}).get(backend, {})))
+                except ImportError as e:
+                    corpus["results"].append({"backend": backend, "skipped": str(e)})
+            report["corpora"].append(corpus)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency, memory and recall on synthetic corpora")
+    parser.add_argument("--sizes", type=str, default=",".join(map(str, DEFAULT_SIZES)),
+                        help="Comma-separated corpus sizes in courses (the real catalog has 5)")
+    parser.add_argument("--backends", type=str, default=",".join(DEFAULT_BACKENDS))
+    parser.add_argument("--embedder", choices=["hashing", "model", "onnx", "onnx-int8"], default="hashing",
+                        help="hashing: fast model-free vectors (measures the retrieval path); model: the real embedding "
+                             "model on PyTorch; onnx / onnx-int8: the real model on ONNX Runtime")
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--num-questions", type=int, default=200)
+    parser.add_argument("--mmap", action="store_true", help="Load the matrix memory-mapped")
+    parser.add_argument("--fusion", choices=["rrf", "weighted", "none"], default="none")
+    parser.add_argument("--params", type=str, default="{}",
+                        help='JSON index parameters per backend, e.g. \'{"hnsw": {"ef_search": 128}}\'')
+    parser.add_argument("--data", type=str, default=None, help="Course data to build corpora from (.json or .jsonl)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = run_benchmark(sizes=[int(size) for size in args.sizes.split(",")],
+                           backends=[backend.strip() for backend in args.backends.split(",")],
+                           embedder_name=args.embedder, k=args.k, num_questions=args.num_questions,
+                           use_mmap=args.mmap, fusion=args.fusion, params=json.loads(args.params),
+                           data_file=args.data, seed=args.seed)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
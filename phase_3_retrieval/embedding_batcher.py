@@ -0,0 +1,133 @@
+
+import time
+import queue
+import threading
+import numpy as np
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, List
+
+# Configuration
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_WINDOW_MS = 5.0
+# Recent queue waits kept for percentile reporting
+WAIT_SAMPLES = 1024
+
+class EmbeddingBatcher:
+    """
+    Coalesces encode requests from concurrent callers into one model call.
+    The worker thread takes the first pending request, keeps collecting for up to
+    window_ms (or until max_batch_size texts), encodes everything together and hands
+    each caller back its own rows. encode() has the SentenceTransformer signature,
+    so the batcher can stand in for the model. With workers > 1 that many threads collect
+    and encode batches side by side, for an encode_fn that runs calls in parallel
+    (an EmbeddingWorkerPool).
+    """
+    def __init__(self, encode_fn: Callable[[List[str]], np.ndarray], max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 window_ms: float = DEFAULT_WINDOW_MS, workers: int = 1):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.window_ms = window_ms
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._batch_sizes = {}
+        self._waits_ms = deque(maxlen=WAIT_SAMPLES)
+        self._closed = False
+        self.batches = 0
+        self.texts = 0
+        self._workers = [threading.Thread(target=self._run, name=f"embedding-batcher-{i}", daemon=True)
+                         for i in range(max(1, workers))]
+        for worker in self._workers:
+            worker.start()
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        """
+        Blocks until this caller's texts have been encoded as part of a batch. Raises
+        RuntimeError once the batcher is closed.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        future = Future()
+        # Checked under the lock close() holds while queuing the stop markers, so no request
+        # can land behind them and wait forever
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Embedding batcher is closed")
+            self._queue.put((texts, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        size = len(first[0])
+        deadline = time.perf_counter() + self.window_ms / 1000.0
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None) # Finish this batch, then stop (the None is left for the next _collect)
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            started = time.perf_counter()
+            texts = [text for item_texts, _, _ in batch for text in item_texts]
+            try:
+                embeddings = np.asarray(self.encode_fn(texts), dtype=np.float32)
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            with self._lock:
+                self.batches += 1
+                self.texts += len(texts)
+                self._batch_sizes[len(texts)] = self._batch_sizes.get(len(texts), 0) + 1
+                self._waits_ms.extend(1000.0 * (started - enqueued) for _, _, enqueued in batch)
+
+            offset = 0
+            for item_texts, future, _ in batch:
+                future.set_result(embeddings[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    def close(self):
+        # One stop marker per thread; requests queued before them are still answered
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for _ in self._workers:
+                self._queue.put(None)
+        for worker in self._workers:
+            worker.join(timeout=5)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = np.array(self._waits_ms) if self._waits_ms else np.zeros(1)
+            return {
+                "window_ms": self.window_ms,
+                "workers": len(self._workers),
+                "max_batch_size": self.max_batch_size,
+                "batches": self.batches,
+                "texts": self.texts,
+                "mean_batch_size": self.texts / self.batches if self.batches else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+                "queue_wait_ms_p50": float(np.percentile(waits, 50)),
+                "queue_wait_ms_p95": float(np.percentile(waits, 95)),
+                "queue_wait_ms_max": float(waits.max()),
+            }
@@ -0,0 +1,281 @@
+
+import os
+import sys
+import time
+import queue
+import threading
+import multiprocessing
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, Any, List
+
+# Configuration
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+DEFAULT_THREADS_PER_WORKER = 1
+# Rows of each worker's shared output buffer; larger requests are sent in parts
+DEFAULT_MAX_TEXTS = 256
+# Seconds a worker may take to import and load the model
+START_TIMEOUT = 300.0
+# Seconds encode() waits for a free worker before giving up
+ACQUIRE_TIMEOUT = 60.0
+# Seconds a worker may take to answer one encode request before it is considered hung
+ENCODE_TIMEOUT = 30.0
+# Dead workers replaced over the pool's lifetime before it is left to shrink
+MAX_RESTARTS = 3
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+def _worker_main(conn, factory: Callable[[], Any], threads: int, max_texts: int):
+    """
+    Runs in the worker process: loads the embedder, then answers encode requests by writing
+    the vectors into the shared buffer and replying with the row count only.
+    """
+    if threads:
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(threads)
+    try:
+        embedder = factory()
+        if threads and "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(threads)
+        dim = np.asarray(embedder.encode(["warm-up"])).shape[1]
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", dim))
+
+    # Spawned workers share the parent's resource tracker, so attaching only re-registers the
+    # name the parent already owns; the parent unlinks it in close()
+    shm = SharedMemory(name=conn.recv())
+    output = np.ndarray((max_texts, dim), dtype=np.float32, buffer=shm.buf)
+    try:
+        while True:
+            texts = conn.recv()
+            if texts is None:
+                break
+            try:
+                output[:len(texts)] = embedder.encode(texts, batch_size=len(texts))
+                conn.send(("ok", len(texts)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del output
+        shm.close()
+
+class _Worker:
+    def __init__(self, index, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.shm = None
+        self.output = None
+        self.requests = 0
+        self.texts = 0
+
+    def release(self):
+        """
+        Closes the pipe and frees the shared buffer; the process must have exited or been told to.
+        """
+        self.conn.close()
+        self.output = None
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+class EmbeddingWorkerPool:
+    """
+    N worker processes, each holding its own copy of the embedding model, so query encoding
+    runs on N cores without the GIL or torch's intra-op threads of the server getting in the
+    way. Only the texts are pickled; each worker writes its vectors into a shared-memory buffer
+    that the caller copies out. encode() has the SentenceTransformer signature and is
+    thread-safe: concurrent callers are served by different workers in parallel.
+    A worker that dies, or does not answer within encode_timeout and is killed, is replaced in
+    the background (at most max_restarts times per pool); once no workers are left, encode()
+    raises instead of waiting.
+    factory must be picklable (e.g. a functools.partial of a module-level function).
+    """
+    def __init__(self, factory: Callable[[], Any], workers: int = DEFAULT_WORKERS,
+                 threads_per_worker: int = DEFAULT_THREADS_PER_WORKER, max_texts: int = DEFAULT_MAX_TEXTS,
+                 start_timeout: float = START_TIMEOUT, acquire_timeout: float = ACQUIRE_TIMEOUT,
+                 encode_timeout: float = ENCODE_TIMEOUT, max_restarts: int = MAX_RESTARTS):
+        self.num_workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.max_texts = max_texts
+        self.start_timeout = start_timeout
+        self.acquire_timeout = acquire_timeout
+        self.encode_timeout = encode_timeout
+        self.max_restarts = max_restarts
+        self.restarts = 0
+        self.dim = None
+        self._factory = factory
+        self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        # Workers that are usable or being restarted; encode() fails fast once this is 0
+        self._live = workers
+
+        self._workers = [self._spawn(index) for index in range(workers)]
+        try:
+            for worker in self._workers:
+                self._handshake(worker)
+                self._idle.put(worker)
+        except Exception:
+            self.close()
+            raise
+        print(f"Started {workers} embedding worker(s) with {threads_per_worker} thread(s) each.")
+
+    def _spawn(self, index: int) -> _Worker:
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main,
+                                        args=(child_conn, self._factory, self.threads_per_worker, self.max_texts),
+                                        name=f"embedding-worker-{index}", daemon=True)
+        process.start()
+        child_conn.close()
+        return _Worker(index, process, parent_conn)
+
+    def _handshake(self, worker: _Worker):
+        """
+        Waits for the worker's model to load and hands it its shared output buffer.
+        """
+        if not worker.conn.poll(self.start_timeout):
+            raise RuntimeError(f"Embedding worker {worker.index} did not start within {self.start_timeout:.0f}s")
+        status, value = worker.conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"Embedding worker {worker.index} failed to load the model: {value}")
+        self.dim = value
+        worker.shm = SharedMemory(create=True, size=self.max_texts * value * 4)
+        worker.output = np.ndarray((self.max_texts, value), dtype=np.float32, buffer=worker.shm.buf)
+        worker.conn.send(worker.shm.name)
+
+    def _retire(self, worker: _Worker, reason: str = "died"):
+        """
+        Frees a dead worker's resources and starts a replacement while restarts are left.
+        """
+        worker.process.join(1.0)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(1.0)
+        worker.release()
+        with self._lock:
+            restart = not self._closed and self.restarts < self.max_restarts
+            if restart:
+                self.restarts += 1
+            else:
+                self._live -= 1
+        if restart:
+            print(f"Warning: embedding worker {worker.index} {reason}; starting a replacement.")
+            threading.Thread(target=self._respawn, args=(worker.index,), name=f"embedding-respawn-{worker.index}",
+                             daemon=True).start()
+        else:
+            print(f"Warning: embedding worker {worker.index} {reason} and was removed from the pool.")
+
+    def _respawn(self, index: int):
+        worker = self._spawn(index)
+        try:
+            self._handshake(worker)
+        except Exception as e:
+            print(f"Warning: could not restart embedding worker {index}: {e}")
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.release()
+            with self._lock:
+                self._live -= 1
+            return
+        with self._lock:
+            closed = self._closed
+            if not closed:
+                self._workers[index] = worker
+                self._idle.put(worker)
+        if closed:
+            worker.conn.send(None)
+            worker.process.join(1.0)
+            worker.release()
+
+    def _acquire(self) -> _Worker:
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            if self._closed:
+                raise RuntimeError("Embedding worker pool is closed")
+            if self._live <= 0:
+                raise RuntimeError("No embedding workers left in the pool")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError(f"No embedding worker became free within {self.acquire_timeout:.0f}s")
+            # Short waits so a pool that loses its last worker meanwhile is noticed
+            try:
+                return self._idle.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                pass
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: List[str], **kwargs) -> np.ndarray:
+        """
+        Encodes texts on the next free worker (waiting up to acquire_timeout for one). A worker
+        that takes longer than encode_timeout is killed and replaced, and the call raises.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+
+        worker = self._acquire()
+        failure = None
+        try:
+            embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+            for start in range(0, len(texts), self.max_texts):
+                part = texts[start:start + self.max_texts]
+                try:
+                    worker.conn.send(part)
+                    if not worker.conn.poll(self.encode_timeout):
+                        # A hung worker would block this caller forever; treat it like a dead one
+                        failure = f"did not answer within {self.encode_timeout:.0f}s"
+                        worker.process.kill()
+                        raise RuntimeError(f"Embedding worker {worker.index} {failure}")
+                    status, value = worker.conn.recv()
+                except (EOFError, OSError) as e:
+                    failure = "died"
+                    raise RuntimeError(f"Embedding worker {worker.index} exited") from e
+                if status != "ok":
+                    raise RuntimeError(f"Embedding worker {worker.index} failed: {value}")
+                embeddings[start:start + len(part)] = worker.output[:len(part)]
+            with self._lock:
+                worker.requests += 1
+                worker.texts += len(texts)
+            return embeddings
+        finally:
+            if failure is None:
+                self._idle.put(worker)
+            else:
+                self._retire(worker, failure)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.num_workers,
+                "alive": sum(worker.process.is_alive() for worker in self._workers),
+                "restarts": self.restarts,
+                "threads_per_worker": self.threads_per_worker,
+                "idle": self._idle.qsize(),
+                "requests_per_worker": [worker.requests for worker in self._workers],
+                "texts_per_worker": [worker.texts for worker in self._workers],
+            }
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.release()
@@ -0,0 +1,106 @@
+
+import re
+import numpy as np
+from typing import Dict, Any, List, Optional, Union
+
+# Configuration
+# Metadata fields that get a per-value row index
+FACET_FIELDS = ("course", "type")
+# Words shared by many course names that say nothing about which course is meant
+GENERIC_COURSE_WORDS = {"fellowship", "bootcamp", "course", "program", "programme", "applied"}
+# Extra phrasings users type for catalog courses (matched as whole words, case-insensitive)
+COURSE_ALIASES = {
+    "Product Management Fellowship": ["product manager", "product management", "pm"],
+    "UI/UX Designer Fellowship": ["ui/ux", "ui ux", "ux", "ui design", "ux design", "product design"],
+    "Data Analyst Fellowship": ["data analytics", "data analysis", "data analyst"],
+    "Business Analyst Fellowship": ["business analytics", "business analysis", "business analyst"],
+    "Applied Generative AI Bootcamp": ["generative ai", "genai", "gen ai"],
+}
+# Aliases up to this long ("pm", "ux") also occur outside course talk ("starts at 7 pm"), so they
+# only route when the query has a course-context word and the alias does not follow a number
+SHORT_ALIAS_CHARS = 2
+COURSE_CONTEXT_WORDS = {"fellowship", "course", "courses", "program", "programme", "bootcamp", "cohort", "cohorts",
+                        "curriculum", "syllabus", "mentor", "mentors", "mentorship", "career", "careers", "role",
+                        "roles", "job", "jobs", "interview", "interviews", "placement", "placements", "certificate",
+                        "certification", "module", "modules", "track"}
+
+Filters = Dict[str, Union[str, List[str]]]
+
+class FacetIndex:
+    """
+    Sorted row-index arrays per metadata value, e.g. rows["course"]["Data Analyst Fellowship"].
+    A filter selects its rows by set operations on these arrays, so a filtered search only
+    scores that slice of the embedding matrix.
+    """
+    def __init__(self, fields=FACET_FIELDS):
+        self.fields = tuple(fields)
+        self.rows = {field: {} for field in self.fields}
+
+    def build(self, chunks: List[Dict[str, Any]]):
+        positions = {field: {} for field in self.fields}
+        for row, chunk in enumerate(chunks):
+            metadata = chunk.get("metadata") or {}
+            for field in self.fields:
+                value = metadata.get(field)
+                if value is not None:
+                    positions[field].setdefault(value, []).append(row)
+        self.rows = {field: {value: np.array(rows, dtype=np.int64) for value, rows in values.items()}
+                     for field, values in positions.items()}
+
+    def values(self, field: str) -> List[str]:
+        return sorted(self.rows.get(field, {}))
+
+    def select(self, filters: Optional[Filters]) -> Optional[np.ndarray]:
+        """
+        Rows matching every filtered field (a list of values matches any of them).
+        Returns None when there is nothing to filter on.
+        """
+        if not filters:
+            return None
+        selected = None
+        for field, wanted in filters.items():
+            if field not in self.rows:
+                raise ValueError(f"Cannot filter on '{field}'. Indexed fields: {', '.join(self.fields)}")
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            parts = [self.rows[field][value] for value in wanted if value in self.rows[field]]
+            rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            selected = rows if selected is None else np.intersect1d(selected, rows, assume_unique=True)
+        return selected
+
+class CourseRouter:
+    """
+    Infers a course filter from the query text by matching course names and their aliases.
+    Only routes when exactly one course is mentioned; general or comparative questions
+    stay unfiltered. Short aliases (see SHORT_ALIAS_CHARS) count only next to a course-context word.
+    """
+    def __init__(self, courses: List[str], aliases: Dict[str, List[str]] = None):
+        aliases = COURSE_ALIASES if aliases is None else aliases
+        self.patterns = {}
+        self.short_patterns = {}
+        for course in courses:
+            phrases = {course.lower()}
+            core = " ".join(word for word in course.lower().split() if word not in GENERIC_COURSE_WORDS)
+            if core:
+                phrases.add(core)
+            phrases.update(alias.lower() for alias in aliases.get(course, []))
+            short = {phrase for phrase in phrases if len(phrase) <= SHORT_ALIAS_CHARS}
+            self.patterns[course] = self._compile(phrases - short)
+            if short:
+                self.short_patterns[course] = self._compile(short, after_number=False)
+        self.context = self._compile(COURSE_CONTEXT_WORDS)
+
+    @staticmethod
+    def _compile(phrases, after_number: bool = True):
+        alternatives = "|".join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+        number_guard = "" if after_number else "(?<![0-9] )"
+        return re.compile(rf"(?<![a-z0-9]){number_guard}(?:{alternatives})(?![a-z0-9])")
+
+    def route(self, query: str) -> Optional[str]:
+        text = " ".join(query.lower().split())
+        has_context = self.context.search(text) is not None
+        matches = []
+        for course, pattern in self.patterns.items():
+            short_pattern = self.short_patterns.get(course)
+            if pattern.search(text) or (has_context and short_pattern and short_pattern.search(text)):
+                matches.append(course)
+        return matches[0] if len(matches) == 1 else None
@@ -2,44 +2,215 @@
 import sqlite3
 import os
 import sys
+import argparse
+import numpy as np
+from typing import Dict
+
+from vector_store import (create_schema, backfill_hashes, sync_chunks, bump_version, migrate_json_to_blob,
+                          export_normalized_matrix, sidecar_paths, get_meta, set_meta, TABLE_NAME)
+from vector_index import remove_persisted_indexes
 
 # Configuration
+EMBEDDING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "phase_2_embedding"))
 # Path to the SQL file generated in Phase 2
-SQL_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "phase_2_embedding", "embeddings.sql"))
+SQL_FILE = os.path.join(EMBEDDING_DIR, "embeddings.sql")
+# Direct-ingest artifacts generated in Phase 2
+CHUNKS_FILE = os.path.join(EMBEDDING_DIR, "chunks.json")
+EMBEDDINGS_FILE = os.path.join(EMBEDDING_DIR, "embeddings.npy")
 # Path to the new SQLite database
 DB_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "knowledge_base.db"))
+# Chunks encoded and inserted per step when streaming straight from the source data
+STREAM_BATCH_SIZE = 64
+
+def connect(db_file: str = DB_FILE) -> sqlite3.Connection:
+    """
+    Opens the knowledge base in WAL mode so readers are never blocked by a load.
+    """
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def load_from_sql(conn: sqlite3.Connection, sql_file: str = SQL_FILE) -> int:
+    """
+    Legacy path: replays the embeddings.sql dump and converts its JSON vectors to BLOBs.
+    """
+    print(f"Reading SQL dump from {sql_file}...")
+    with open(sql_file, 'r', encoding='utf-8') as f:
+        sql_script = f.read()
+
+    print("Executing SQL script...")
+    conn.executescript(sql_script)
+    conn.commit()
+
+    print("Converting embeddings to float32 BLOBs...")
+    return migrate_json_to_blob(conn)
+
+def phase_2_module():
+    """
+    Imports create_embeddings from Phase 2 (chunking, hashing and the model name).
+    """
+    if EMBEDDING_DIR not in sys.path:
+        sys.path.append(EMBEDDING_DIR)
+    import create_embeddings
+    return create_embeddings
+
+def embedder_changed(conn: sqlite3.Connection, embedder: str) -> bool:
+    """
+    True if the stored vectors were made by another embedder than embedder (an embedder id from
+    Phase 2), so none of them can be kept. Databases from before the embedder was recorded
+    were built with the default torch model.
+    """
+    if conn.execute(f"SELECT 1 FROM {TABLE_NAME} LIMIT 1").fetchone() is None:
+        return False
+    stored = get_meta(conn, "embedder") or phase_2_module().embedder_id()
+    if stored == embedder:
+        return False
+    print(f"Stored vectors come from {stored}, new ones from {embedder}: re-ingesting every chunk.")
+    return True
+
+def sync_with_embedder(conn: sqlite3.Connection, chunks, vectors_fn, embedder: str,
+                       batch_size: int = 256) -> Dict[str, int]:
+    """
+    sync_chunks that only keeps stored rows made by the same embedder, and records embedder.
+    """
+    stats = sync_chunks(conn, chunks, vectors_fn, batch_size=batch_size, reuse=not embedder_changed(conn, embedder))
+    with conn:
+        set_meta(conn, "embedder", embedder)
+    return stats
+
+def load_from_arrays(conn: sqlite3.Connection, chunks_file: str = CHUNKS_FILE,
+                     embeddings_file: str = EMBEDDINGS_FILE) -> Dict[str, int]:
+    """
+    Direct ingest of chunks.json + embeddings.npy with parameter-bound executemany inside a
+    single transaction. No SQL text is generated or parsed. Rows whose content hash is already
+    stored are kept; only new or changed chunks are inserted and stale rows are deleted. If
+    embeddings.npy was written by another embedder than the stored rows, every row is replaced.
+    chunks.json is streamed and embeddings.npy memory-mapped, so neither is loaded whole.
+    """
+    print(f"Reading {chunks_file} and {embeddings_file}...")
+    embeddings = np.load(embeddings_file, mmap_mode='r')
+    create_embeddings = phase_2_module()
+    backfill_hashes(conn, create_embeddings.chunk_hash)
+
+    def chunks():
+        rows = 0
+        for chunk in create_embeddings.iter_saved_chunks(chunks_file):
+            if rows == embeddings.shape[0]:
+                raise ValueError(f"More chunks than the {embeddings.shape[0]} embeddings")
+            chunk["hash"] = chunk.get("hash") or create_embeddings.chunk_hash(chunk)
+            # Row of the chunk's vector in embeddings.npy
+            chunk["row"] = rows
+            rows += 1
+            yield chunk
+        # Raised inside sync_chunks' transaction, so nothing is written
+        if rows != embeddings.shape[0]:
+            raise ValueError(f"{rows} chunks but {embeddings.shape[0]} embeddings")
+
+    return sync_with_embedder(conn, chunks(), lambda batch: embeddings[[chunk["row"] for chunk in batch]],
+                              create_embeddings.saved_embedder(embeddings_file))
+
+def load_from_stream(conn: sqlite3.Connection, batch_size: int = STREAM_BATCH_SIZE,
+                     embedder_backend: str = "torch") -> Dict[str, int]:
+    """
+    Chunks the Phase 1 data and encodes it batch by batch, inserting each batch as soon as it
+    is encoded. Neither the SQL dump nor the .npy artifacts have to exist. Only chunks whose
+    content hash is not yet stored are encoded; the model is not even loaded if nothing changed.
+    Rows stored by another embedder backend are all re-encoded. Chunks are passed on as they
+    are produced rather than collected first.
+    """
+    create_embeddings = phase_2_module()
+    backfill_hashes(conn, create_embeddings.chunk_hash)
+
+    def chunks():
+        count = 0
+        for chunk in create_embeddings.iter_chunks(create_embeddings.iter_courses()):
+            chunk["hash"] = create_embeddings.chunk_hash(chunk)
+            count += 1
+            yield chunk
+        # Raised inside sync_chunks' transaction, so an empty source never deletes the stored rows
+        if not count:
+            raise ValueError("No chunks created from the source data")
+
+    model = None
+    encoded = 0
+    def encode_batch(batch):
+        nonlocal model, encoded
+        if model is None:
+            model = create_embeddings.load_embedder(embedder_backend, model_name=create_embeddings.MODEL_NAME)
+        encoded += len(batch)
+        print(f"Encoding {encoded} new or changed chunks...")
+        return model.encode([chunk["text"] for chunk in batch])
 
-def init_db():
-    print(f"Checking for SQL dump at: {SQL_FILE}")
-    if not os.path.exists(SQL_FILE):
+    return sync_with_embedder(conn, chunks(), encode_batch, create_embeddings.embedder_id(embedder_backend),
+                              batch_size=batch_size)
+
+def resolve_source(source: str) -> str:
+    if source != "auto":
+        return source
+    if os.path.exists(CHUNKS_FILE) and os.path.exists(EMBEDDINGS_FILE):
+        return "npy"
+    return "sql"
+
+def init_db(source: str = "auto", batch_size: int = STREAM_BATCH_SIZE, rebuild: bool = False,
+            embedder_backend: str = "torch"):
+    conn = None
+    source = resolve_source(source)
+    # The SQL dump has no notion of hashes, so replaying it always starts from scratch
+    rebuild = rebuild or source == "sql"
+
+    if source == "sql" and not os.path.exists(SQL_FILE):
         print("Error: embeddings.sql file not found. Please complete Phase 2 first.")
         sys.exit(1)
+    if source == "npy" and not (os.path.exists(CHUNKS_FILE) and os.path.exists(EMBEDDINGS_FILE)):
+        print("Error: chunks.json / embeddings.npy not found. Please complete Phase 2 first.")
+        sys.exit(1)
 
-    print(f"Initializing database at: {DB_FILE}")
-    
-    # Remove existing DB if it exists to ensure clean state
-    if os.path.exists(DB_FILE):
-        print("Removing existing database...")
-        os.remove(DB_FILE)
+    mode = "rebuild" if rebuild else "incremental"
+    print(f"Initializing database at: {DB_FILE} (source: {source}, {mode})")
+
+    # Remove existing DB only for a full rebuild; incremental syncs update rows in place
+    if rebuild:
+        for path in (DB_FILE, DB_FILE + "-wal", DB_FILE + "-shm"):
+            if os.path.exists(path):
+                print(f"Removing existing {os.path.basename(path)}...")
+                os.remove(path)
 
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        print("Reading SQL dump...")
-        with open(SQL_FILE, 'r', encoding='utf-8') as f:
-            sql_script = f.read()
-            
-        print("Executing SQL script...")
-        cursor.executescript(sql_script)
-        
-        conn.commit()
-        
+        conn = connect(DB_FILE)
+        create_schema(conn)
+
+        # Databases from older builds may still hold JSON vectors
+        migrate_json_to_blob(conn)
+        previous_version = get_meta(conn, "version")
+
+        if source == "sql":
+            loaded = load_from_sql(conn)
+            print(f"Stored {loaded} binary vectors.")
+            with conn:
+                # The dump is written in the same run as embeddings.npy and its manifest
+                set_meta(conn, "embedder", phase_2_module().saved_embedder(EMBEDDINGS_FILE))
+                bump_version(conn)
+        else:
+            if source == "npy":
+                stats = load_from_arrays(conn)
+            else:
+                stats = load_from_stream(conn, batch_size=batch_size, embedder_backend=embedder_backend)
+            print(f"Inserted {stats['inserted']}, deleted {stats['deleted']} stale, kept {stats['kept']} unchanged chunks.")
+
+        print("Exporting normalized matrix for memory-mapped loading...")
+        export_normalized_matrix(conn, *sidecar_paths(DB_FILE))
+        # Saved FAISS indexes describe the previous vectors; the server rebuilds them on next load
+        if get_meta(conn, "version") != previous_version:
+            for path in remove_persisted_indexes(DB_FILE):
+                print(f"Removed stale index {os.path.basename(path)}")
+
         # Verify
+        cursor = conn.cursor()
         cursor.execute("SELECT Count(*) FROM course_embeddings")
         count = cursor.fetchone()[0]
         print(f"Success! Database initialized with {count} records.")
-        
+
     except sqlite3.Error as e:
         print(f"SQLite error: {e}")
         sys.exit(1)
@@ -50,5 +221,20 @@ def init_db():
         if conn:
             conn.close()
 
+def main():
+    parser = argparse.ArgumentParser(description="Build the SQLite knowledge base from Phase 2 output")
+    parser.add_argument("--source", choices=["auto", "sql", "npy", "stream"], default="auto",
+                        help="sql: replay embeddings.sql; npy: bulk load chunks.json + embeddings.npy; "
+                             "stream: chunk and encode directly into the database (no dump needed). "
+                             "auto prefers npy when available.")
+    parser.add_argument("--batch-size", type=int, default=STREAM_BATCH_SIZE,
+                        help="Chunks encoded and inserted per step in stream mode")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Delete the database and rebuild from scratch instead of syncing changed chunks in place")
+    parser.add_argument("--embedder", choices=["torch", "onnx", "onnx-int8"], default="torch",
+                        help="Embedding backend for stream mode (see phase_2_embedding/embedders.py)")
+    args = parser.parse_args()
+    init_db(source=args.source, batch_size=args.batch_size, rebuild=args.rebuild, embedder_backend=args.embedder)
+
 if __name__ == "__main__":
-    init_db()
+    main()
@@ -0,0 +1,89 @@
+
+import re
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from vector_index import top_k
+
+# Configuration
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Words too common in the catalog to help ranking
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i",
+    "in", "is", "it", "me", "my", "of", "on", "or", "the", "this", "to", "what", "which", "who",
+    "will", "with", "you", "your",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[+#][a-z0-9+#]*)?")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased alphanumeric terms, so "Cohort 29", "LPA" and "Figma" match exactly.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk text, stored as sparse postings: for every term, the rows containing
+    it and that term's precomputed BM25 weight in each row. A query only touches the postings
+    of its own terms, never the whole corpus.
+    """
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.num_rows = 0
+        self.postings = {}
+
+    def build(self, texts: List[str]):
+        term_counts = []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            term_counts.append(counts)
+            lengths[row] = sum(counts.values())
+
+        self.num_rows = len(texts)
+        avg_length = float(lengths.mean()) if len(texts) and lengths.mean() > 0 else 1.0
+
+        rows_by_term: Dict[str, List[int]] = {}
+        freqs_by_term: Dict[str, List[int]] = {}
+        for row, counts in enumerate(term_counts):
+            for term, count in counts.items():
+                rows_by_term.setdefault(term, []).append(row)
+                freqs_by_term.setdefault(term, []).append(count)
+
+        # k1 and b are fixed, so each posting's full BM25 contribution is computed once here
+        self.postings = {}
+        for term, rows in rows_by_term.items():
+            rows = np.array(rows, dtype=np.int64)
+            freqs = np.array(freqs_by_term[term], dtype=np.float32)
+            idf = np.log(1.0 + (self.num_rows - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths[rows] / avg_length)
+            weights = (idf * freqs * (self.k1 + 1.0) / (freqs + norm)).astype(np.float32)
+            self.postings[term] = (rows, weights)
+
+    def search(self, query: str, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (scores, indices) of the k best rows, best first. Rows sharing no term with the
+        query are never returned, so fewer than k results are possible. rows (sorted) restricts
+        the result to a metadata slice.
+        """
+        matched = [self.postings[term] for term in set(tokenize(query)) if term in self.postings]
+        if not matched or k <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        posting_rows = np.concatenate([posting[0] for posting in matched])
+        weights = np.concatenate([posting[1] for posting in matched])
+        candidates, positions = np.unique(posting_rows, return_inverse=True)
+        scores = np.bincount(positions, weights=weights).astype(np.float32)
+        if rows is not None:
+            allowed = np.isin(candidates, rows, assume_unique=True)
+            candidates, scores = candidates[allowed], scores[allowed]
+            if not len(candidates):
+                return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        best_scores, best = top_k(scores[np.newaxis, :], k)
+        return best_scores[0], candidates[best[0]]
@@ -0,0 +1,79 @@
+
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# Configuration
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL_SECONDS = 3600
+
+def normalize_query(query: str) -> str:
+    """
+    Cache key for a query: lowercased with whitespace collapsed. The embedding model is
+    uncased, so queries sharing a key embed identically.
+    """
+    return " ".join(query.lower().split())
+
+class QueryEmbeddingCache:
+    """
+    Thread-safe LRU cache of normalized query embeddings with optional TTL expiry.
+    One instance is shared by every request thread in the server.
+    """
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, query: str) -> Optional[np.ndarray]:
+        key = normalize_query(query)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, expires_at = entry
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, query: str, vector: np.ndarray):
+        if self.max_size <= 0:
+            return
+        vector = np.array(vector, dtype=np.float32)
+        # Shared between callers, so make accidental in-place edits fail loudly
+        vector.setflags(write=False)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+
+        key = normalize_query(query)
+        with self._lock:
+            self._entries[key] = (vector, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
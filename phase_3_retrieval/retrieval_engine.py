@@ -1,108 +1,511 @@
 
 import os
 import sys
-import json
+import time
 import sqlite3
+import threading
+import functools
 import numpy as np
-from typing import List, Dict, Any
-from sentence_transformers import SentenceTransformer
+from typing import List, Dict, Any, Optional
+from vector_store import get_meta, load_chunks, load_vectors, normalize_rows, open_normalized_matrix, sidecar_paths
+from vector_index import DEFAULT_BACKEND, load_or_build_index, top_k
+from lexical_index import BM25Index
+from facets import FacetIndex, CourseRouter, Filters
+from query_cache import QueryEmbeddingCache, DEFAULT_MAX_SIZE, DEFAULT_TTL_SECONDS
+from embedding_batcher import EmbeddingBatcher, DEFAULT_MAX_BATCH_SIZE
+from embedding_pool import EmbeddingWorkerPool
 
 # Configuration
 DB_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "knowledge_base.db"))
+# Embedder backends (torch / onnx / onnx-int8) live in Phase 2
+EMBEDDING_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "phase_2_embedding"))
 MODEL_NAME = "all-MiniLM-L6-v2"
+EMBEDDER_BACKEND = "torch"
 TOP_K = 3
+# Hybrid ranking: "rrf" (reciprocal rank fusion), "weighted" (min-max normalized scores) or "none"
+FUSION = "rrf"
+RRF_K = 60
+LEXICAL_WEIGHT = 0.3
+# Candidates taken from each ranker before fusion, per requested result
+FUSION_CANDIDATES = 4
+# Thrown-away query run after loading so the first real request does not pay for warm-up
+WARMUP_QUERY = "What courses does NextLeap offer?"
+
+class KnowledgeBase:
+    """
+    Everything a search reads: chunks, matrices, index and version. Never mutated after
+    construction; the engine replaces the whole snapshot on reload.
+    """
+    def __init__(self, chunks=None, embeddings=None, embedding_matrix=None, index=None, version=None, lexical=None,
+                 facets=None, router=None):
+        self.chunks = chunks if chunks is not None else []
+        self.embeddings = embeddings if embeddings is not None else []
+        self.embedding_matrix = embedding_matrix if embedding_matrix is not None else np.array([])
+        self.index = index
+        self.version = version
+        self.lexical = lexical
+        self.facets = facets if facets is not None else FacetIndex()
+        self.router = router
 
 class RetrievalEngine:
-    def __init__(self):
-        print(f"Loading embedding model: {MODEL_NAME}...")
-        self.embedder = SentenceTransformer(MODEL_NAME)
+    def __init__(self, use_mmap: bool = False, index_backend: str = DEFAULT_BACKEND, index_params: Dict[str, Any] = None,
+                 db_file: str = DB_FILE, embedder=None,
+                 query_cache_size: int = DEFAULT_MAX_SIZE, query_cache_ttl: float = DEFAULT_TTL_SECONDS,
+                 batch_window_ms: float = 0, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 fusion: str = FUSION, lexical_weight: float = LEXICAL_WEIGHT, route_courses: bool = False,
+                 lazy: bool = False, embedder_backend: str = EMBEDDER_BACKEND, embedder_threads: int = 0,
+                 embedder_workers: int = 0):
+        """
+        db_file / embedder: knowledge base path and query embedder (anything with a
+        SentenceTransformer-style encode(texts)); default to the Phase 3 database and MODEL_NAME.
+        embedder_backend: how MODEL_NAME is run when no embedder is given: "torch"
+        (SentenceTransformer), "onnx" or "onnx-int8" (ONNX Runtime, see phase_2_embedding/embedders.py);
+        embedder_threads: threads per model instance (torch or ONNX Runtime intra-op; 0 = default).
+        embedder_workers: when > 0, the model runs in that many worker processes
+        (EmbeddingWorkerPool) and concurrent query encodes are spread over them.
+        use_mmap: open the pre-normalized matrix written next to the database with
+        np.load(mmap_mode='r') instead of building a private copy, so every server
+        worker shares the same page-cache pages.
+        index_backend: "brute" (exact, default), "hnsw" or "ivfpq" (FAISS, persisted next
+        to the database). index_params tunes the backend, e.g. {"ef_search": 128}.
+        query_cache_size / query_cache_ttl: bounded LRU of query embeddings (0 disables it).
+        batch_window_ms / max_batch_size: when the window is > 0, query encodes from concurrent
+        callers are coalesced into shared model calls by an EmbeddingBatcher (with up to
+        embedder_workers batches encoded at once).
+        fusion: combine vector results with a BM25 ranking over the chunk text, "rrf" or
+        "weighted" (lexical_weight is the BM25 share); "none" ranks by cosine only.
+        route_courses: when a query names exactly one course and no filters are given, search
+        only that course's chunks.
+        lazy: return without loading anything; call start_loading() (background thread) or
+        load(), and wait_until_ready() before searching. load_status() reports progress.
+        """
+        if fusion not in ("rrf", "weighted", "none"):
+            raise ValueError(f"Unknown fusion '{fusion}'. Choose from: rrf, weighted, none")
+        self.use_mmap = use_mmap
+        self.index_backend = index_backend
+        self.index_params = index_params or {}
+        self.db_file = db_file
+        self.fusion = fusion
+        self.lexical_weight = lexical_weight
+        self.route_courses = route_courses
+        self.embedder = embedder
+        self.embedder_backend = embedder_backend
+        self.embedder_threads = embedder_threads
+        self.embedder_workers = embedder_workers
+        self._embedder_lock = threading.Lock()
+        self.query_cache = QueryEmbeddingCache(max_size=query_cache_size, ttl_seconds=query_cache_ttl)
+        self.batcher = None
+        if batch_window_ms > 0:
+            # One batch in flight per worker process, so the pool is not limited to one busy worker
+            self.batcher = EmbeddingBatcher(self._encode, max_batch_size=max_batch_size, window_ms=batch_window_ms,
+                                            workers=max(1, embedder_workers))
         
-        print(f"Loading knowledge base from {DB_FILE}...")
-        self.chunks = []
-        self.embeddings = []
-        self._load_db()
+        self._reload_lock = threading.Lock()
+        self._kb = KnowledgeBase()
+        self._ready = threading.Event()
+        self._load_thread = None
+        self._load_stage = None
+        self._load_started = None
+        self._load_finished = None
+        self._stage_seconds = {}
+        self._load_error = None
+        if not lazy:
+            self.load(warmup=False)
+
+    # Read-only views of the current snapshot
+    @property
+    def chunks(self) -> List[Dict[str, Any]]:
+        return self._kb.chunks
+
+    @property
+    def embeddings(self):
+        return self._kb.embeddings
+
+    @property
+    def embedding_matrix(self):
+        return self._kb.embedding_matrix
+
+    @property
+    def index(self):
+        return self._kb.index
+
+    @property
+    def kb_version(self) -> Optional[str]:
+        return self._kb.version
+
+    def snapshot(self) -> KnowledgeBase:
+        """
+        The current knowledge base; pass it to search() to pin several steps to one version.
+        """
+        return self._kb
+
+    def _ensure_embedder(self):
+        """
+        Imports the model runtime (sentence-transformers + torch, or ONNX Runtime) and loads
+        the model on first use, so neither is paid for when this module is imported.
+        """
+        if self.embedder is None:
+            with self._embedder_lock:
+                if self.embedder is None:
+                    if EMBEDDING_DIR not in sys.path:
+                        sys.path.append(EMBEDDING_DIR)
+                    from embedders import load_embedder
+                    factory = functools.partial(load_embedder, self.embedder_backend, model_name=MODEL_NAME,
+                                                threads=self.embedder_threads)
+                    if self.embedder_workers > 0:
+                        self.embedder = EmbeddingWorkerPool(factory, workers=self.embedder_workers,
+                                                            threads_per_worker=self.embedder_threads)
+                    else:
+                        self.embedder = factory()
+        return self.embedder
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self._ensure_embedder().encode(texts)
 
-    def _load_db(self):
-        if not os.path.exists(DB_FILE):
-             print(f"Error: Database file {DB_FILE} not found.")
-             return
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
 
+    def load(self, warmup: bool = True):
+        """
+        Loads the embedding model and the knowledge base, then optionally runs one warm-up
+        search. Progress is visible through load_status(). Only the first call does the work.
+        """
+        with self._reload_lock:
+            if self._ready.is_set():
+                return
+            self._load_started = time.perf_counter()
+            self._load_finished = None
+            self._load_error = None
+            stages = [("model", self._ensure_embedder), ("knowledge_base", self._load_initial_db)]
+            if warmup:
+                stages.append(("warmup", self.warm_up))
+            try:
+                for stage, step in stages:
+                    self._load_stage = stage
+                    started = time.perf_counter()
+                    step()
+                    self._stage_seconds[stage] = time.perf_counter() - started
+            except Exception as e:
+                self._load_error = str(e)
+                print(f"Error loading retrieval engine ({self._load_stage}): {e}")
+                raise
+            finally:
+                self._load_stage = None
+                self._load_finished = time.perf_counter()
+            self._ready.set()
+
+    def _load_initial_db(self):
+        # Errors propagate, so an unreadable database fails the load instead of serving no chunks
+        print(f"Loading knowledge base from {self.db_file}...")
+        self._kb = self._load_db()
+
+    def start_loading(self, warmup: bool = True) -> threading.Thread:
+        """
+        Runs load() on a daemon thread and returns immediately.
+        """
+        def run():
+            try:
+                self.load(warmup=warmup)
+            except Exception:
+                pass # Recorded in load_status()
+        if self._load_thread is None:
+            self._load_thread = threading.Thread(target=run, name="retrieval-loader", daemon=True)
+            self._load_thread.start()
+        return self._load_thread
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until load() has finished. Returns False on timeout; raises if loading failed.
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while not self._ready.is_set():
+            if self._load_error is not None:
+                raise RuntimeError(f"Retrieval engine failed to load: {self._load_error}")
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                return False
+            self._ready.wait(0.1 if remaining is None else min(0.1, remaining))
+        return True
+
+    def close(self):
+        """
+        Stops the micro-batcher and the embedding worker processes, if any.
+        """
+        if self.batcher:
+            self.batcher.close()
+        if isinstance(self.embedder, EmbeddingWorkerPool):
+            self.embedder.close()
+
+    def load_status(self) -> Dict[str, Any]:
+        if self._ready.is_set():
+            stage = "ready"
+        elif self._load_error is not None:
+            stage = "failed"
+        else:
+            stage = self._load_stage or ("starting" if self._load_started else "not_started")
+        return {
+            "ready": self._ready.is_set(),
+            "stage": stage,
+            "completed_stages_seconds": {name: round(seconds, 3) for name, seconds in self._stage_seconds.items()},
+            "elapsed_seconds": round((self._load_finished or time.perf_counter()) - self._load_started, 3)
+                               if self._load_started else 0.0,
+            "chunks": len(self.chunks),
+            "error": self._load_error,
+        }
+
+    def warm_up(self):
+        """
+        One encode and index search that is thrown away, so the first real query does not pay
+        for lazy model initialization or for paging in the matrix and index.
+        """
+        vector = np.asarray(self._encode([WARMUP_QUERY]), dtype=np.float32)
+        kb = self._kb
+        if len(kb.chunks):
+            vector = vector / (np.linalg.norm(vector, axis=1, keepdims=True) + 1e-10)
+            kb.index.search(vector, TOP_K)
+            if kb.lexical:
+                kb.lexical.search(WARMUP_QUERY, TOP_K)
+
+    def _load_db(self) -> KnowledgeBase:
+        """
+        Builds a complete snapshot from the database without touching the live one.
+        """
+        if not os.path.exists(self.db_file):
+             print(f"Error: Database file {self.db_file} not found.")
+             return KnowledgeBase()
+
+        conn = sqlite3.connect(self.db_file)
         try:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
+            # Changes whenever init_db rebuilds the knowledge base; used to invalidate caches
+            version = get_meta(conn, "version")
             
-            # Fetch all embeddings
-            cursor.execute("SELECT id, content, metadata, embedding_vector FROM course_embeddings")
-            rows = cursor.fetchall()
-            
-            for row in rows:
-                chunk_id, content, metadata_json, vector_json = row
+            mapped = self._load_mmap(conn, version) if self.use_mmap else None
+            if mapped:
+                chunks, embedding_matrix = mapped
+                # Already L2-normalized on disk; kept read-only and shared between processes
+                embeddings = embedding_matrix
+                print(f"Loaded {len(chunks)} chunks (memory-mapped matrix).")
+            else:
+                # One bulk read of the binary vectors into a contiguous matrix
+                chunks, embeddings = load_vectors(conn)
                 
-                # Parse JSON
-                metadata = json.loads(metadata_json)
-                vector = np.array(json.loads(vector_json), dtype=np.float32)
+                # Convert to numpy matrix for fast calc
+                if len(embeddings):
+                    # Normalize for cosine similarity
+                    embedding_matrix = normalize_rows(embeddings)
+                else:
+                    embedding_matrix = np.array([])
                 
-                self.chunks.append({
-                    "id": chunk_id,
-                    "content": content,
-                    "metadata": metadata
-                })
-                self.embeddings.append(vector)
-            
-            # Convert to numpy matrix for fast calc
-            if self.embeddings:
-                self.embedding_matrix = np.vstack(self.embeddings)
-                # Normalize for cosine similarity
-                norm = np.linalg.norm(self.embedding_matrix, axis=1, keepdims=True)
-                self.embedding_matrix = self.embedding_matrix / (norm + 1e-10) # Avoid div by zero
-            else:
-                self.embedding_matrix = np.array([])
-            
-            print(f"Loaded {len(self.chunks)} chunks.")
+                print(f"Loaded {len(chunks)} chunks.")
+        finally:
             conn.close()
-            
-        except Exception as e:
-            print(f"Error loading database: {e}")
+        
+        index = None
+        lexical = None
+        if chunks:
+            index = load_or_build_index(embedding_matrix, chunks, self.index_backend,
+                                        self.index_params, db_file=self.db_file)
+            if self.fusion != "none":
+                lexical = BM25Index()
+                lexical.build([chunk["content"] for chunk in chunks])
+        facets = FacetIndex()
+        facets.build(chunks)
+        router = CourseRouter(facets.values("course")) if self.route_courses else None
+        return KnowledgeBase(chunks, embeddings, embedding_matrix, index, version, lexical, facets, router)
+
+    def _load_mmap(self, conn, version: Optional[str] = None):
+        chunks = load_chunks(conn)
+        matrix = open_normalized_matrix(chunks, *sidecar_paths(self.db_file), version=version)
+        if matrix is None:
+            print("Warning: normalized matrix sidecar missing or stale, loading a private copy. "
+                  "Run 'python vector_store.py --export-matrix' to enable sharing.")
+            return None
+        return chunks, matrix
 
-    def search(self, query: str, k: int = 1) -> List[Dict[str, Any]]:
+    def disk_version(self) -> Optional[str]:
         """
-        Embeds the query and performs cosine similarity search against the knowledge base.
-        Returns top k chunks with their scores.
+        Version currently recorded in the database file (may be newer than the loaded one).
+        """
+        if not os.path.exists(self.db_file):
+            return None
+        conn = sqlite3.connect(self.db_file)
+        try:
+            return get_meta(conn, "version")
+        finally:
+            conn.close()
+
+    def has_update(self) -> bool:
+        return self.disk_version() != self.kb_version
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Loads the database into a new snapshot on the calling thread, then swaps it in with a
+        single reference assignment. Searches already running finish on the old snapshot; new ones
+        see the new one. Nothing is swapped if loading fails. Returns True if a swap happened.
         """
-        if len(self.chunks) == 0:
-            return []
+        with self._reload_lock:
+            if not force and not self.has_update():
+                return False
+            try:
+                snapshot = self._load_db()
+            except Exception as e:
+                print(f"Error reloading knowledge base: {e}")
+                return False
+            self._kb = snapshot
+            print(f"Knowledge base reloaded: version {snapshot.version}, {len(snapshot.chunks)} chunks.")
+            return True
 
-        # Embed query
-        query_embedding = self.embedder.encode([query])[0]
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Returns L2-normalized float32 (num_queries, dim) embeddings. Cached queries are
+        served from the query cache; the rest are encoded together in a single call.
+        """
+        vectors = [self.query_cache.get(query) for query in queries]
+        misses = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
         
-        # Normalize query
-        norm_query = query_embedding / (np.linalg.norm(query_embedding) + 1e-10)
+        if misses:
+            if self.batcher:
+                query_embeddings = np.asarray(self.batcher.encode(misses), dtype=np.float32)
+            else:
+                query_embeddings = np.asarray(self._encode(misses), dtype=np.float32)
+            norm = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+            encoded = dict(zip(misses, query_embeddings / (norm + 1e-10)))
+            for query, vector in encoded.items():
+                self.query_cache.put(query, vector)
+            vectors = [encoded[query] if vector is None else vector for query, vector in zip(queries, vectors)]
         
-        # Cosine Similarity
-        similarities = np.dot(self.embedding_matrix, norm_query)
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    def search_batch(self, queries: List[str], k: int = 1, filters: Optional[Filters] = None,
+                     timings: Optional[Dict[str, float]] = None,
+                     kb: Optional[KnowledgeBase] = None) -> List[List[Dict[str, Any]]]:
+        """
+        Embeds many queries in one encode call and scores them against the knowledge base
+        in one matrix-matrix product. Returns one top-k result list per query.
+        filters restricts every query to matching metadata, e.g. {"course": "Data Analyst Fellowship",
+        "type": ["faq", "overview"]}; filtered queries only score their slice of the matrix.
+        timings, if given, receives the seconds spent in "embed" and "search".
+        kb searches a snapshot taken earlier with snapshot() instead of the current one.
+        """
+        # Take the snapshot once so a concurrent reload cannot mix old and new state
+        if kb is None:
+            kb = self._kb
+        if len(kb.chunks) == 0 or not queries:
+            return [[] for _ in queries]
+
+        started = time.perf_counter()
+        norm_queries = self.embed_queries(queries)
+        embedded = time.perf_counter()
+        allowed = [kb.facets.select(self._query_filters(kb, query, filters)) for query in queries]
         
-        # Get top k indices
-        top_k_indices = np.argsort(similarities)[::-1][:k]
+        # Cosine Similarity via the configured index (exact or approximate)
+        num_candidates = k * FUSION_CANDIDATES if kb.lexical else k
+        vector_hits = [None] * len(queries)
+        unfiltered = [i for i, rows in enumerate(allowed) if rows is None]
+        if unfiltered:
+            scores, indices = kb.index.search(norm_queries[unfiltered], num_candidates)
+            for i, score_row, index_row in zip(unfiltered, scores, indices):
+                vector_hits[i] = (score_row, index_row)
+        for i, rows in enumerate(allowed):
+            if rows is not None:
+                vector_hits[i] = self._search_rows(kb, norm_queries[i], rows, num_candidates)
         
-        results = []
-        for idx in top_k_indices:
-            score = similarities[idx]
-            chunk = self.chunks[idx]
-            results.append({
-                "score": float(score),
-                "content": chunk["content"],
-                "metadata": chunk["metadata"]
-            })
+        batch_results = []
+        for query, norm_query, rows, (score_row, index_row) in zip(queries, norm_queries, allowed, vector_hits):
+            ranked = [(int(idx), float(score), float(score), None) for score, idx in zip(score_row, index_row) if idx >= 0]
+            if kb.lexical:
+                ranked = self._fuse(kb, query, norm_query, ranked, num_candidates, rows)[:k]
             
-        return results
+            results = []
+            for idx, score, fused_score, lexical_rank in ranked:
+                chunk = kb.chunks[idx]
+                result = {
+                    "id": chunk["id"],
+                    "score": score,
+                    "content": chunk["content"],
+                    "metadata": chunk["metadata"]
+                }
+                if kb.lexical:
+                    result["fused_score"] = fused_score
+                    # Position in the BM25 candidates (0 = best), None if BM25 did not match the chunk
+                    result["lexical_rank"] = lexical_rank
+                results.append(result)
+            batch_results.append(results)
+        
+        if timings is not None:
+            timings["embed"] = timings.get("embed", 0.0) + embedded - started
+            timings["search"] = timings.get("search", 0.0) + time.perf_counter() - embedded
+        return batch_results
+
+    def _query_filters(self, kb: KnowledgeBase, query: str, filters: Optional[Filters]) -> Optional[Filters]:
+        if filters or not kb.router:
+            return filters
+        course = kb.router.route(query)
+        return {"course": course} if course else None
+
+    @staticmethod
+    def _search_rows(kb: KnowledgeBase, norm_query: np.ndarray, rows: np.ndarray, k: int):
+        """
+        Exact search over a metadata slice: only the selected rows are scored.
+        """
+        if not len(rows):
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        similarities = np.dot(kb.embedding_matrix[rows], norm_query)
+        scores, best = top_k(similarities[np.newaxis, :], k)
+        return scores[0], rows[best[0]]
+
+    def _fuse(self, kb: KnowledgeBase, query: str, norm_query: np.ndarray, vector_ranked, num_candidates: int,
+              rows: Optional[np.ndarray] = None):
+        """
+        Merges the vector candidates with the BM25 top candidates. Returns (row, cosine, fused,
+        lexical rank) tuples sorted by the fused score; "score" stays the cosine similarity for
+        every row.
+        """
+        lexical_scores, lexical_rows = kb.lexical.search(query, num_candidates, rows=rows)
+        lexical_ranks = {idx: rank for rank, idx in enumerate(lexical_rows.tolist())}
+        cosine = {idx: score for idx, score, _, _ in vector_ranked}
+        for idx in lexical_rows.tolist():
+            if idx not in cosine:
+                cosine[idx] = float(np.dot(kb.embedding_matrix[idx], norm_query))
+        
+        fused = dict.fromkeys(cosine, 0.0)
+        if self.fusion == "rrf":
+            for rank, (idx, _, _, _) in enumerate(vector_ranked):
+                fused[idx] += 1.0 / (RRF_K + rank + 1)
+            for rank, idx in enumerate(lexical_rows.tolist()):
+                fused[idx] += 1.0 / (RRF_K + rank + 1)
+        else:
+            for weight, rows, values in ((1.0 - self.lexical_weight, [idx for idx, _, _, _ in vector_ranked],
+                                          [score for _, score, _, _ in vector_ranked]),
+                                         (self.lexical_weight, lexical_rows.tolist(), lexical_scores.tolist())):
+                if not rows:
+                    continue
+                low, high = min(values), max(values)
+                for idx, value in zip(rows, values):
+                    fused[idx] += weight * ((value - low) / (high - low) if high > low else 1.0)
+        
+        return sorted(((idx, cosine[idx], fused[idx], lexical_ranks.get(idx)) for idx in fused), key=lambda item: -item[2])
 
-    def retrieve_context(self, query: str, k: int = 1) -> str:
+    def search(self, query: str, k: int = 1, filters: Optional[Filters] = None,
+               timings: Optional[Dict[str, float]] = None, kb: Optional[KnowledgeBase] = None) -> List[Dict[str, Any]]:
+        """
+        Embeds the query and performs cosine similarity search against the knowledge base.
+        Returns top k chunks with their scores.
+        """
+        return self.search_batch([query], k=k, filters=filters, timings=timings, kb=kb)[0]
+
+    def retrieve_context(self, query: str, k: int = 1, filters: Optional[Filters] = None) -> str:
         """
         Orchestrates the search and formats the retrieved chunks into a readable string.
         Does NOT call an LLM.
         """
-        results = self.search(query, k=k)
-        
+        return self.format_context(self.search(query, k=k, filters=filters))
+
+    def format_context(self, results: List[Dict[str, Any]]) -> str:
+        """
+        Formats search results into the context string passed to the LLM.
+        """
         if not results:
             return "No relevant information found within the knowledge base."
             
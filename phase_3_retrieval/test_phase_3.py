@@ -1,13 +1,27 @@
 
 import unittest
 import os
+import json
 import sqlite3
 import sys
+import tempfile
+import time
+import threading
+import functools
+import numpy as np
 
 # Add directory to sys.path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from retrieval_engine import RetrievalEngine
+import vector_store
+import vector_index
+from query_cache import QueryEmbeddingCache
+from embedding_batcher import EmbeddingBatcher
+from embedding_pool import EmbeddingWorkerPool
+from lexical_index import BM25Index, tokenize
+from facets import FacetIndex, CourseRouter
+import benchmark_retrieval
 
 class TestPhase3Retrieval(unittest.TestCase):
     def setUp(self):
@@ -68,5 +82,786 @@ class TestPhase3Retrieval(unittest.TestCase):
         self.assertIn("Score:", context_str)
         self.assertIn("Source:", context_str)
 
+class TestVectorStore(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("""
+            CREATE TABLE course_embeddings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content TEXT,
+                metadata JSON,
+                embedding_vector JSON
+            )""")
+        self.vectors = np.random.RandomState(0).rand(4, 8).astype(np.float32)
+        for i, vector in enumerate(self.vectors):
+            self.conn.execute(
+                "INSERT INTO course_embeddings (content, metadata, embedding_vector) VALUES (?, ?, ?)",
+                (f"chunk {i}", json.dumps({"course": "Test", "type": "faq"}), json.dumps(vector.tolist())))
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_legacy_json_load(self):
+        """Legacy JSON-only tables still load."""
+        chunks, matrix = vector_store.load_vectors(self.conn)
+        self.assertEqual(len(chunks), 4)
+        np.testing.assert_allclose(matrix, self.vectors)
+
+    def test_migrate_json_to_blob(self):
+        """Migration fills the BLOB column and loads into a contiguous float32 matrix."""
+        migrated = vector_store.migrate_json_to_blob(self.conn)
+        self.assertEqual(migrated, 4)
+        self.assertTrue(vector_store.has_blob_column(self.conn))
+
+        chunks, matrix = vector_store.load_vectors(self.conn)
+        self.assertEqual([c["content"] for c in chunks], [f"chunk {i}" for i in range(4)])
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags["C_CONTIGUOUS"])
+        np.testing.assert_array_equal(matrix, self.vectors)
+
+        # Running the migration again is a no-op
+        self.assertEqual(vector_store.migrate_json_to_blob(self.conn), 0)
+
+    def test_bulk_insert(self):
+        """Direct ingest writes BLOB rows that load back unchanged."""
+        conn = sqlite3.connect(":memory:")
+        vector_store.create_schema(conn)
+        chunks = [{"text": f"chunk {i}", "metadata": {"course": "Test", "type": "faq"}} for i in range(4)]
+        with conn:
+            inserted = vector_store.bulk_insert(conn, chunks, self.vectors)
+            version = vector_store.bump_version(conn)
+        self.assertEqual(inserted, 4)
+        self.assertEqual(vector_store.get_meta(conn, "version"), version)
+
+        loaded_chunks, matrix = vector_store.load_vectors(conn)
+        self.assertEqual(loaded_chunks[3]["content"], "chunk 3")
+        np.testing.assert_array_equal(matrix, self.vectors)
+        conn.close()
+
+    def test_sync_chunks_in_place(self):
+        """Incremental sync keeps unchanged rows, encodes only new chunks and deletes stale ones."""
+        conn = sqlite3.connect(":memory:")
+        vector_store.create_schema(conn)
+        chunks = [{"text": f"chunk {i}", "metadata": {}, "hash": f"h{i}"} for i in range(4)]
+        encoded = []
+        def vectors_fn(batch):
+            encoded.extend(chunk["hash"] for chunk in batch)
+            return np.ones((len(batch), 8), dtype=np.float32)
+
+        self.assertEqual(vector_store.sync_chunks(conn, chunks, vectors_fn)["inserted"], 4)
+        version = vector_store.get_meta(conn, "version")
+        kept_id = conn.execute("SELECT id FROM course_embeddings WHERE content_hash = 'h1'").fetchone()[0]
+
+        encoded.clear()
+        changed = chunks[1:] + [{"text": "chunk 9", "metadata": {}, "hash": "h9"}]
+        stats = vector_store.sync_chunks(conn, changed, vectors_fn)
+        self.assertEqual(stats, {"inserted": 1, "deleted": 1, "kept": 3})
+        self.assertEqual(encoded, ["h9"])
+        self.assertNotEqual(vector_store.get_meta(conn, "version"), version)
+        self.assertEqual(conn.execute("SELECT id FROM course_embeddings WHERE content_hash = 'h1'").fetchone()[0], kept_id)
+
+        version = vector_store.get_meta(conn, "version")
+        self.assertEqual(vector_store.sync_chunks(conn, iter(changed), vectors_fn)["inserted"], 0)
+        self.assertEqual(vector_store.get_meta(conn, "version"), version)
+        conn.close()
+
+    def test_sync_chunks_from_a_generator(self):
+        """Chunks can be streamed in; a failing source rolls the whole sync back."""
+        conn = sqlite3.connect(":memory:")
+        vector_store.create_schema(conn)
+        def chunks(count, fail=False):
+            for i in range(count):
+                yield {"text": f"chunk {i}", "metadata": {}, "hash": f"h{i % 3}"}
+            if fail:
+                raise ValueError("source failed")
+        vectors_fn = lambda batch: np.ones((len(batch), 8), dtype=np.float32)
+
+        self.assertEqual(vector_store.sync_chunks(conn, chunks(5), vectors_fn, batch_size=2),
+                         {"inserted": 5, "deleted": 0, "kept": 0})
+        version = vector_store.get_meta(conn, "version")
+        with self.assertRaises(ValueError):
+            vector_store.sync_chunks(conn, chunks(1, fail=True), vectors_fn)
+        self.assertEqual(conn.execute("SELECT Count(*) FROM course_embeddings").fetchone()[0], 5)
+        self.assertEqual(vector_store.get_meta(conn, "version"), version)
+
+        # Duplicates keep their oldest rows; the surplus copies are deleted
+        self.assertEqual(vector_store.sync_chunks(conn, chunks(3), vectors_fn), {"inserted": 0, "deleted": 2, "kept": 3})
+        self.assertEqual([row[0] for row in conn.execute("SELECT id FROM course_embeddings ORDER BY id")], [1, 2, 3])
+        conn.close()
+
+    def test_load_from_arrays_streams_chunks(self):
+        """init_db's npy ingest stores each chunk with its own row of embeddings.npy."""
+        import init_db
+        chunks = [{"text": f"chunk {i}", "metadata": {"course": "Test", "type": "faq"}} for i in range(5)]
+        vectors = np.random.RandomState(1).rand(5, 8).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            chunks_file = os.path.join(tmp_dir, "chunks.json")
+            embeddings_file = os.path.join(tmp_dir, "embeddings.npy")
+            with open(chunks_file, 'w', encoding='utf-8') as f:
+                json.dump(chunks, f, indent=2)
+            np.save(embeddings_file, vectors)
+            conn = sqlite3.connect(":memory:")
+            vector_store.create_schema(conn)
+            self.assertEqual(init_db.load_from_arrays(conn, chunks_file, embeddings_file)["inserted"], 5)
+            loaded_chunks, matrix = vector_store.load_vectors(conn)
+            self.assertEqual([c["content"] for c in loaded_chunks], [c["text"] for c in chunks])
+            np.testing.assert_array_equal(matrix, vectors)
+
+            np.save(embeddings_file, vectors[:4])
+            with self.assertRaises(ValueError):
+                init_db.load_from_arrays(conn, chunks_file, embeddings_file)
+            self.assertEqual(len(vector_store.load_vectors(conn)[0]), 5)
+            conn.close()
+
+    def test_embedder_change_replaces_every_row(self):
+        """Vectors from another embedder are never mixed with the stored ones, even for unchanged chunks."""
+        import init_db
+        create_embeddings = init_db.phase_2_module()
+        chunks = [{"text": f"chunk {i}", "metadata": {"course": "Test", "type": "faq"}} for i in range(3)]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            chunks_file = os.path.join(tmp_dir, "chunks.json")
+            embeddings_file = os.path.join(tmp_dir, "embeddings.npy")
+            def write_artifacts(vectors, embedder):
+                writer = create_embeddings.ArtifactWriter(chunks_file, embeddings_file, embedder=embedder)
+                writer.write(chunks, vectors)
+                writer.close()
+
+            conn = sqlite3.connect(":memory:")
+            vector_store.create_schema(conn)
+            torch_vectors = np.random.RandomState(1).rand(3, 8).astype(np.float32)
+            write_artifacts(torch_vectors, create_embeddings.embedder_id("torch"))
+            init_db.load_from_arrays(conn, chunks_file, embeddings_file)
+            self.assertEqual(vector_store.get_meta(conn, "embedder"), create_embeddings.embedder_id("torch"))
+            self.assertEqual(init_db.load_from_arrays(conn, chunks_file, embeddings_file)["kept"], 3)
+
+            onnx_vectors = np.random.RandomState(2).rand(3, 8).astype(np.float32)
+            write_artifacts(onnx_vectors, create_embeddings.embedder_id("onnx"))
+            self.assertEqual(init_db.load_from_arrays(conn, chunks_file, embeddings_file),
+                             {"inserted": 3, "deleted": 3, "kept": 0})
+            np.testing.assert_array_equal(vector_store.load_vectors(conn)[1], onnx_vectors)
+            self.assertEqual(vector_store.get_meta(conn, "embedder"), create_embeddings.embedder_id("onnx"))
+
+            # The previous run's vectors are not reused for another backend either
+            self.assertEqual(create_embeddings.load_previous_embeddings(
+                chunks_file, embeddings_file, embedder=create_embeddings.embedder_id("torch")), ({}, None))
+            self.assertEqual(len(create_embeddings.load_previous_embeddings(
+                chunks_file, embeddings_file, embedder=create_embeddings.embedder_id("onnx"))[0]), 3)
+            conn.close()
+
+    def test_memory_mapped_matrix(self):
+        """The exported sidecar opens read-only, normalized, and is rejected once stale."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            matrix_file, manifest_file = vector_store.sidecar_paths(os.path.join(tmp_dir, "kb.db"))
+            vector_store.export_normalized_matrix(self.conn, matrix_file, manifest_file)
+
+            chunks = vector_store.load_chunks(self.conn)
+            matrix = vector_store.open_normalized_matrix(chunks, matrix_file, manifest_file)
+            self.assertIsInstance(matrix, np.memmap)
+            self.assertFalse(matrix.flags["WRITEABLE"])
+            np.testing.assert_allclose(np.linalg.norm(matrix, axis=1), 1.0, rtol=1e-5)
+
+            # Same ids, but the knowledge base was rebuilt since the export
+            self.assertIsNone(vector_store.open_normalized_matrix(chunks, matrix_file, manifest_file, version="v2"))
+
+            self.conn.execute("DELETE FROM course_embeddings WHERE id = 1")
+            chunks = vector_store.load_chunks(self.conn)
+            self.assertIsNone(vector_store.open_normalized_matrix(chunks, matrix_file, manifest_file))
+            del matrix
+            self.assertEqual(sorted(os.listdir(tmp_dir)), ["kb.manifest.json", "kb.npy"])
+
+class TestVectorIndex(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(42)
+        self.matrix = vector_store.normalize_rows(rng.normal(size=(500, 32)).astype(np.float32))
+        self.chunks = [{"id": i + 1} for i in range(500)]
+        self.queries = vector_store.normalize_rows(
+            self.matrix[:20] + rng.normal(scale=0.05, size=(20, 32)).astype(np.float32))
+
+    def test_brute_force_matches_exact_ranking(self):
+        """Brute force returns the exact top-k by cosine similarity."""
+        index = vector_index.create_index("brute")
+        index.build(self.matrix)
+        scores, indices = index.search(self.queries, 5)
+        expected = np.argsort(self.queries @ self.matrix.T, axis=1)[:, ::-1][:, :5]
+        np.testing.assert_array_equal(indices, expected)
+        self.assertTrue(np.all(np.diff(scores, axis=1) <= 0))
+
+    def test_top_k_partial_selection(self):
+        """argpartition-based top-k agrees with a full sort and handles k > rows."""
+        similarities = self.queries @ self.matrix.T
+        scores, indices = vector_index.top_k(similarities, 7)
+        np.testing.assert_array_equal(indices, np.argsort(similarities, axis=1)[:, ::-1][:, :7])
+        self.assertEqual(vector_index.top_k(similarities[:, :3], 10)[1].shape, (20, 3))
+
+    def test_hnsw_persists_and_reloads(self):
+        """HNSW is saved next to the database and reloaded while chunk ids are unchanged."""
+        try:
+            import faiss  # noqa: F401
+        except ImportError:
+            self.skipTest("faiss not installed")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, "kb.db")
+            index = vector_index.load_or_build_index(self.matrix, self.chunks, "hnsw", {"ef_search": 64}, db_file=db_file)
+            index_file, meta_file = vector_index.index_paths(db_file, "hnsw")
+            self.assertTrue(os.path.exists(index_file))
+            self.assertTrue(os.path.exists(meta_file))
+
+            reloaded = vector_index.load_or_build_index(self.matrix, self.chunks, "hnsw", {"ef_search": 64}, db_file=db_file)
+            report = vector_index.evaluate_index(reloaded, self.matrix, self.queries, k=5)
+            self.assertGreater(report["recall_at_k"], 0.9)
+
+    def test_rebuilt_vectors_with_same_ids_rebuild_the_index(self):
+        """A rebuilt database reuses ids 1..N; the saved index must not outlive its vectors."""
+        try:
+            import faiss  # noqa: F401
+        except ImportError:
+            self.skipTest("faiss not installed")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, "kb.db")
+            vector_index.load_or_build_index(self.matrix, self.chunks, "hnsw", db_file=db_file)
+            new_matrix = vector_store.normalize_rows(
+                np.random.RandomState(7).normal(size=self.matrix.shape).astype(np.float32))
+            index = vector_index.load_or_build_index(new_matrix, self.chunks, "hnsw", db_file=db_file)
+            _, indices = index.search(new_matrix[:100], 1)
+            self.assertEqual(int(np.sum(indices[:, 0] == np.arange(100))), 100)
+
+            with open(vector_index.index_paths(db_file, "hnsw")[1], 'r', encoding='utf-8') as f:
+                self.assertEqual(json.load(f)["vectors_sha256"], vector_store.matrix_checksum(new_matrix))
+            removed = vector_index.remove_persisted_indexes(db_file)
+            self.assertEqual(sorted(removed), sorted(vector_index.index_paths(db_file, "hnsw")))
+
+    def test_index_and_meta_from_different_writers_are_rebuilt(self):
+        """Concurrent builders write unique temp files; an index not matching its meta is rebuilt."""
+        try:
+            import faiss  # noqa: F401
+        except ImportError:
+            self.skipTest("faiss not installed")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, "kb.db")
+            threads = [threading.Thread(target=vector_index.load_or_build_index,
+                                        args=(self.matrix, self.chunks, "hnsw"), kwargs={"db_file": db_file})
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(sorted(os.listdir(tmp_dir)), ["kb.hnsw.faiss", "kb.hnsw.json"])
+
+            # Another writer replaced the index file after this meta was written
+            other = vector_index.create_index("hnsw", M=8)
+            other.build(self.matrix)
+            other.save(vector_index.index_paths(db_file, "hnsw")[0])
+            index = vector_index.load_or_build_index(self.matrix, self.chunks, "hnsw", db_file=db_file)
+            # Rebuilt with the requested M (level 0 holds 2 * M neighbors), not the M=8 file
+            self.assertEqual(index.index.hnsw.nb_neighbors(0), 2 * 32)
+
+    def test_quantized_indexes_rescore_exactly(self):
+        """int8 / float16 keep recall after rescoring, return exact scores and use less memory."""
+        for backend, max_fraction in (("int8", 0.3), ("float16", 0.55)):
+            index = vector_index.create_index(backend, block_rows=64)
+            index.build(self.matrix)
+            scores, indices = index.search(self.queries, 5)
+            np.testing.assert_allclose(scores, np.einsum("qkd,qd->qk", self.matrix[indices], self.queries), rtol=1e-5)
+            report = vector_index.evaluate_index(index, self.matrix, self.queries, k=5)
+            self.assertGreater(report["recall_at_k"], 0.95)
+            self.assertLess(index.memory_bytes(), max_fraction * self.matrix.nbytes)
+
+class TestQueryEmbeddingCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = QueryEmbeddingCache(max_size=2, ttl_seconds=None)
+        cache.put("a", np.ones(3))
+        cache.put("b", np.ones(3))
+        cache.get("a")
+        cache.put("c", np.ones(3))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_ttl_expiry(self):
+        cache = QueryEmbeddingCache(max_size=10, ttl_seconds=0.01)
+        cache.put("a", np.ones(3))
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_cached_vectors_are_read_only(self):
+        cache = QueryEmbeddingCache()
+        cache.put("a", np.ones(3))
+        with self.assertRaises(ValueError):
+            cache.get("A")[0] = 5.0
+
+class TestEmbeddingBatcher(unittest.TestCase):
+    def test_concurrent_requests_share_a_batch(self):
+        """Queries arriving within the window are encoded together and routed back correctly."""
+        calls = []
+        def encode(texts):
+            calls.append(list(texts))
+            return np.array([[len(text), i] for i, text in enumerate(texts)], dtype=np.float32)
+
+        batcher = EmbeddingBatcher(encode, max_batch_size=16, window_ms=200)
+        results = {}
+        def worker(text):
+            results[text] = batcher.encode([text])
+        threads = [threading.Thread(target=worker, args=("q" * n,)) for n in range(1, 6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        batcher.close()
+
+        self.assertLess(len(calls), 5)
+        for text, embedding in results.items():
+            self.assertEqual(embedding.shape, (1, 2))
+            self.assertEqual(embedding[0, 0], len(text))
+        stats = batcher.stats()
+        self.assertEqual(stats["texts"], 5)
+        self.assertGreater(stats["mean_batch_size"], 1.0)
+
+    def test_errors_reach_every_caller(self):
+        def encode(texts):
+            raise RuntimeError("model failed")
+        batcher = EmbeddingBatcher(encode, window_ms=1)
+        with self.assertRaises(RuntimeError):
+            batcher.encode(["a"])
+        batcher.close()
+
+    def test_encode_after_close_raises(self):
+        batcher = EmbeddingBatcher(lambda texts: np.ones((len(texts), 2), dtype=np.float32), window_ms=1, workers=2)
+        self.assertEqual(batcher.encode(["a"]).shape, (1, 2))
+        batcher.close()
+        batcher.close()
+        with self.assertRaisesRegex(RuntimeError, "closed"):
+            batcher.encode(["b"])
+
+class SlowHashingEmbedder(benchmark_retrieval.HashingEmbedder):
+    """
+    HashingEmbedder that takes a fixed time per call, so concurrent calls overlap.
+    Module-level so spawned pool workers can unpickle it.
+    """
+    def encode(self, texts, **kwargs):
+        time.sleep(0.2)
+        return super().encode(texts, **kwargs)
+
+class HangingHashingEmbedder(benchmark_retrieval.HashingEmbedder):
+    """
+    HashingEmbedder that never returns for the text "hang", like a wedged model call.
+    """
+    def encode(self, texts, **kwargs):
+        if "hang" in texts:
+            threading.Event().wait()
+        return super().encode(texts, **kwargs)
+
+class BusyProbe:
+    """
+    Wraps an embedder and records the most encode calls that were running at the same time.
+    """
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.busy = 0
+        self.max_busy = 0
+        self._lock = threading.Lock()
+
+    def encode(self, texts, **kwargs):
+        with self._lock:
+            self.busy += 1
+            self.max_busy = max(self.max_busy, self.busy)
+        try:
+            return self.embedder.encode(texts, **kwargs)
+        finally:
+            with self._lock:
+                self.busy -= 1
+
+class TestEmbeddingWorkerPool(unittest.TestCase):
+    def test_workers_match_in_process_encoding(self):
+        """Vectors come back through shared memory unchanged, also for requests split into parts."""
+        texts = [f"Cohort {i} of the Data Analyst Fellowship" for i in range(25)]
+        expected = benchmark_retrieval.HashingEmbedder(dim=16).encode(texts)
+        pool = EmbeddingWorkerPool(functools.partial(benchmark_retrieval.HashingEmbedder, dim=16), workers=2,
+                                   max_texts=8)
+        try:
+            self.assertEqual(pool.get_sentence_embedding_dimension(), 16)
+            np.testing.assert_array_equal(pool.encode(texts), expected)
+
+            results = {}
+            def encode(i):
+                results[i] = pool.encode(texts[i:i + 3])
+            threads = [threading.Thread(target=encode, args=(i,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for i, vectors in results.items():
+                np.testing.assert_array_equal(vectors, expected[i:i + 3])
+            stats = pool.stats()
+            self.assertEqual(stats["alive"], 2)
+            self.assertEqual(sum(stats["requests_per_worker"]), 9)
+        finally:
+            pool.close()
+        self.assertFalse(any(worker.process.is_alive() for worker in pool._workers))
+
+    def test_load_failure_is_reported(self):
+        with self.assertRaises(RuntimeError):
+            EmbeddingWorkerPool(functools.partial(benchmark_retrieval.load_embedder, "no-such-backend"), workers=1)
+
+    def test_dead_worker_is_replaced(self):
+        """A killed worker fails at most the request it was serving; later calls are answered."""
+        texts = ["UI/UX Design Fellowship", "Product Management Fellowship"]
+        expected = benchmark_retrieval.HashingEmbedder(dim=16).encode(texts)
+        pool = EmbeddingWorkerPool(functools.partial(benchmark_retrieval.HashingEmbedder, dim=16), workers=1,
+                                   acquire_timeout=60.0)
+        try:
+            dead = pool._workers[0]
+            dead.process.kill()
+            dead.process.join()
+            with self.assertRaises(RuntimeError):
+                pool.encode(texts)
+            self.assertIsNone(dead.shm)
+            np.testing.assert_array_equal(pool.encode(texts), expected)
+            self.assertEqual(pool.stats()["restarts"], 1)
+        finally:
+            pool.close()
+
+    def test_hung_worker_is_killed_and_replaced(self):
+        """A worker that stops answering fails its request after encode_timeout and is restarted."""
+        texts = ["UI/UX Design Fellowship", "Product Management Fellowship"]
+        expected = benchmark_retrieval.HashingEmbedder(dim=16).encode(texts)
+        pool = EmbeddingWorkerPool(functools.partial(HangingHashingEmbedder, dim=16), workers=1, encode_timeout=1.0)
+        try:
+            hung = pool._workers[0]
+            started = time.monotonic()
+            with self.assertRaisesRegex(RuntimeError, "did not answer"):
+                pool.encode(["hang"])
+            self.assertLess(time.monotonic() - started, 10.0)
+            self.assertFalse(hung.process.is_alive())
+            np.testing.assert_array_equal(pool.encode(texts), expected)
+            self.assertEqual(pool.stats()["restarts"], 1)
+        finally:
+            pool.close()
+
+    def test_batcher_keeps_every_worker_busy(self):
+        """With micro-batching on, the engine still encodes on more than one pool worker at a time."""
+        pool = EmbeddingWorkerPool(functools.partial(SlowHashingEmbedder, dim=16), workers=2)
+        probe = BusyProbe(pool)
+        engine = RetrievalEngine(embedder=probe, lazy=True, batch_window_ms=1, max_batch_size=1, embedder_workers=2)
+        try:
+            threads = [threading.Thread(target=engine.batcher.encode, args=([f"query {i}"],)) for i in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(probe.max_busy, 2)
+            self.assertTrue(all(pool.stats()["requests_per_worker"]))
+        finally:
+            engine.close()
+            pool.close()
+
+    def test_pool_without_workers_fails_fast(self):
+        pool = EmbeddingWorkerPool(functools.partial(benchmark_retrieval.HashingEmbedder, dim=16), workers=1,
+                                   max_restarts=0)
+        try:
+            pool._workers[0].process.kill()
+            pool._workers[0].process.join()
+            with self.assertRaises(RuntimeError):
+                pool.encode(["Data Analyst Fellowship"])
+            started = time.monotonic()
+            with self.assertRaisesRegex(RuntimeError, "No embedding workers left"):
+                pool.encode(["Data Analyst Fellowship"])
+            self.assertLess(time.monotonic() - started, 1.0)
+        finally:
+            pool.close()
+
+class TestLexicalIndex(unittest.TestCase):
+    def setUp(self):
+        self.texts = [
+            "Tools you learn: Figma, Miro and Maze",
+            "Cohort 29 starts on March 7",
+            "Cohort 30 starts in May",
+            "Average salary hike of 8 LPA after the fellowship",
+        ]
+        self.index = BM25Index()
+        self.index.build(self.texts)
+
+    def test_tokenize_keeps_exact_terms(self):
+        self.assertEqual(tokenize("What is Cohort 29's LPA?"), ["cohort", "29", "s", "lpa"])
+
+    def test_exact_terms_rank_first(self):
+        for query, expected in [("figma", 0), ("Cohort 29", 1), ("LPA", 3)]:
+            scores, rows = self.index.search(query, k=2)
+            self.assertEqual(rows[0], expected)
+            self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_only_matching_rows_are_returned(self):
+        _, rows = self.index.search("cohort", k=10)
+        self.assertEqual(sorted(rows.tolist()), [1, 2])
+        _, rows = self.index.search("blockchain", k=10)
+        self.assertEqual(len(rows), 0)
+
+class TestFacets(unittest.TestCase):
+    def setUp(self):
+        self.chunks = [
+            {"metadata": {"course": "Product Management Fellowship", "type": "faq"}},
+            {"metadata": {"course": "Product Management Fellowship", "type": "review"}},
+            {"metadata": {"course": "Data Analyst Fellowship", "type": "faq"}},
+            {"metadata": {"course": "Data Analyst Fellowship", "type": "overview"}},
+        ]
+        self.facets = FacetIndex()
+        self.facets.build(self.chunks)
+
+    def test_select_intersects_fields(self):
+        self.assertIsNone(self.facets.select(None))
+        self.assertEqual(self.facets.select({"type": "faq"}).tolist(), [0, 2])
+        self.assertEqual(self.facets.select({"course": "Data Analyst Fellowship", "type": ["faq", "review"]}).tolist(), [2])
+        self.assertEqual(len(self.facets.select({"course": "Unknown"})), 0)
+        with self.assertRaises(ValueError):
+            self.facets.select({"instructor": "x"})
+
+    def test_router_needs_exactly_one_course(self):
+        router = CourseRouter(self.facets.values("course"))
+        self.assertEqual(router.route("How long is the PM fellowship?"), "Product Management Fellowship")
+        self.assertEqual(router.route("Is there a data analytics course"), "Data Analyst Fellowship")
+        self.assertIsNone(router.route("Product management or data analyst?"))
+        self.assertIsNone(router.route("What courses do you offer?"))
+        # Aliases only match whole words
+        self.assertIsNone(router.route("Classes start at 7pm"))
+        # Bare short aliases need course context and never follow a number
+        self.assertIsNone(router.route("Does class start at 7 pm"))
+        self.assertIsNone(router.route("Is the cohort call at 7 pm?"))
+        self.assertEqual(router.route("Does the PM cohort start at 7 pm?"), "Product Management Fellowship")
+        self.assertEqual(router.route("Who are the mentors for PM?"), "Product Management Fellowship")
+
+class FakeEmbedder:
+    """
+    Deterministic stand-in for SentenceTransformer: known texts map to fixed vectors,
+    anything else to a seeded random vector. Counts encode calls.
+    """
+    def __init__(self, vectors_by_text, dim):
+        self.vectors_by_text = vectors_by_text
+        self.dim = dim
+        self.calls = []
+
+    def encode(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        rows = []
+        for text in texts:
+            if text in self.vectors_by_text:
+                rows.append(self.vectors_by_text[text])
+            else:
+                rows.append(np.random.RandomState(sum(map(ord, text))).normal(size=self.dim))
+        return np.asarray(rows, dtype=np.float32)
+
+def build_test_knowledge_base(db_file, num_chunks=50, dim=16):
+    """
+    Writes a small knowledge base and returns (chunks, vectors).
+    """
+    rng = np.random.RandomState(7)
+    vectors = rng.normal(size=(num_chunks, dim)).astype(np.float32)
+    courses = ["Product Management Fellowship", "UI/UX Designer Fellowship"]
+    types = ["overview", "faq", "review"]
+    chunks = [{"text": f"Course: {courses[i % 2]} chunk {i}",
+               "metadata": {"course": courses[i % 2], "type": types[i % 3]}} for i in range(num_chunks)]
+    conn = sqlite3.connect(db_file)
+    vector_store.create_schema(conn)
+    with conn:
+        vector_store.bulk_insert(conn, chunks, vectors)
+        vector_store.bump_version(conn)
+    vector_store.export_normalized_matrix(conn, *vector_store.sidecar_paths(db_file))
+    conn.close()
+    return chunks, vectors
+
+class TestRetrievalEngineOffline(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp_dir.name, "kb.db")
+        self.chunks, self.vectors = build_test_knowledge_base(self.db_file)
+        self.embedder = FakeEmbedder({c["text"]: v for c, v in zip(self.chunks, self.vectors)}, self.vectors.shape[1])
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_engine(self, **kwargs):
+        return RetrievalEngine(db_file=self.db_file, embedder=self.embedder, **kwargs)
+
+    def test_search_batch_uses_one_encode_call(self):
+        """search_batch encodes all queries at once and matches per-query search."""
+        engine = self.make_engine()
+        queries = [self.chunks[3]["text"], self.chunks[11]["text"], "unrelated question"]
+        batch = engine.search_batch(queries, k=4)
+        self.assertEqual(self.embedder.calls[-1], queries)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch[0][0]["content"], self.chunks[3]["text"])
+        self.assertEqual(batch[1][0]["content"], self.chunks[11]["text"])
+        for query, results in zip(queries, batch):
+            single = engine.search(query, k=4)
+            self.assertEqual([r["content"] for r in single], [r["content"] for r in results])
+
+    def test_query_cache_skips_encode(self):
+        """Repeated queries (modulo case/whitespace) are served from the embedding cache."""
+        engine = self.make_engine()
+        engine.search("What is the duration?", k=3)
+        calls = len(self.embedder.calls)
+        engine.search("  what is THE   duration? ", k=3)
+        self.assertEqual(len(self.embedder.calls), calls)
+        stats = engine.query_cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_batched_engine_matches_direct(self):
+        """Routing encodes through the micro-batcher does not change results."""
+        query = self.chunks[8]["text"]
+        direct = self.make_engine(query_cache_size=0).search(query, k=3)
+        engine = self.make_engine(query_cache_size=0, batch_window_ms=2)
+        batched = engine.search(query, k=3)
+        engine.batcher.close()
+        self.assertEqual([r["content"] for r in direct], [r["content"] for r in batched])
+        self.assertEqual(engine.batcher.stats()["batches"], 1)
+
+    def test_mmap_engine_matches_in_memory(self):
+        """The memory-mapped engine ranks exactly like the in-memory one."""
+        query = self.chunks[5]["text"]
+        in_memory = self.make_engine().search(query, k=5)
+        mapped_engine = self.make_engine(use_mmap=True)
+        self.assertIsInstance(mapped_engine.embedding_matrix, np.memmap)
+        mapped = mapped_engine.search(query, k=5)
+        self.assertEqual([r["content"] for r in in_memory], [r["content"] for r in mapped])
+        del mapped_engine
+
+    def test_int8_engine_over_mmap_matches_exact(self):
+        """Quantized first pass + rescoring from the memory-mapped matrix ranks like brute force."""
+        query = self.chunks[21]["text"]
+        exact = self.make_engine(fusion="none").search(query, k=5)
+        engine = self.make_engine(fusion="none", use_mmap=True, index_backend="int8")
+        self.assertIsInstance(engine.embedding_matrix, np.memmap)
+        quantized = engine.search(query, k=5)
+        self.assertEqual([r["id"] for r in exact], [r["id"] for r in quantized])
+        self.assertAlmostEqual(exact[0]["score"], quantized[0]["score"], places=5)
+        del engine
+
+    def test_hybrid_fusion_surfaces_exact_terms(self):
+        """A query whose embedding is unrelated still finds the chunk with its exact terms."""
+        query = "17"
+        target = self.chunks[17]["text"]
+        vector_only = self.make_engine(fusion="none").search(query, k=3)
+        self.assertNotIn(target, [r["content"] for r in vector_only])
+        vector = self.make_engine(fusion="none").embed_queries([query])[0]
+        for fusion in ("rrf", "weighted"):
+            results = self.make_engine(fusion=fusion, lexical_weight=0.5).search(query, k=3)
+            self.assertIn(target, [r["content"] for r in results])
+            self.assertTrue(all("fused_score" in r for r in results))
+            # "score" remains the cosine similarity, also for rows found only by BM25
+            result = next(r for r in results if r["content"] == target)
+            expected = np.dot(self.vectors[17] / np.linalg.norm(self.vectors[17]), vector)
+            self.assertAlmostEqual(result["score"], float(expected), places=5)
+            self.assertEqual(result["lexical_rank"], 0)
+
+    def test_filtered_search_scores_only_the_slice(self):
+        """Filtered results come from the slice and match exact search over those rows."""
+        course = "UI/UX Designer Fellowship"
+        query = self.chunks[4]["text"] # A Product Management chunk
+        engine = self.make_engine(fusion="none")
+        results = engine.search(query, k=5, filters={"course": course, "type": "faq"})
+        rows = [i for i, c in enumerate(self.chunks) if c["metadata"] == {"course": course, "type": "faq"}]
+        self.assertTrue(all(r["metadata"]["course"] == course and r["metadata"]["type"] == "faq" for r in results))
+
+        vector = engine.embed_queries([query])[0]
+        normalized = self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        expected = sorted(rows, key=lambda row: -np.dot(normalized[row], vector))[:5]
+        self.assertEqual([r["content"] for r in results], [self.chunks[row]["text"] for row in expected])
+        self.assertEqual(engine.search(query, k=5, filters={"course": "Unknown"}), [])
+
+    def test_course_router_filters_queries(self):
+        """With routing on, a query naming one course only returns that course's chunks."""
+        engine = self.make_engine(route_courses=True)
+        results = engine.search("What does the UI/UX fellowship cover?", k=10)
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(r["metadata"]["course"] == "UI/UX Designer Fellowship" for r in results))
+        # Explicit filters win over the router
+        results = engine.search("What does the UI/UX fellowship cover?", k=3,
+                                filters={"course": "Product Management Fellowship"})
+        self.assertTrue(all(r["metadata"]["course"] == "Product Management Fellowship" for r in results))
+
+    def test_reload_swaps_snapshot(self):
+        """reload() picks up a rebuilt database atomically and is a no-op when nothing changed."""
+        engine = self.make_engine(query_cache_size=0)
+        self.assertFalse(engine.reload())
+        old_snapshot, old_version = engine._kb, engine.kb_version
+
+        new_chunk = {"text": "Course: Data Analytics chunk new", "metadata": {"course": "Data Analytics", "type": "faq"}}
+        new_vector = np.ones((1, self.vectors.shape[1]), dtype=np.float32)
+        self.embedder.vectors_by_text[new_chunk["text"]] = new_vector[0]
+        conn = sqlite3.connect(self.db_file)
+        with conn:
+            vector_store.bulk_insert(conn, [new_chunk], new_vector)
+            vector_store.bump_version(conn)
+        conn.close()
+
+        self.assertTrue(engine.has_update())
+        self.assertTrue(engine.reload())
+        self.assertNotEqual(engine.kb_version, old_version)
+        self.assertEqual(len(engine.chunks), len(self.chunks) + 1)
+        self.assertEqual(engine.search(new_chunk["text"], k=1)[0]["content"], new_chunk["text"])
+        # The previous snapshot is left intact for searches that were already running
+        self.assertEqual(len(old_snapshot.chunks), len(self.chunks))
+        self.assertIsNot(engine.snapshot(), old_snapshot)
+        pinned = engine.search(new_chunk["text"], k=1, kb=old_snapshot)
+        self.assertNotEqual(pinned[0]["content"], new_chunk["text"])
+        self.assertFalse(engine.reload())
+
+    def test_lazy_engine_loads_in_background(self):
+        """A lazy engine returns at once, loads on a background thread and warms up the model."""
+        engine = self.make_engine(lazy=True)
+        self.assertFalse(engine.ready)
+        self.assertEqual(len(engine.chunks), 0)
+        self.assertEqual(engine.load_status()["stage"], "not_started")
+        self.assertEqual(self.embedder.calls, [])
+
+        engine.start_loading()
+        self.assertTrue(engine.wait_until_ready(timeout=10))
+        status = engine.load_status()
+        self.assertEqual(status["stage"], "ready")
+        self.assertEqual(status["chunks"], len(self.chunks))
+        self.assertEqual(set(status["completed_stages_seconds"]), {"model", "knowledge_base", "warmup"})
+        self.assertEqual(len(self.embedder.calls), 1)
+        self.assertEqual(engine.search(self.chunks[4]["text"], k=1)[0]["content"], self.chunks[4]["text"])
+
+    def test_lazy_engine_reports_load_failure(self):
+        class BrokenEmbedder:
+            def encode(self, texts, **kwargs):
+                raise OSError("model files missing")
+        engine = RetrievalEngine(db_file=self.db_file, embedder=BrokenEmbedder(), lazy=True)
+        engine.start_loading()
+        with self.assertRaises(RuntimeError):
+            engine.wait_until_ready(timeout=10)
+        self.assertEqual(engine.load_status()["stage"], "failed")
+        self.assertIn("model files missing", engine.load_status()["error"])
+
+    def test_import_does_not_load_sentence_transformers(self):
+        """Importing the engine stays cheap; the model library is imported on first use."""
+        import subprocess
+        code = "import sys, retrieval_engine; print('sentence_transformers' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip().splitlines()[-1], "False")
+
+class TestBenchmarkHarness(unittest.TestCase):
+    def test_report_is_machine_readable(self):
+        """A tiny run reports latency percentiles, memory and recall per backend as JSON."""
+        report = benchmark_retrieval.run_benchmark(sizes=[2], backends=["brute", "int8", "nope"],
+                                                   embedder_name="hashing", num_questions=10)
+        report = json.loads(json.dumps(report))
+        corpus = report["corpora"][0]
+        self.assertEqual(corpus["courses"], 2)
+        self.assertGreater(corpus["chunks"], 0)
+        brute, int8, unknown = corpus["results"]
+        for result in (brute, int8):
+            for key in ("load_seconds", "latency_ms_p50", "latency_ms_p95", "latency_ms_p99",
+                        "throughput_qps", "index_memory_mb", "recall_at_5"):
+                self.assertIn(key, result)
+            self.assertLessEqual(result["latency_ms_p50"], result["latency_ms_p99"])
+        self.assertLess(int8["index_memory_mb"], brute["index_memory_mb"])
+        self.assertIn("skipped", unknown)
+
 if __name__ == '__main__':
     unittest.main()
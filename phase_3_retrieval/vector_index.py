@@ -0,0 +1,399 @@
+
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import numpy as np
+from typing import Dict, Any, Tuple, List, Optional
+
+from vector_store import DB_FILE, load_vectors, normalize_rows, ids_checksum, matrix_checksum, atomic_file
+
+# Configuration
+DEFAULT_BACKEND = "brute"
+
+def top_k(similarities: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Row-wise top-k of a (num_queries, num_rows) score matrix. np.argpartition selects the k
+    best in O(n) and only those k are sorted, instead of argsorting every row in full.
+    """
+    num_rows = similarities.shape[1]
+    k = min(k, num_rows)
+    if k <= 0:
+        empty = np.empty((similarities.shape[0], 0))
+        return empty.astype(similarities.dtype), empty.astype(np.int64)
+    if k < num_rows:
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(num_rows), (similarities.shape[0], 1))
+    candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1)
+    return np.take_along_axis(candidate_scores, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+class VectorIndex:
+    """
+    Inner-product index over the L2-normalized embedding matrix.
+    search() takes a (num_queries, dim) matrix and returns (scores, indices), both shaped
+    (num_queries, k). Missing results are marked with index -1.
+    """
+    backend = "base"
+    persistent = False
+
+    def __init__(self, **params):
+        self.params = params
+        self.matrix = None
+
+    def build(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def save(self, path: str) -> Optional[str]:
+        """
+        Persists the index; returns the sha256 of the written file.
+        """
+        return None
+
+    def load(self, path: str, matrix: np.ndarray) -> Optional[str]:
+        """
+        Loads a persisted index; returns the sha256 of the bytes it was loaded from.
+        """
+        self.matrix = matrix
+        return None
+
+    def memory_bytes(self) -> int:
+        """
+        Bytes the index keeps resident for the first-pass search.
+        """
+        return int(self.matrix.nbytes) if self.matrix is not None else 0
+
+class BruteForceIndex(VectorIndex):
+    """
+    Exact search: one matrix-matrix product for the whole query batch. Default backend.
+    """
+    backend = "brute"
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        similarities = np.dot(queries, self.matrix.T)
+        return top_k(similarities, k)
+
+class FaissIndex(VectorIndex):
+    """
+    Base for FAISS approximate indexes. Candidates returned by FAISS are rescored exactly
+    against the normalized matrix, so scores stay comparable with the brute force backend.
+    """
+    persistent = True
+
+    def __init__(self, **params):
+        super().__init__(**params)
+        try:
+            import faiss
+        except ImportError:
+            raise ImportError(f"The '{self.backend}' index backend requires FAISS: pip install faiss-cpu")
+        self.faiss = faiss
+        self.index = None
+
+    def _create(self, dim: int, num_rows: int):
+        raise NotImplementedError
+
+    def _apply_search_params(self):
+        pass
+
+    def build(self, matrix: np.ndarray):
+        self.matrix = matrix
+        data = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.index = self._create(data.shape[1], data.shape[0])
+        if not self.index.is_trained:
+            self.index.train(data)
+        self.index.add(data)
+        self._apply_search_params()
+
+    def set_search_params(self, **params):
+        """
+        Adjusts query-time knobs (ef_search, nprobe) without rebuilding.
+        """
+        self.params.update(params)
+        self._apply_search_params()
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.matrix.shape[0])
+        _, indices = self.index.search(np.ascontiguousarray(queries, dtype=np.float32), k)
+
+        # Exact rescoring of the candidates
+        safe = np.where(indices < 0, 0, indices)
+        scores = np.einsum("qkd,qd->qk", self.matrix[safe.ravel()].reshape(safe.shape + (-1,)), queries)
+        scores = np.where(indices < 0, -np.inf, scores)
+        order = np.argsort(scores, axis=1)[:, ::-1]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def memory_bytes(self) -> int:
+        # Serialized size approximates what FAISS holds in memory (graph / codes, not the matrix)
+        return int(self.faiss.serialize_index(self.index).nbytes) if self.index is not None else 0
+
+    def save(self, path: str) -> str:
+        data = self.faiss.serialize_index(self.index).tobytes()
+        with atomic_file(path) as f:
+            f.write(data)
+        return hashlib.sha256(data).hexdigest()
+
+    def load(self, path: str, matrix: np.ndarray) -> str:
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.matrix = matrix
+        self.index = self.faiss.deserialize_index(np.frombuffer(data, dtype=np.uint8))
+        self._apply_search_params()
+        return hashlib.sha256(data).hexdigest()
+
+class HNSWIndex(FaissIndex):
+    """
+    Graph index (faiss.IndexHNSWFlat). Higher ef_search raises recall and latency.
+    """
+    backend = "hnsw"
+
+    def __init__(self, M: int = 32, ef_construction: int = 200, ef_search: int = 64):
+        super().__init__(M=M, ef_construction=ef_construction, ef_search=ef_search)
+
+    def _create(self, dim: int, num_rows: int):
+        index = self.faiss.IndexHNSWFlat(dim, self.params["M"], self.faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = self.params["ef_construction"]
+        return index
+
+    def _apply_search_params(self):
+        if self.index is not None:
+            self.index.hnsw.efSearch = self.params["ef_search"]
+
+class IVFPQIndex(FaissIndex):
+    """
+    Inverted file with product quantization (faiss.IndexIVFPQ). Higher nprobe raises recall
+    and latency. nlist and nbits are clamped on small corpora so training stays valid.
+    """
+    backend = "ivfpq"
+
+    def __init__(self, nlist: int = 256, m: int = 16, nbits: int = 8, nprobe: int = 16):
+        super().__init__(nlist=nlist, m=m, nbits=nbits, nprobe=nprobe)
+
+    def _create(self, dim: int, num_rows: int):
+        nlist = max(1, min(self.params["nlist"], num_rows // 39))
+        nbits = max(1, min(self.params["nbits"], int(np.log2(max(2, num_rows))) - 1))
+        m = self.params["m"] if dim % self.params["m"] == 0 else 1
+        if (nlist, nbits, m) != (self.params["nlist"], self.params["nbits"], self.params["m"]):
+            print(f"Note: IVF-PQ clamped to nlist={nlist}, m={m}, nbits={nbits} for {num_rows} rows.")
+
+        # Keep a reference so the quantizer outlives the Python wrapper
+        self.quantizer = self.faiss.IndexFlatIP(dim)
+        return self.faiss.IndexIVFPQ(self.quantizer, dim, nlist, m, nbits, self.faiss.METRIC_INNER_PRODUCT)
+
+    def _apply_search_params(self):
+        if self.index is not None:
+            self.index.nprobe = self.params["nprobe"]
+
+class ScalarQuantizedIndex(VectorIndex):
+    """
+    First pass over a compact copy of the matrix, then exact rescoring of the best
+    k * rescore candidates against the float32 matrix. int8 stores one byte per dimension
+    with a symmetric per-dimension scale; float16 stores two. Combined with use_mmap the
+    float32 matrix stays on disk and only candidate rows are read, so resident memory per
+    worker is the codes (4x or 2x smaller). Codes are widened to float32 block_rows at a
+    time, so the first pass stays close to brute force speed for int8; numpy has no fast
+    float16 matmul, so float16 trades latency for its better first-pass accuracy.
+    """
+    dtype = None
+
+    def __init__(self, rescore: int = 4, block_rows: int = 4096):
+        super().__init__(rescore=rescore, block_rows=block_rows)
+        self.codes = None
+        self.scale = None
+
+    def _quantize(self, block: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def build(self, matrix: np.ndarray):
+        self.matrix = matrix
+        block_rows = self.params["block_rows"]
+        self.codes = np.empty(matrix.shape, dtype=self.dtype)
+        for start in range(0, matrix.shape[0], block_rows):
+            self.codes[start:start + block_rows] = self._quantize(np.asarray(matrix[start:start + block_rows], dtype=np.float32))
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        num_rows = self.codes.shape[0]
+        k = min(k, num_rows)
+        block_rows = self.params["block_rows"]
+        scaled = queries * self.scale if self.scale is not None else queries
+
+        # Approximate scores, converting one block of codes to float32 at a time
+        approx = np.empty((queries.shape[0], num_rows), dtype=np.float32)
+        for start in range(0, num_rows, block_rows):
+            block = self.codes[start:start + block_rows].astype(np.float32)
+            approx[:, start:start + block_rows] = np.dot(scaled, block.T)
+        _, candidates = top_k(approx, max(k, k * self.params["rescore"]))
+
+        # Exact rescoring of the candidates only
+        rows = np.asarray(self.matrix[candidates.ravel()], dtype=np.float32).reshape(candidates.shape + (-1,))
+        scores = np.einsum("qkd,qd->qk", rows, queries)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+    def memory_bytes(self) -> int:
+        scale_bytes = self.scale.nbytes if self.scale is not None else 0
+        return int(self.codes.nbytes + scale_bytes) if self.codes is not None else 0
+
+class Int8Index(ScalarQuantizedIndex):
+    """
+    Scalar int8 quantization: code = round(x / scale), scale = max |x| per dimension / 127.
+    """
+    backend = "int8"
+    dtype = np.int8
+
+    def build(self, matrix: np.ndarray):
+        block_rows = self.params["block_rows"]
+        max_abs = np.zeros(matrix.shape[1], dtype=np.float32)
+        for start in range(0, matrix.shape[0], block_rows):
+            max_abs = np.maximum(max_abs, np.abs(matrix[start:start + block_rows]).max(axis=0))
+        self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+        super().build(matrix)
+
+    def _quantize(self, block: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(block / self.scale), -127, 127)
+
+class Float16Index(ScalarQuantizedIndex):
+    """
+    Half-precision copy of the matrix.
+    """
+    backend = "float16"
+    dtype = np.float16
+
+    def _quantize(self, block: np.ndarray) -> np.ndarray:
+        return block
+
+INDEX_BACKENDS = {
+    BruteForceIndex.backend: BruteForceIndex,
+    HNSWIndex.backend: HNSWIndex,
+    IVFPQIndex.backend: IVFPQIndex,
+    Int8Index.backend: Int8Index,
+    Float16Index.backend: Float16Index,
+}
+
+def create_index(backend: str = DEFAULT_BACKEND, **params) -> VectorIndex:
+    if backend not in INDEX_BACKENDS:
+        raise ValueError(f"Unknown index backend '{backend}'. Choose from: {', '.join(INDEX_BACKENDS)}")
+    return INDEX_BACKENDS[backend](**params)
+
+def index_paths(db_file: str, backend: str) -> Tuple[str, str]:
+    """
+    Paths of a persisted index and its metadata, stored next to the database.
+    """
+    base = os.path.splitext(db_file)[0]
+    return f"{base}.{backend}.faiss", f"{base}.{backend}.json"
+
+def load_or_build_index(matrix: np.ndarray, chunks: List[Dict[str, Any]], backend: str = DEFAULT_BACKEND,
+                        params: Optional[Dict[str, Any]] = None, db_file: str = DB_FILE) -> VectorIndex:
+    """
+    Returns a ready index for the given matrix. Persistent backends are reloaded from disk when
+    the saved index matches the current chunk ids, vectors and build parameters, and rebuilt
+    otherwise. The vectors are compared because a rebuilt database reuses the same ids. The meta
+    also records the sha256 of the index file, so an index and meta written by two different
+    processes racing to build it are detected and rebuilt.
+    """
+    index = create_index(backend, **(params or {}))
+    if not index.persistent:
+        index.build(matrix)
+        return index
+
+    index_file, meta_file = index_paths(db_file, backend)
+    checksum = ids_checksum([chunk["id"] for chunk in chunks])
+    vectors_checksum = matrix_checksum(matrix)
+    if os.path.exists(index_file) and os.path.exists(meta_file):
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta.get("ids_sha256") == checksum and meta.get("vectors_sha256") == vectors_checksum
+                and meta.get("build_params") == _build_params(index)):
+            print(f"Loading {backend} index from {index_file}...")
+            if index.load(index_file, matrix) == meta.get("index_sha256"):
+                return index
+            print(f"Warning: {index_file} does not match its metadata, rebuilding.")
+
+    build_params = _build_params(index)
+    print(f"Building {backend} index over {len(chunks)} vectors...")
+    index.build(matrix)
+    index_checksum = index.save(index_file)
+    with atomic_file(meta_file, 'w') as f:
+        json.dump({"backend": backend, "ids_sha256": checksum, "vectors_sha256": vectors_checksum,
+                   "index_sha256": index_checksum, "build_params": build_params}, f, indent=2)
+    return index
+
+def remove_persisted_indexes(db_file: str = DB_FILE) -> List[str]:
+    """
+    Deletes the saved indexes of every persistent backend next to a database, so the next load
+    rebuilds them from the current vectors. Returns the removed paths.
+    """
+    removed = []
+    for backend, index_class in INDEX_BACKENDS.items():
+        if not getattr(index_class, "persistent", False):
+            continue
+        for path in index_paths(db_file, backend):
+            if os.path.exists(path):
+                os.remove(path)
+                removed.append(path)
+    return removed
+
+def _build_params(index: VectorIndex) -> Dict[str, Any]:
+    # Query-time knobs can change without invalidating the saved index
+    return {key: value for key, value in index.params.items() if key not in ("ef_search", "nprobe")}
+
+def evaluate_index(index: VectorIndex, matrix: np.ndarray, queries: np.ndarray, k: int = 5) -> Dict[str, float]:
+    """
+    Compares an index against exact search: recall@k, mean latency per query and the
+    resident memory of the index next to that of the float32 matrix.
+    """
+    exact = BruteForceIndex()
+    exact.build(matrix)
+    _, truth = exact.search(queries, k)
+
+    start = time.perf_counter()
+    for query in queries:
+        _, found = index.search(query[np.newaxis, :], k)
+    elapsed = time.perf_counter() - start
+    _, found = index.search(queries, k)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth.tolist(), found.tolist()))
+    float32_bytes = matrix.shape[0] * matrix.shape[1] * 4
+    return {
+        "recall_at_k": hits / float(truth.size),
+        "mean_latency_ms": 1000 * elapsed / len(queries),
+        "index_memory_mb": index.memory_bytes() / 2**20,
+        "float32_matrix_mb": float32_bytes / 2**20,
+        "memory_saved_pct": 100.0 * (1 - index.memory_bytes() / float(float32_bytes)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a persisted vector index and measure its recall")
+    parser.add_argument("--db", type=str, default=DB_FILE, help="Path to the SQLite knowledge base")
+    parser.add_argument("--backend", choices=list(INDEX_BACKENDS), default="hnsw")
+    parser.add_argument("--params", type=str, default="{}",
+                        help='JSON index parameters, e.g. \'{"M": 32, "ef_search": 128}\', \'{"nlist": 256, "nprobe": 32}\' or \'{"rescore": 8}\'')
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--num-queries", type=int, default=200, help="Perturbed corpus rows used as evaluation queries")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Error: Database file {args.db} not found.")
+        sys.exit(1)
+
+    conn = sqlite3.connect(args.db)
+    chunks, matrix = load_vectors(conn)
+    conn.close()
+    matrix = normalize_rows(matrix)
+
+    index = load_or_build_index(matrix, chunks, args.backend, json.loads(args.params), db_file=args.db)
+
+    rng = np.random.RandomState(0)
+    rows = rng.choice(len(chunks), size=min(args.num_queries, len(chunks)), replace=False)
+    queries = normalize_rows(matrix[rows] + rng.normal(scale=0.05, size=matrix[rows].shape).astype(np.float32))
+    report = evaluate_index(index, matrix, queries, k=args.k)
+    print(json.dumps({"backend": args.backend, "params": index.params, **report}, indent=2))
+
+if __name__ == "__main__":
+    main()
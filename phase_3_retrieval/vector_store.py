@@ -0,0 +1,335 @@
+
+import os
+import sys
+import json
+import uuid
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Dict, Any, Tuple, Iterable, Callable
+
+# Configuration
+DB_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "knowledge_base.db"))
+TABLE_NAME = "course_embeddings"
+BLOB_COLUMN = "embedding_blob"
+HASH_COLUMN = "content_hash"
+META_TABLE = "kb_meta"
+VECTOR_DTYPE = np.float32
+
+def sidecar_paths(db_file: str = DB_FILE) -> Tuple[str, str]:
+    """
+    Paths of the pre-normalized matrix (.npy) and its manifest stored next to a database.
+    The matrix is opened read-only with np.load(mmap_mode='r') so server workers share it.
+    """
+    base = os.path.splitext(db_file)[0]
+    return base + ".npy", base + ".manifest.json"
+
+@contextmanager
+def atomic_file(path: str, mode: str = "wb"):
+    """
+    Yields a temp file with a unique name in path's directory and renames it over path when the
+    block completes. Concurrent writers (e.g. several server workers) never share a temp file,
+    and readers see either the old or the new file, never a torn one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def vector_to_blob(vector) -> bytes:
+    """
+    Serializes a single embedding as raw little-endian float32 bytes.
+    """
+    return np.ascontiguousarray(vector, dtype="<f4").tobytes()
+
+def blobs_to_matrix(blobs: List[bytes]) -> np.ndarray:
+    """
+    Turns a list of float32 BLOBs into one contiguous (n, dim) matrix with a single copy.
+    """
+    if not blobs:
+        return np.empty((0, 0), dtype=VECTOR_DTYPE)
+    dim = len(blobs[0]) // np.dtype(VECTOR_DTYPE).itemsize
+    buffer = b"".join(blobs)
+    if len(buffer) != len(blobs) * dim * np.dtype(VECTOR_DTYPE).itemsize:
+        raise ValueError("Embedding BLOBs have inconsistent dimensions")
+    return np.frombuffer(buffer, dtype="<f4").reshape(len(blobs), dim).astype(VECTOR_DTYPE, copy=False)
+
+def create_schema(conn: sqlite3.Connection):
+    """
+    Creates the knowledge base tables if needed. The JSON column is kept so older
+    SQL dumps still replay into the same schema.
+    """
+    conn.execute(f"""
+CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content TEXT,
+    metadata JSON,
+    embedding_vector JSON, -- Legacy JSON array, NULL once migrated
+    {BLOB_COLUMN} BLOB, -- float32 little-endian
+    {HASH_COLUMN} TEXT -- sha256 of content + metadata, used for incremental syncs
+)""")
+    ensure_blob_column(conn)
+    ensure_hash_column(conn)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+
+def bulk_insert(conn: sqlite3.Connection, chunks: Iterable[Dict[str, Any]], embeddings: Iterable[np.ndarray]) -> int:
+    """
+    Inserts chunks and their vectors with a single parameter-bound executemany.
+    Both iterables are consumed lazily, so callers can stream batches straight in.
+    Returns the number of inserted rows. The caller owns the transaction.
+    """
+    rows = (
+        (chunk["text"], json.dumps(chunk["metadata"]), vector_to_blob(vector), chunk.get("hash"))
+        for chunk, vector in zip(chunks, embeddings)
+    )
+    cursor = conn.executemany(
+        f"INSERT INTO {TABLE_NAME} (content, metadata, {BLOB_COLUMN}, {HASH_COLUMN}) VALUES (?, ?, ?, ?)", rows
+    )
+    return cursor.rowcount
+
+def ensure_hash_column(conn: sqlite3.Connection):
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")]
+    if HASH_COLUMN not in columns:
+        conn.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {HASH_COLUMN} TEXT")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLE_NAME}_{HASH_COLUMN} ON {TABLE_NAME} ({HASH_COLUMN})")
+
+def backfill_hashes(conn: sqlite3.Connection, hash_fn: Callable[[Dict[str, Any]], str]) -> int:
+    """
+    Fills content_hash for rows written before hashes existed, so their vectors can be reused.
+    hash_fn receives a chunk dict with "text" and "metadata".
+    """
+    rows = conn.execute(f"SELECT id, content, metadata FROM {TABLE_NAME} WHERE {HASH_COLUMN} IS NULL").fetchall()
+    updates = [(hash_fn({"text": content, "metadata": json.loads(metadata)}), chunk_id)
+               for chunk_id, content, metadata in rows]
+    with conn:
+        conn.executemany(f"UPDATE {TABLE_NAME} SET {HASH_COLUMN} = ? WHERE id = ?", updates)
+    return len(updates)
+
+def sync_chunks(conn: sqlite3.Connection, chunks: Iterable[Dict[str, Any]],
+                vectors_fn: Callable[[List[Dict[str, Any]]], np.ndarray], batch_size: int = 256,
+                reuse: bool = True) -> Dict[str, int]:
+    """
+    Brings the table in line with chunks (each carrying a "hash") in place: rows whose hash is
+    still wanted keep their stored vector, stale rows are deleted, and only new or changed chunks
+    are passed to vectors_fn (in batches of batch_size) and inserted. Duplicate chunks are kept
+    as many times as they occur. chunks is consumed once, so it can be a generator; only the
+    stored ids per hash and one batch of new chunks are held in memory. Runs in one transaction
+    (an exception from chunks rolls it back) and bumps the version if anything changed.
+    reuse=False keeps no stored row, e.g. when the new vectors come from a different embedder.
+    """
+    unclaimed = {}
+    for chunk_id, content_hash in conn.execute(f"SELECT id, {HASH_COLUMN} FROM {TABLE_NAME} ORDER BY id"):
+        unclaimed.setdefault(content_hash, deque()).append(chunk_id)
+
+    inserted = kept = 0
+    with conn:
+        batch = []
+        for chunk in chunks:
+            # Each wanted chunk claims the oldest stored row with its hash; the rest are encoded
+            if reuse and unclaimed.get(chunk["hash"]):
+                unclaimed[chunk["hash"]].popleft()
+                kept += 1
+                continue
+            batch.append(chunk)
+            if len(batch) == batch_size:
+                inserted += bulk_insert(conn, batch, vectors_fn(batch))
+                batch = []
+        if batch:
+            inserted += bulk_insert(conn, batch, vectors_fn(batch))
+
+        stale_ids = [chunk_id for chunk_ids in unclaimed.values() for chunk_id in chunk_ids]
+        conn.executemany(f"DELETE FROM {TABLE_NAME} WHERE id = ?", [(chunk_id,) for chunk_id in stale_ids])
+        if stale_ids or inserted:
+            bump_version(conn)
+
+    return {"inserted": inserted, "deleted": len(stale_ids), "kept": kept}
+
+def get_meta(conn: sqlite3.Connection, key: str, default: str = None) -> str:
+    try:
+        row = conn.execute(f"SELECT value FROM {META_TABLE} WHERE key = ?", (key,)).fetchone()
+    except sqlite3.OperationalError:
+        return default
+    return row[0] if row else default
+
+def set_meta(conn: sqlite3.Connection, key: str, value: str):
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {META_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute(f"INSERT OR REPLACE INTO {META_TABLE} (key, value) VALUES (?, ?)", (key, value))
+
+def bump_version(conn: sqlite3.Connection) -> str:
+    """
+    Marks the knowledge base contents as changed. Readers compare this version to know
+    when caches and loaded matrices are out of date.
+    """
+    version = uuid.uuid4().hex
+    set_meta(conn, "version", version)
+    return version
+
+def has_blob_column(conn: sqlite3.Connection) -> bool:
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")]
+    return BLOB_COLUMN in columns
+
+def ensure_blob_column(conn: sqlite3.Connection):
+    if not has_blob_column(conn):
+        conn.execute(f"ALTER TABLE {TABLE_NAME} ADD COLUMN {BLOB_COLUMN} BLOB")
+
+def migrate_json_to_blob(conn: sqlite3.Connection, drop_json: bool = True) -> int:
+    """
+    Converts JSON-encoded embedding_vector rows into float32 BLOBs in place.
+    With drop_json the JSON text is cleared afterwards so the database shrinks.
+    Returns the number of migrated rows.
+    """
+    ensure_blob_column(conn)
+    rows = conn.execute(
+        f"SELECT id, embedding_vector FROM {TABLE_NAME} "
+        f"WHERE {BLOB_COLUMN} IS NULL AND embedding_vector IS NOT NULL"
+    ).fetchall()
+
+    updates = [(vector_to_blob(json.loads(vector_json)), chunk_id) for chunk_id, vector_json in rows]
+    with conn:
+        conn.executemany(f"UPDATE {TABLE_NAME} SET {BLOB_COLUMN} = ? WHERE id = ?", updates)
+        if drop_json:
+            conn.execute(f"UPDATE {TABLE_NAME} SET embedding_vector = NULL WHERE {BLOB_COLUMN} IS NOT NULL")
+
+    if drop_json and updates:
+        conn.execute("VACUUM")
+    return len(updates)
+
+def _row_to_chunk(row) -> Dict[str, Any]:
+    return {"id": row[0], "content": row[1], "metadata": json.loads(row[2])}
+
+def load_chunks(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """
+    Reads chunk ids, content and metadata without touching the vector columns.
+    """
+    rows = conn.execute(f"SELECT id, content, metadata FROM {TABLE_NAME} ORDER BY id").fetchall()
+    return [_row_to_chunk(row) for row in rows]
+
+def load_vectors(conn: sqlite3.Connection) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Reads every chunk and its embedding. Uses the binary column when it is populated
+    and falls back to parsing the legacy JSON column otherwise.
+    Returns (chunks, matrix) where matrix is a contiguous float32 (n, dim) array.
+    """
+    if has_blob_column(conn):
+        rows = conn.execute(
+            f"SELECT id, content, metadata, {BLOB_COLUMN} FROM {TABLE_NAME} ORDER BY id"
+        ).fetchall()
+        if all(row[3] is not None for row in rows):
+            chunks = [_row_to_chunk(row) for row in rows]
+            return chunks, blobs_to_matrix([row[3] for row in rows])
+
+    print("Warning: knowledge base stores JSON vectors. Run 'python vector_store.py --migrate' for faster loading.")
+    rows = conn.execute(
+        f"SELECT id, content, metadata, embedding_vector FROM {TABLE_NAME} ORDER BY id"
+    ).fetchall()
+    chunks = [_row_to_chunk(row) for row in rows]
+    if not rows:
+        return chunks, np.empty((0, 0), dtype=VECTOR_DTYPE)
+    matrix = np.array([json.loads(row[3]) for row in rows], dtype=VECTOR_DTYPE)
+    return chunks, matrix
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / (norm + 1e-10)).astype(VECTOR_DTYPE, copy=False) # Avoid div by zero
+
+def ids_checksum(chunk_ids: List[int]) -> str:
+    return hashlib.sha256(np.asarray(chunk_ids, dtype="<i8").tobytes()).hexdigest()
+
+def matrix_checksum(matrix: np.ndarray, block_rows: int = 65536) -> str:
+    """
+    sha256 of the matrix shape and float32 contents. Read block_rows at a time, so a
+    memory-mapped matrix is never copied whole.
+    """
+    digest = hashlib.sha256(str(tuple(matrix.shape)).encode())
+    for start in range(0, matrix.shape[0], block_rows):
+        digest.update(np.ascontiguousarray(matrix[start:start + block_rows], dtype="<f4").tobytes())
+    return digest.hexdigest()
+
+def export_normalized_matrix(conn: sqlite3.Connection, matrix_file: str, manifest_file: str) -> Dict[str, Any]:
+    """
+    Writes the L2-normalized embedding matrix to a .npy sidecar plus a manifest that ties it
+    to the database rows and version. Both files go through atomic_file, so workers opening
+    them never see a partial file and concurrent exports do not share a temp file.
+    """
+    chunks, matrix = load_vectors(conn)
+    normalized = normalize_rows(matrix) if len(chunks) else matrix
+
+    manifest = {
+        "rows": int(normalized.shape[0]),
+        "dim": int(normalized.shape[1]) if normalized.ndim == 2 else 0,
+        "dtype": np.dtype(VECTOR_DTYPE).name,
+        "normalized": True,
+        "ids_sha256": ids_checksum([chunk["id"] for chunk in chunks]),
+        # A rebuilt database reuses ids 1..N, so the ids alone do not identify the vectors
+        "version": get_meta(conn, "version"),
+    }
+    with atomic_file(matrix_file) as f:
+        np.save(f, np.ascontiguousarray(normalized))
+    with atomic_file(manifest_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def open_normalized_matrix(chunks: List[Dict[str, Any]], matrix_file: str, manifest_file: str,
+                           version: str = None):
+    """
+    Memory-maps the pre-normalized matrix read-only. Every process mapping the same file
+    shares its page-cache pages. Returns None if the sidecar is missing or does not match chunks
+    (or, when given, the knowledge base version).
+    """
+    if not (os.path.exists(matrix_file) and os.path.exists(manifest_file)):
+        return None
+
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get("ids_sha256") != ids_checksum([chunk["id"] for chunk in chunks]):
+        print(f"Warning: {matrix_file} is stale (chunk ids do not match the database).")
+        return None
+    if version is not None and manifest.get("version") != version:
+        print(f"Warning: {matrix_file} is stale (exported from knowledge base version {manifest.get('version')}).")
+        return None
+
+    matrix = np.load(matrix_file, mmap_mode='r')
+    if matrix.shape[0] != len(chunks) or matrix.dtype != VECTOR_DTYPE:
+        print(f"Warning: {matrix_file} shape/dtype does not match the manifest.")
+        return None
+    return matrix
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage binary embedding storage in the knowledge base")
+    parser.add_argument("--db", type=str, default=DB_FILE, help="Path to the SQLite knowledge base")
+    parser.add_argument("--migrate", action="store_true", help="Convert JSON embedding_vector rows to float32 BLOBs")
+    parser.add_argument("--keep-json", action="store_true", help="Keep the JSON column populated after migrating")
+    parser.add_argument("--export-matrix", action="store_true", help="Write the normalized .npy sidecar for mmap loading")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Error: Database file {args.db} not found.")
+        sys.exit(1)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if args.migrate:
+            migrated = migrate_json_to_blob(conn, drop_json=not args.keep_json)
+            print(f"Migrated {migrated} rows to {BLOB_COLUMN}.")
+        if args.export_matrix:
+            matrix_file, manifest_file = sidecar_paths(args.db)
+            manifest = export_normalized_matrix(conn, matrix_file, manifest_file)
+            print(f"Wrote {matrix_file} ({manifest['rows']} x {manifest['dim']}).")
+        chunks, matrix = load_vectors(conn)
+        print(f"Knowledge base holds {len(chunks)} chunks, matrix shape {matrix.shape}.")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
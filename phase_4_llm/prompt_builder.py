@@ -0,0 +1,193 @@
+
+import re
+import math
+from typing import Callable, Dict, Any, List, Optional
+
+# Configuration
+SYSTEM_PROMPT = """You are a friendly and knowledgeable assistant for NextLeap, an ed-tech platform that helps people transition into Product Management, UI/UX Design, Data Analytics, and other tech roles.
+
+Your personality:
+- Warm and approachable, like a helpful friend who's excited to share what they know
+- Professional but conversational - avoid being overly formal or robotic
+- Encouraging and supportive, especially when discussing career transitions
+- Clear and concise in your explanations
+
+Instructions:
+1.  You have multiple Context sources from NextLeap's course catalog.
+    - If the user asks about a SPECIFIC course (e.g., "Product Management"), focus only on that course's context.
+    - If the user asks a GENERAL question (e.g., "What courses do you offer?"), summarize from all relevant contexts.
+2.  If the retrieved context has info for multiple courses and the user's question is ambiguous, briefly clarify which course you're referring to or list options.
+3.  If the answer isn't in the context, say something like: "I don't have that specific information in my knowledge base right now. Could you ask about something else, or would you like to know more about [related topic]?"
+4.  Use a friendly, conversational tone:
+    - ✅ "Great question! The PM Fellowship runs for 16 weeks..."
+    - ✅ "You'll learn tools like Figma, SQL, and JIRA..."
+    - ❌ "The duration of the course is 16 weeks." (too formal)
+5.  Be concise but helpful - don't overwhelm with too much info at once.
+"""
+NO_CONTEXT = "No relevant information found within the knowledge base."
+# Tokens of context (chunk headers + text) per request
+DEFAULT_MAX_CONTEXT_TOKENS = 1200
+# Chunks whose cosine similarity to the query is below this are left out (0 keeps everything)
+DEFAULT_MIN_SCORE = 0.2
+# A chunk that does not fit is cut down to the remaining budget if at least this much is left
+MIN_CHUNK_TOKENS = 48
+# Shortest shared prefix / suffix (in characters) treated as splitter overlap between two chunks
+MIN_OVERLAP_CHARS = 40
+# Chat template tokens around each message (role header, end-of-turn)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Rough size of one BPE token for English prose, used when no tokenizer file is configured
+CHARS_PER_TOKEN = 4
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """
+    Tokenizer-free estimate: punctuation marks count as one token each, words as one token
+    per CHARS_PER_TOKEN characters. Close to Llama's BPE counts for the catalog text.
+    """
+    return sum(math.ceil(len(token) / CHARS_PER_TOKEN) for token in TOKEN_PATTERN.findall(text))
+
+def load_token_counter(tokenizer_path: Optional[str] = None) -> Callable[[str], int]:
+    """
+    Exact counts from a Hugging Face tokenizer.json (e.g. the Llama 3 tokenizer) when a path is
+    given, otherwise estimate_tokens.
+    """
+    if not tokenizer_path:
+        return estimate_tokens
+    from tokenizers import Tokenizer
+    tokenizer = Tokenizer.from_file(tokenizer_path)
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+def overlap_length(left: str, right: str, min_chars: int = MIN_OVERLAP_CHARS) -> int:
+    """
+    Length of the longest suffix of left that is also a prefix of right (0 if shorter than min_chars).
+    """
+    probe = right[:min_chars]
+    if len(probe) < min_chars:
+        return 0
+    start = left.find(probe)
+    while start != -1:
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+class Prompt:
+    """
+    The chat messages for one request plus what went into them. chunk_ids are the chunks that
+    made it into the context, in prompt order.
+    """
+    def __init__(self, messages: List[Dict[str, str]], context: str, chunk_ids: List[int], stats: Dict[str, Any]):
+        self.messages = messages
+        self.context = context
+        self.chunk_ids = chunk_ids
+        self.stats = stats
+
+class PromptBuilder:
+    """
+    Assembles the LLM prompt from search results under a token budget: results whose cosine
+    "score" is below min_score are dropped unless BM25 matched them (a "lexical_rank" from hybrid
+    search, e.g. an exact cohort number the embedding misses), chunks repeating text already in
+    the context (the splitter's overlapping windows of the same document) are trimmed or
+    skipped, and the rest are added in retrieval order with a one-line source header until
+    max_context_tokens is used up. The system prompt is sent unchanged on every request, so its
+    token count is computed once.
+    """
+    def __init__(self, max_context_tokens: int = DEFAULT_MAX_CONTEXT_TOKENS, min_score: float = DEFAULT_MIN_SCORE,
+                 count_tokens: Callable[[str], int] = estimate_tokens, system_prompt: str = SYSTEM_PROMPT):
+        self.max_context_tokens = max_context_tokens
+        self.min_score = min_score
+        self.count_tokens = count_tokens
+        self.system_prompt = system_prompt
+        self.system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+    @staticmethod
+    def _document(result: Dict[str, Any]) -> tuple:
+        metadata = result.get("metadata", {})
+        return metadata.get("source"), metadata.get("course"), metadata.get("type")
+
+    @staticmethod
+    def _header(number: int, result: Dict[str, Any]) -> str:
+        metadata = result.get("metadata", {})
+        return f"[{number}] {metadata.get('course', 'Unknown')} - {metadata.get('type', 'Unknown')}"
+
+    def _dedupe(self, text: str, kept: List[str]) -> str:
+        """
+        Removes the parts of text already present in kept chunks of the same document.
+        Returns "" when nothing new is left.
+        """
+        original = text
+        for other in kept:
+            if text in other:
+                return ""
+            cut = overlap_length(other, text)
+            if cut:
+                text = text[cut:].lstrip()
+            cut = overlap_length(text, other)
+            if cut:
+                text = text[:len(text) - cut].rstrip()
+        # A trimmed chunk with only a few characters left adds nothing useful
+        return text if text == original or len(text) >= MIN_OVERLAP_CHARS else ""
+
+    def _truncate(self, text: str, budget: int) -> str:
+        """
+        Cuts text down to at most budget tokens, preferring a line or sentence boundary.
+        """
+        tokens = self.count_tokens(text)
+        while text and tokens > budget:
+            end = int(len(text) * budget / tokens * 0.95)
+            boundary = max(text.rfind("\n", 0, end), text.rfind(". ", 0, end) + 1)
+            text = text[:boundary if boundary > end // 2 else end].rstrip()
+            tokens = self.count_tokens(text)
+        return text
+
+    def build(self, query: str, results: List[Dict[str, Any]]) -> Prompt:
+        stats = {"candidates": len(results), "below_min_score": 0, "deduplicated": 0, "trimmed_overlap": 0,
+                 "over_budget": 0, "truncated": 0}
+        sections, chunk_ids = [], []
+        kept_by_document = {}
+        used = 0
+
+        for result in results:
+            if result["score"] < self.min_score and result.get("lexical_rank") is None:
+                stats["below_min_score"] += 1
+                continue
+            kept = kept_by_document.setdefault(self._document(result), [])
+            text = result["content"].strip()
+            deduped = self._dedupe(text, kept)
+            if not deduped:
+                stats["deduplicated"] += 1
+                continue
+            if deduped != text:
+                stats["trimmed_overlap"] += 1
+
+            header = self._header(len(sections) + 1, result)
+            # The blank line between sections is part of each section's cost
+            header_tokens = self.count_tokens(header) + 1
+            remaining = self.max_context_tokens - used - header_tokens
+            text_tokens = self.count_tokens(deduped)
+            if text_tokens > remaining:
+                if remaining < MIN_CHUNK_TOKENS:
+                    stats["over_budget"] += 1
+                    continue
+                deduped = self._truncate(deduped, remaining)
+                text_tokens = self.count_tokens(deduped)
+                stats["truncated"] += 1
+
+            kept.append(result["content"])
+            sections.append(f"{header}\n{deduped}")
+            chunk_ids.append(result["id"])
+            used += header_tokens + text_tokens
+
+        context = "\n\n".join(sections) if sections else NO_CONTEXT
+        user_message = f"Context:\n{context}\n\nUser Question: {query}"
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_message}
+        ]
+
+        stats["chunks"] = len(sections)
+        stats["system_tokens"] = self.system_tokens
+        stats["context_tokens"] = self.count_tokens(context)
+        stats["prompt_tokens"] = self.system_tokens + self.count_tokens(user_message) + MESSAGE_OVERHEAD_TOKENS
+        return Prompt(messages, context, chunk_ids, stats)
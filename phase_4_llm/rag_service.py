@@ -0,0 +1,157 @@
+
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from metrics import span
+from prompt_builder import Prompt, PromptBuilder
+from response_cache import SemanticResponseCache
+
+# Configuration
+DEFAULT_K = 5
+LLM_MODEL = "llama-3.3-70b-versatile"
+LLM_TEMPERATURE = 0.1 # Low temperature for factual accuracy
+LLM_MAX_TOKENS = 1024
+RETRIEVAL_ONLY_PREFIX = "Retrieval only (LLM not configured):"
+
+class RAGRequest:
+    """
+    One question on its way through the pipeline. answer is set by prepare() when no LLM call
+    is needed (cached answer, or no LLM configured) and by the generate methods otherwise.
+    timings maps stage names (embed, search, prompt, cache, llm, ...) to seconds.
+    kb_version is the knowledge base version the context was retrieved from.
+    """
+    def __init__(self, query: str, timings: Dict[str, float]):
+        self.query = query
+        self.timings = timings
+        self.kb_version: Optional[str] = None
+        self.prompt: Optional[Prompt] = None
+        self.query_vector = None
+        self.answer: Optional[str] = None
+        self.cached = False
+        # Token usage reported by the LLM API (prompt_tokens, completion_tokens), if any
+        self.usage: Dict[str, int] = {}
+
+class RAGService:
+    """
+    The chat pipeline shared by the CLI chatbot and the API server: retrieval, prompt
+    assembly, semantic response cache and the LLM call, with per-stage timings.
+
+    retriever needs search(query, k, filters, timings); with embed_queries(queries) the
+    response cache is used as well. Cached answers are keyed by the knowledge base version:
+    a retriever with snapshot() (as RetrievalEngine has) is searched on one snapshot whose
+    version is kept, otherwise its kb_version attribute is read before the search.
+    llm_client is an OpenAI-compatible client (Groq or AsyncGroq): call generate() with a
+    synchronous one, agenerate() / astream() with an async one. None answers from the
+    retrieved context only. prepare() blocks on retrieval, so async callers run it in a thread.
+    """
+    def __init__(self, retriever, llm_client=None, response_cache: Optional[SemanticResponseCache] = None,
+                 prompt_builder: Optional[PromptBuilder] = None, k: int = DEFAULT_K, model: str = LLM_MODEL,
+                 temperature: float = LLM_TEMPERATURE, max_tokens: int = LLM_MAX_TOKENS):
+        self.retriever = retriever
+        self.llm_client = llm_client
+        self.response_cache = response_cache
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        self.k = k
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def _use_cache(self) -> bool:
+        return self.response_cache is not None and hasattr(self.retriever, "embed_queries")
+
+    def prepare(self, query: str, filters: Optional[Dict[str, Any]] = None,
+                timings: Optional[Dict[str, float]] = None) -> RAGRequest:
+        """
+        Retrieves context, builds the prompt and checks the response cache.
+        """
+        request = RAGRequest(query, {} if timings is None else timings)
+        if hasattr(self.retriever, "snapshot"):
+            # A reload between search and cache store must not file this answer under the new version
+            kb = self.retriever.snapshot()
+            request.kb_version = kb.version
+            results = self.retriever.search(query, k=self.k, filters=filters, timings=request.timings, kb=kb)
+        else:
+            request.kb_version = getattr(self.retriever, "kb_version", None)
+            results = self.retriever.search(query, k=self.k, filters=filters, timings=request.timings)
+        with span(request.timings, "prompt"):
+            request.prompt = self.prompt_builder.build(query, results)
+
+        if self.llm_client is None:
+            request.answer = f"{RETRIEVAL_ONLY_PREFIX}\n{request.prompt.context}"
+            return request
+
+        if self._use_cache():
+            # Served from the embedding cache, so this does not re-encode the query
+            with span(request.timings, "cache"):
+                request.query_vector = self.retriever.embed_queries([query])[0]
+                cached_answer = self.response_cache.lookup(request.query_vector, request.prompt.chunk_ids,
+                                                           request.kb_version)
+            if cached_answer is not None:
+                request.answer = cached_answer
+                request.cached = True
+        return request
+
+    def _completion_args(self, request: RAGRequest) -> Dict[str, Any]:
+        return {"messages": request.prompt.messages, "model": self.model,
+                "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    def _finish(self, request: RAGRequest, answer: str, usage=None) -> str:
+        request.answer = answer
+        if usage is not None:
+            request.usage = {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+            # The API's own count, next to the builder's estimate
+            request.prompt.stats["llm_prompt_tokens"] = usage.prompt_tokens
+        if self._use_cache() and request.query_vector is not None:
+            self.response_cache.store(request.query_vector, request.prompt.chunk_ids, answer, request.kb_version)
+        return answer
+
+    def generate(self, request: RAGRequest) -> str:
+        """
+        Answers with a synchronous client. Errors from the client are raised to the caller.
+        """
+        if request.answer is not None:
+            return request.answer
+        with span(request.timings, "llm"):
+            completion = self.llm_client.chat.completions.create(**self._completion_args(request))
+        return self._finish(request, completion.choices[0].message.content, completion.usage)
+
+    async def agenerate(self, request: RAGRequest) -> str:
+        """
+        generate() for an async client.
+        """
+        if request.answer is not None:
+            return request.answer
+        with span(request.timings, "llm"):
+            completion = await self.llm_client.chat.completions.create(**self._completion_args(request))
+        return self._finish(request, completion.choices[0].message.content, completion.usage)
+
+    async def astream(self, request: RAGRequest) -> AsyncIterator[str]:
+        """
+        Yields answer tokens as the async client produces them (the whole answer at once if it
+        is already known). Adds llm_first_token to the timings; the answer is cached once
+        the stream completes.
+        """
+        if request.answer is not None:
+            yield request.answer
+            return
+        started = time.perf_counter()
+        stream = await self.llm_client.chat.completions.create(**self._completion_args(request), stream=True)
+        parts = []
+        async for chunk in stream:
+            token = chunk.choices[0].delta.content if chunk.choices else None
+            if token:
+                if "llm_first_token" not in request.timings:
+                    request.timings["llm_first_token"] = time.perf_counter() - started
+                parts.append(token)
+                yield token
+        request.timings["llm"] = time.perf_counter() - started
+        self._finish(request, "".join(parts))
+
+    def answer(self, query: str, filters: Optional[Dict[str, Any]] = None,
+               timings: Optional[Dict[str, float]] = None) -> RAGRequest:
+        """
+        prepare() and generate() in one call, for synchronous callers.
+        """
+        request = self.prepare(query, filters, timings)
+        self.generate(request)
+        return request
@@ -0,0 +1,125 @@
+
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+# Configuration
+DEFAULT_MAX_SIZE = 512
+# Cosine similarity between normalized query embeddings needed to reuse an answer
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+class SemanticResponseCache:
+    """
+    Reuses a previous LLM answer when a new query's embedding is within the similarity
+    threshold of a cached query AND retrieval returned the same chunk ids, i.e. the LLM would
+    see the same context. Entries are tied to a knowledge base version. The first lookup or
+    store with a version not seen before drops them all; requests that still carry an earlier
+    version (retrieved before a reload) miss and are not stored.
+    Thread-safe; bounded LRU with optional TTL.
+    """
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 ttl_seconds: Optional[float] = DEFAULT_TTL_SECONDS):
+        self.max_size = max_size
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.kb_version = None
+        # Versions that were current before; versions are opaque, so "older" means seen earlier
+        self._old_versions = set()
+        self._entries = OrderedDict()
+        self._next_key = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _chunk_key(chunk_ids: List[int]) -> tuple:
+        return tuple(sorted(chunk_ids))
+
+    def _check_version(self, kb_version: Optional[str]) -> bool:
+        """
+        True if kb_version is the current version, after switching to it if it is a new one.
+        Caller holds the lock.
+        """
+        if kb_version == self.kb_version:
+            return True
+        if kb_version in self._old_versions:
+            return False
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._old_versions.add(self.kb_version)
+        self.kb_version = kb_version
+        return True
+
+    def lookup(self, query_vector: np.ndarray, chunk_ids: List[int], kb_version: Optional[str] = None) -> Optional[str]:
+        """
+        Returns a cached answer or None. query_vector must be L2-normalized.
+        """
+        if self.max_size <= 0:
+            return None
+
+        chunk_key = self._chunk_key(chunk_ids)
+        now = time.monotonic()
+        with self._lock:
+            if not self._check_version(kb_version):
+                self.misses += 1
+                return None
+
+            best_key, best_score = None, self.similarity_threshold
+            for key, entry in list(self._entries.items()):
+                if entry["expires_at"] is not None and entry["expires_at"] <= now:
+                    del self._entries[key]
+                    continue
+                if entry["chunk_key"] != chunk_key:
+                    continue
+                score = float(np.dot(entry["vector"], query_vector))
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key]["answer"]
+
+    def store(self, query_vector: np.ndarray, chunk_ids: List[int], answer: str, kb_version: Optional[str] = None):
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            # Answered from an earlier version (e.g. finished after a reload)
+            if not self._check_version(kb_version):
+                return
+            self._entries[self._next_key] = {
+                "vector": np.array(query_vector, dtype=np.float32),
+                "chunk_key": self._chunk_key(chunk_ids),
+                "answer": answer,
+                "expires_at": expires_at,
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -16,19 +16,25 @@ except ImportError:
     print(colored("Error: Could not import RetrievalEngine from phase 3.", "red"))
     sys.exit(1)
 
+from response_cache import SemanticResponseCache
+from metrics import format_timings
+from rag_service import RAGService
+
 # Load environment variables
 load_dotenv()
 
 class NextLeapChatbot:
-    def __init__(self):
+    def __init__(self, show_timings: bool = False):
         print(colored("Initializing NextLeap Chatbot...", "cyan"))
+        self.show_timings = show_timings
+        # Stage durations (seconds) and prompt size stats of the last generate_response call
+        self.last_timings = {}
+        self.last_prompt_stats = {}
         
-        # Initialize Retrieval Engine
-        try:
-            self.retrieval_engine = RetrievalEngine()
-        except Exception as e:
-            print(colored(f"Error initializing Retrieval Engine: {e}", "red"))
-            sys.exit(1)
+        # Initialize Retrieval Engine; the model and knowledge base load in the background
+        # while the user types the first question
+        self.retrieval_engine = RetrievalEngine(lazy=True)
+        self.retrieval_engine.start_loading()
             
         # Initialize Groq Client
         api_key = os.getenv("GROQ_API_KEY")
@@ -39,69 +45,61 @@ class NextLeapChatbot:
         else:
             self.groq_client = Groq(api_key=api_key)
             print(colored("Groq Client initialized successfully.", "green"))
+        
+        # Retrieval, prompt assembly and the Groq call, shared with the API server; answers are
+        # reused for near-duplicate questions that retrieve the same chunks
+        self.rag_service = RAGService(self.retrieval_engine, llm_client=self.groq_client,
+                                      response_cache=SemanticResponseCache())
 
     def generate_response(self, query: str) -> str:
         """
         Retrieves context and generates an answer using Groq LLM.
         """
-        # 1. Retrieve Context
-        print(colored(f"\nRetrieving relevant context for: '{query}'...", "yellow"))
-        # Increase k to 5 to catch relevant chunks even if not Top-1
-        context_str = self.retrieval_engine.retrieve_context(query, k=5)
-        
-        if not self.groq_client:
-            return f"I can only verify Retrieval (LLM not configured):\n{context_str}"
-
-        # 2. Construct Prompt
-        system_prompt = """You are a friendly and knowledgeable assistant for NextLeap, an ed-tech platform that helps people transition into Product Management, UI/UX Design, Data Analytics, and other tech roles.
-
-Your personality:
-- Warm and approachable, like a helpful friend who's excited to share what they know
-- Professional but conversational - avoid being overly formal or robotic
-- Encouraging and supportive, especially when discussing career transitions
-- Clear and concise in your explanations
-
-Instructions:
-1.  You have multiple Context sources from NextLeap's course catalog.
-    - If the user asks about a SPECIFIC course (e.g., "Product Management"), focus only on that course's context.
-    - If the user asks a GENERAL question (e.g., "What courses do you offer?"), summarize from all relevant contexts.
-2.  If the retrieved context has info for multiple courses and the user's question is ambiguous, briefly clarify which course you're referring to or list options.
-3.  If the answer isn't in the context, say something like: "I don't have that specific information in my knowledge base right now. Could you ask about something else, or would you like to know more about [related topic]?"
-4.  Use a friendly, conversational tone:
-    - ✅ "Great question! The PM Fellowship runs for 16 weeks..."
-    - ✅ "You'll learn tools like Figma, SQL, and JIRA..."
-    - ❌ "The duration of the course is 16 weeks." (too formal)
-5.  Be concise but helpful - don't overwhelm with too much info at once.
-"""
-
-        user_message = f"""Context:
-{context_str}
-
-User Question: {query}
-"""
+        self.last_timings = {}
+        self.last_prompt_stats = {}
+        try:
+            return self._generate_response(query, self.last_timings)
+        finally:
+            if self.show_timings:
+                print(colored(f"Timings: {format_timings(self.last_timings)}", "cyan"))
+                if self.last_prompt_stats:
+                    stats = self.last_prompt_stats
+                    print(colored(f"Prompt: {stats['prompt_tokens']} tokens ({stats['context_tokens']} context), "
+                                  f"{stats['chunks']}/{stats['candidates']} chunks", "cyan"))
+
+    def wait_for_engine(self):
+        if self.retrieval_engine.ready:
+            return
+        print(colored("Still loading the knowledge base...", "yellow"))
+        try:
+            self.retrieval_engine.wait_until_ready()
+        except RuntimeError as e:
+            print(colored(f"Error initializing Retrieval Engine: {e}", "red"))
+            sys.exit(1)
 
-        # 3. Call LLM
-        print(colored("Generating answer with Groq (llama-3.3-70b-versatile)...", "green"))
+    def _generate_response(self, query: str, timings: dict) -> str:
+        self.wait_for_engine()
+        print(colored(f"\nRetrieving relevant context for: '{query}'...", "yellow"))
+        request = self.rag_service.prepare(query, timings=timings)
+        self.last_prompt_stats = request.prompt.stats
+        if request.cached:
+            print(colored("Answer served from semantic response cache.", "green"))
+        if request.answer is not None:
+            return request.answer
+
+        print(colored(f"Generating answer with Groq ({self.rag_service.model})...", "green"))
         try:
-            chat_completion = self.groq_client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                model="llama-3.3-70b-versatile",
-                temperature=0.1, # Low temperature for factual accuracy
-                max_tokens=1024,
-            )
-            return chat_completion.choices[0].message.content
+            return self.rag_service.generate(request)
         except Exception as e:
             return f"Error generating answer: {e}"
 
 def main():
     parser = argparse.ArgumentParser(description="Run the NextLeap Chatbot")
     parser.add_argument("--query", type=str, help="Single query to run and exit")
+    parser.add_argument("--timings", action="store_true", help="Print per-stage timings after each answer")
     args = parser.parse_args()
 
-    chatbot = NextLeapChatbot()
+    chatbot = NextLeapChatbot(show_timings=args.timings)
     
     if args.query:
         response = chatbot.generate_response(args.query)
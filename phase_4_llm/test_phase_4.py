@@ -0,0 +1,287 @@
+
+import unittest
+import os
+import sys
+import asyncio
+import numpy as np
+from types import SimpleNamespace
+
+# Add directory to sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from response_cache import SemanticResponseCache
+from metrics import MetricsRegistry, span
+from prompt_builder import PromptBuilder, estimate_tokens, overlap_length, NO_CONTEXT
+from rag_service import RAGService, RETRIEVAL_ONLY_PREFIX
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+class TestSemanticResponseCache(unittest.TestCase):
+    def test_near_duplicate_hit(self):
+        """A close query over the same chunks reuses the answer."""
+        cache = SemanticResponseCache(similarity_threshold=0.95)
+        cache.store(unit([1, 0, 0]), [3, 1, 2], "16 weeks", kb_version="v1")
+        self.assertEqual(cache.lookup(unit([1, 0.05, 0]), [1, 2, 3], kb_version="v1"), "16 weeks")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_different_chunks_or_distant_query_miss(self):
+        """Similar wording is not enough if retrieval found different chunks."""
+        cache = SemanticResponseCache(similarity_threshold=0.95)
+        cache.store(unit([1, 0, 0]), [1, 2, 3], "16 weeks", kb_version="v1")
+        self.assertIsNone(cache.lookup(unit([1, 0, 0]), [1, 2, 4], kb_version="v1"))
+        self.assertIsNone(cache.lookup(unit([1, 1, 0]), [1, 2, 3], kb_version="v1"))
+
+    def test_knowledge_base_rebuild_invalidates(self):
+        """A new knowledge base version drops every cached answer."""
+        cache = SemanticResponseCache()
+        cache.store(unit([1, 0, 0]), [1], "old answer", kb_version="v1")
+        self.assertIsNone(cache.lookup(unit([1, 0, 0]), [1], kb_version="v2"))
+        self.assertEqual(cache.stats()["size"], 0)
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_older_version_does_not_flush_newer_entries(self):
+        """A request retrieved before a reload misses, but leaves the new version's answers alone."""
+        cache = SemanticResponseCache()
+        cache.store(unit([1, 0, 0]), [1], "old answer", kb_version="v1")
+        self.assertIsNone(cache.lookup(unit([1, 0, 0]), [1], kb_version="v2"))
+        cache.store(unit([1, 0, 0]), [1], "new answer", kb_version="v2")
+
+        self.assertIsNone(cache.lookup(unit([1, 0, 0]), [1], kb_version="v1"))
+        cache.store(unit([0, 1, 0]), [2], "late old answer", kb_version="v1")
+        self.assertEqual(cache.stats()["size"], 1)
+        self.assertEqual(cache.lookup(unit([1, 0, 0]), [1], kb_version="v2"), "new answer")
+        self.assertEqual(cache.kb_version, "v2")
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_bounded_size(self):
+        cache = SemanticResponseCache(max_size=2)
+        for i in range(3):
+            cache.store(unit([1, i, 0]), [i], f"answer {i}")
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertIsNone(cache.lookup(unit([1, 0, 0]), [0]))
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        histogram = registry.histogram("stage_seconds", "Stage time", ("stage",), buckets=(0.01, 0.1))
+        for value in (0.005, 0.05, 0.5):
+            histogram.observe(value, stage="embed")
+        text = registry.render()
+        self.assertIn("# TYPE stage_seconds histogram", text)
+        self.assertIn('stage_seconds_bucket{stage="embed",le="0.01"} 1', text)
+        self.assertIn('stage_seconds_bucket{stage="embed",le="0.1"} 2', text)
+        self.assertIn('stage_seconds_bucket{stage="embed",le="+Inf"} 3', text)
+        self.assertIn('stage_seconds_count{stage="embed"} 3', text)
+        self.assertAlmostEqual(histogram.snapshot(stage="embed")["sum"], 0.555)
+
+    def test_counter_gauge_and_labels(self):
+        registry = MetricsRegistry()
+        requests = registry.counter("requests_total", "Requests", ("endpoint", "status"))
+        in_flight = registry.gauge("in_flight", "In flight")
+        requests.inc(endpoint="/chat", status="200")
+        requests.inc(endpoint="/chat", status="200")
+        with in_flight.track():
+            self.assertIn("in_flight 1", registry.render())
+        text = registry.render()
+        self.assertIn('requests_total{endpoint="/chat",status="200"} 2', text)
+        self.assertIn("in_flight 0", text)
+        with self.assertRaises(ValueError):
+            requests.inc(endpoint="/chat")
+
+    def test_span_accumulates(self):
+        timings = {}
+        with span(timings, "search"):
+            pass
+        with span(timings, "search"):
+            pass
+        self.assertEqual(list(timings), ["search"])
+        self.assertGreaterEqual(timings["search"], 0.0)
+
+def result(chunk_id, score, content, course="PM", kind="curriculum"):
+    return {"id": chunk_id, "score": score, "content": content,
+            "metadata": {"source": f"https://example.com/{course}", "course": course, "type": kind}}
+
+class TestPromptBuilder(unittest.TestCase):
+    def setUp(self):
+        self.text = " ".join(f"Week {i}: discovery, user research and metrics." for i in range(40))
+
+    def test_low_scores_are_dropped(self):
+        prompt = PromptBuilder(min_score=0.3).build("Duration?", [result(1, 0.6, "16 weeks, weekends only."),
+                                                                  result(2, 0.1, "Refund policy text.")])
+        self.assertEqual(prompt.chunk_ids, [1])
+        self.assertEqual(prompt.stats["below_min_score"], 1)
+        self.assertNotIn("Refund", prompt.context)
+
+    def test_bm25_matches_are_kept_below_min_score(self):
+        """Hybrid hits found by their exact terms stay, even when their embedding is far off."""
+        lexical = dict(result(2, 0.05, "Cohort 29 starts on 3 May."), fused_score=0.03, lexical_rank=0)
+        vector_only = dict(result(3, 0.1, "Refund policy text."), fused_score=0.01, lexical_rank=None)
+        prompt = PromptBuilder(min_score=0.3).build("Cohort 29?", [result(1, 0.6, "16 weeks."), lexical, vector_only])
+        self.assertEqual(prompt.chunk_ids, [1, 2])
+        self.assertEqual(prompt.stats["below_min_score"], 1)
+
+    def test_overlapping_windows_are_trimmed(self):
+        """Consecutive splitter windows of one document share text; it is only sent once."""
+        first, second = self.text[:1000], self.text[800:1800]
+        prompt = PromptBuilder(min_score=0).build("Topics?", [result(1, 0.5, first), result(2, 0.4, second),
+                                                              result(3, 0.3, first[100:500])])
+        self.assertEqual(prompt.chunk_ids, [1, 2])
+        self.assertEqual(prompt.stats["trimmed_overlap"], 1)
+        self.assertEqual(prompt.stats["deduplicated"], 1)
+        self.assertEqual(prompt.context.count(self.text[800:1000]), 1)
+        self.assertEqual(overlap_length(first, second), 200)
+
+    def test_same_text_in_another_course_is_kept(self):
+        prompt = PromptBuilder(min_score=0).build("Refunds?", [result(1, 0.5, self.text[:300], course="PM"),
+                                                               result(2, 0.5, self.text[:300], course="UX")])
+        self.assertEqual(prompt.chunk_ids, [1, 2])
+
+    def test_context_fits_the_budget(self):
+        results = [result(i, 1.0 - i / 10, self.text[i * 200:], course=str(i)) for i in range(5)]
+        prompt = PromptBuilder(max_context_tokens=300, min_score=0).build("Topics?", results)
+        self.assertLessEqual(prompt.stats["context_tokens"], 300)
+        self.assertEqual(prompt.chunk_ids, [0])
+        self.assertEqual(prompt.stats["truncated"], 1)
+        self.assertEqual(prompt.stats["over_budget"], 4)
+        self.assertGreater(prompt.stats["prompt_tokens"], prompt.stats["system_tokens"] + prompt.stats["context_tokens"])
+
+    def test_messages_and_empty_context(self):
+        prompt = PromptBuilder().build("Anything?", [])
+        self.assertEqual([m["role"] for m in prompt.messages], ["system", "user"])
+        self.assertIn(NO_CONTEXT, prompt.messages[1]["content"])
+        self.assertTrue(prompt.messages[1]["content"].endswith("User Question: Anything?"))
+        self.assertEqual(prompt.stats["chunks"], 0)
+
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens("PM Fellowship: 16 weeks."), 9)
+        self.assertEqual(estimate_tokens(""), 0)
+
+class FakeRetriever:
+    kb_version = "v1"
+
+    def __init__(self):
+        self.searches = 0
+
+    def search(self, query, k=5, filters=None, timings=None):
+        self.searches += 1
+        timings["search"] = 0.001
+        return [result(7, 0.8, "The PM Fellowship runs for 16 weeks.")][:k]
+
+    def embed_queries(self, queries):
+        return [unit([1, 0, 0]) for _ in queries]
+
+class ReloadingRetriever(FakeRetriever):
+    """
+    Hands out snapshots like RetrievalEngine; reload() moves the current version on.
+    """
+    def __init__(self):
+        super().__init__()
+        self.current = SimpleNamespace(version="v1")
+        self.searched_kbs = []
+
+    def snapshot(self):
+        return self.current
+
+    def search(self, query, k=5, filters=None, timings=None, kb=None):
+        self.searched_kbs.append(kb)
+        return super().search(query, k, filters, timings)
+
+    def reload(self, version):
+        self.current = SimpleNamespace(version=version)
+
+def completion(text):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+                           usage=SimpleNamespace(prompt_tokens=120, completion_tokens=4))
+
+class FakeLLM:
+    """
+    Groq-shaped client; async_mode mimics AsyncGroq, with stream=True yielding one chunk per word.
+    """
+    def __init__(self, answer="16 weeks, on weekends.", async_mode=False):
+        self.answer = answer
+        self.calls = []
+        self.async_mode = async_mode
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if not self.async_mode:
+            return completion(self.answer)
+
+        async def respond():
+            if not kwargs.get("stream"):
+                return completion(self.answer)
+
+            async def chunks():
+                for word in self.answer.split(" "):
+                    yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + " "))])
+            return chunks()
+        return respond()
+
+class TestRAGService(unittest.TestCase):
+    def test_generate_then_cache_hit(self):
+        llm = FakeLLM()
+        service = RAGService(FakeRetriever(), llm_client=llm, response_cache=SemanticResponseCache())
+        first = service.answer("How long is the PM fellowship?")
+        self.assertEqual(first.answer, "16 weeks, on weekends.")
+        self.assertFalse(first.cached)
+        self.assertEqual(first.usage, {"prompt_tokens": 120, "completion_tokens": 4})
+        self.assertEqual(first.prompt.stats["llm_prompt_tokens"], 120)
+        self.assertEqual(llm.calls[0]["messages"], first.prompt.messages)
+        self.assertIn("llm", first.timings)
+
+        second = service.prepare("How long is the PM fellowship?")
+        self.assertTrue(second.cached)
+        self.assertEqual(service.generate(second), "16 weeks, on weekends.")
+        self.assertEqual(len(llm.calls), 1)
+
+    def test_answer_is_cached_under_the_version_it_was_retrieved_from(self):
+        """A reload while the LLM is answering files the answer under the old version, not the new one."""
+        retriever = ReloadingRetriever()
+        cache = SemanticResponseCache()
+        service = RAGService(retriever, llm_client=FakeLLM(), response_cache=cache)
+        stale = service.prepare("How long is the PM fellowship?")
+        self.assertIs(retriever.searched_kbs[0], retriever.current)
+        self.assertEqual(stale.kb_version, "v1")
+
+        retriever.reload("v2")
+        fresh = service.prepare("How long is the PM fellowship?")
+        self.assertEqual(fresh.kb_version, "v2")
+        service.generate(fresh)
+        # Finishes after the reload; must neither be served for v2 nor flush the v2 entry
+        service.generate(stale)
+        self.assertEqual(cache.kb_version, "v2")
+        self.assertTrue(service.prepare("How long is the PM fellowship?").cached)
+
+        retriever.reload("v3")
+        self.assertFalse(service.prepare("How long is the PM fellowship?").cached)
+
+    def test_without_llm_answers_from_context(self):
+        request = RAGService(FakeRetriever()).prepare("Duration?")
+        self.assertTrue(request.answer.startswith(RETRIEVAL_ONLY_PREFIX))
+        self.assertIn("16 weeks", request.answer)
+        self.assertEqual(list(request.timings), ["search", "prompt"])
+
+    def test_async_generate_and_stream(self):
+        llm = FakeLLM(async_mode=True)
+        service = RAGService(FakeRetriever(), llm_client=llm, response_cache=SemanticResponseCache())
+
+        async def run():
+            request = service.prepare("Duration?")
+            tokens = [token async for token in service.astream(request)]
+            answer = await service.agenerate(service.prepare("Schedule?"))
+            return request, tokens, answer
+
+        request, tokens, answer = asyncio.run(run())
+        self.assertEqual(len(tokens), 4)
+        self.assertEqual(request.answer, "".join(tokens))
+        self.assertIn("llm_first_token", request.timings)
+        self.assertTrue(llm.calls[0]["stream"])
+        # The streamed answer was cached for the near-identical second question
+        self.assertEqual(answer, request.answer)
+        self.assertEqual(len(llm.calls), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import httpx
+import numpy as np
+from typing import Dict, Any, List, Optional
+
+# Configuration
+DEFAULT_URL = "http://127.0.0.1:8000"
+DEFAULT_RATES = [1.0, 2.0, 5.0, 10.0]
+DEFAULT_DURATION = 30.0
+REQUEST_TIMEOUT = 60.0
+# Questions sent round-robin; each gets a request number appended so the response cache
+# cannot answer repeats (set NEXTLEAP_RESPONSE_CACHE_SIZE=0 on the server to be sure)
+QUESTIONS = [
+    "What is the price of the Product Management Fellowship?",
+    "How long is the Data Analyst Fellowship?",
+    "Who are the mentors for the UI/UX Designer Fellowship?",
+    "What tools will I learn in the Business Analyst Fellowship?",
+    "When does the next Generative AI Bootcamp cohort start?",
+    "Is there placement support after the course?",
+    "What is the weekly schedule and time commitment?",
+    "Can I pay the fee in EMIs?",
+    "What projects are part of the curriculum?",
+    "Which course should I take to switch into product management?",
+]
+# Stages reported by the server in Server-Timing / the "done" event, in pipeline order
+STAGES = ["embed", "search", "cache", "prompt", "llm_queue", "llm_first_token", "llm"]
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """
+    "embed;dur=12.50, search;dur=0.80" -> {"embed": 12.5, "search": 0.8} (milliseconds).
+    """
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if name and key == "dur":
+                timings[name] = float(value)
+    return timings
+
+async def send_chat(client: httpx.AsyncClient, url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    response = await client.post(f"{url}/chat", json=payload)
+    if response.status_code != 200:
+        return {"ok": False, "error": f"http_{response.status_code}"}
+    return {"ok": True, "timings": parse_server_timing(response.headers.get("server-timing"))}
+
+async def send_stream(client: httpx.AsyncClient, url: str, payload: Dict[str, Any], started: float) -> Dict[str, Any]:
+    """
+    Reads the SSE stream to the end; records time to first token and the stage timings
+    from the final "done" event.
+    """
+    result = {"ok": False, "error": "incomplete_stream"}
+    ttft = None
+    event = "message"
+    async with client.stream("POST", f"{url}/chat/stream", json=payload) as response:
+        if response.status_code != 200:
+            return {"ok": False, "error": f"http_{response.status_code}"}
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):].strip())
+                if event == "message" and ttft is None and data.get("token"):
+                    ttft = time.perf_counter() - started
+                elif event == "done":
+                    result = {"ok": True, "timings": data.get("timings_ms", {})}
+                elif event == "error":
+                    result = {"ok": False, "error": "stream_error"}
+            elif not line:
+                event = "message"
+    result["ttft"] = ttft
+    return result
+
+async def send_one(client: httpx.AsyncClient, url: str, stream: bool, question: str,
+                   course: Optional[str]) -> Dict[str, Any]:
+    payload = {"message": question}
+    if course:
+        payload["course"] = course
+    started = time.perf_counter()
+    try:
+        if stream:
+            result = await send_stream(client, url, payload, started)
+        else:
+            result = await send_chat(client, url, payload)
+    except httpx.TimeoutException:
+        result = {"ok": False, "error": "timeout"}
+    except httpx.HTTPError as e:
+        result = {"ok": False, "error": type(e).__name__}
+    result["latency"] = time.perf_counter() - started
+    result["finished"] = time.perf_counter()
+    return result
+
+def percentiles_ms(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = np.array(values) * 1000.0
+    return {
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+def summarize(rate: float, results: List[Dict[str, Any]], started: float, stream: bool) -> Dict[str, Any]:
+    ok = [result for result in results if result["ok"]]
+    errors = {}
+    for result in results:
+        if not result["ok"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    elapsed = max(result["finished"] for result in results) - started if results else 0.0
+
+    stages = {}
+    for stage in STAGES:
+        values = [result["timings"][stage] for result in ok if stage in result.get("timings", {})]
+        if values:
+            stages[stage] = {"mean_ms": round(float(np.mean(values)), 2),
+                             "p95_ms": round(float(np.percentile(values, 95)), 2)}
+
+    summary = {
+        "target_rps": rate,
+        "sent": len(results),
+        "completed": len(ok),
+        "errors": errors,
+        "error_rate": round(1.0 - len(ok) / len(results), 4) if results else 0.0,
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": percentiles_ms([result["latency"] for result in ok]),
+        "stages": stages,
+    }
+    if stream:
+        summary["ttft_ms"] = percentiles_ms([result["ttft"] for result in ok if result.get("ttft") is not None])
+    return summary
+
+async def run_rate(url: str, rate: float, duration: float, stream: bool = False, poisson: bool = False,
+                   course: Optional[str] = None, timeout: float = REQUEST_TIMEOUT,
+                   questions: List[str] = None, seed: int = 0) -> Dict[str, Any]:
+    """
+    Open-loop load at a fixed arrival rate: requests are sent on schedule whether or not the
+    earlier ones have finished, so queueing in the server shows up as latency and errors
+    instead of slowing the generator down.
+    """
+    questions = questions or QUESTIONS
+    rng = random.Random(seed)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        tasks = []
+        started = time.perf_counter()
+        next_send = started
+        while next_send - started < duration:
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            number = len(tasks)
+            question = f"{questions[number % len(questions)]} (request {number})"
+            tasks.append(asyncio.create_task(send_one(client, url, stream, question, course)))
+            next_send += rng.expovariate(rate) if poisson else 1.0 / rate
+        results = await asyncio.gather(*tasks)
+    return summarize(rate, results, started, stream)
+
+async def run_load_test(url: str = DEFAULT_URL, rates: List[float] = None, duration: float = DEFAULT_DURATION,
+                        stream: bool = False, poisson: bool = False, course: Optional[str] = None,
+                        timeout: float = REQUEST_TIMEOUT, questions: List[str] = None) -> Dict[str, Any]:
+    rates = rates or DEFAULT_RATES
+    report = {"url": url, "endpoint": "/chat/stream" if stream else "/chat", "duration_s": duration,
+              "arrivals": "poisson" if poisson else "uniform", "runs": []}
+    for rate in rates:
+        print(f"Running {rate:g} req/s for {duration:g}s...", file=sys.stderr)
+        summary = await run_rate(url, rate, duration, stream=stream, poisson=poisson, course=course,
+                                 timeout=timeout, questions=questions)
+        latency = summary["latency_ms"]
+        print(f"  {summary['completed']}/{summary['sent']} ok, {summary['throughput_rps']} req/s, "
+              f"p50 {latency.get('p50', '-')} ms, p95 {latency.get('p95', '-')} ms, "
+              f"p99 {latency.get('p99', '-')} ms", file=sys.stderr)
+        report["runs"].append(summary)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test for the chat API. Run the server with "
+                                                 "NEXTLEAP_TIMING_HEADER=1 to get the per-stage breakdown.")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--rates", default=",".join(f"{rate:g}" for rate in DEFAULT_RATES),
+                        help="Comma-separated arrival rates in requests per second, run one after another")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="Seconds of load per rate")
+    parser.add_argument("--stream", action="store_true", help="Drive /chat/stream and report time to first token")
+    parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times instead of uniform")
+    parser.add_argument("--course", help="Send every request with this course filter")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT)
+    parser.add_argument("--questions", help="Text file with one question per line (defaults to a built-in set)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    questions = None
+    if args.questions:
+        with open(args.questions, 'r', encoding='utf-8') as f:
+            questions = [line.strip() for line in f if line.strip()]
+    rates = [float(rate) for rate in args.rates.split(",")]
+
+    report = asyncio.run(run_load_test(url=args.url.rstrip("/"), rates=rates, duration=args.duration,
+                                       stream=args.stream, poisson=args.poisson, course=args.course,
+                                       timeout=args.timeout, questions=questions))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
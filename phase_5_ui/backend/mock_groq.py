@@ -0,0 +1,125 @@
+
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Configuration
+DEFAULT_PORT = 9000
+# Delay before the first token (queueing + prompt processing on a real provider)
+FIRST_TOKEN_MS = float(os.getenv("MOCK_GROQ_FIRST_TOKEN_MS", "300"))
+# Generation speed and answer length
+TOKENS_PER_SECOND = float(os.getenv("MOCK_GROQ_TOKENS_PER_SECOND", "250"))
+COMPLETION_TOKENS = int(os.getenv("MOCK_GROQ_COMPLETION_TOKENS", "150"))
+# Relative random spread applied to the first-token delay and the answer length
+JITTER = float(os.getenv("MOCK_GROQ_JITTER", "0.1"))
+# Fraction of requests answered with HTTP 500, to exercise error handling under load
+ERROR_RATE = float(os.getenv("MOCK_GROQ_ERROR_RATE", "0"))
+
+app = FastAPI(title="Mock Groq API")
+
+def jittered(value: float) -> float:
+    return max(0.0, value * random.uniform(1.0 - JITTER, 1.0 + JITTER))
+
+def completion_tokens(max_tokens) -> list:
+    count = max(1, int(round(jittered(COMPLETION_TOKENS))))
+    if max_tokens:
+        count = min(count, int(max_tokens))
+    return [f"token{i} " for i in range(count)]
+
+def prompt_tokens(messages: list) -> int:
+    # Rough count (~4 characters per token), only used for the usage block
+    return sum(len(message.get("content") or "") for message in messages) // 4
+
+async def generate(tokens: list):
+    """
+    Yields the tokens at the configured speed, after the first-token delay.
+    """
+    await asyncio.sleep(jittered(FIRST_TOKEN_MS) / 1000.0)
+    interval = 1.0 / TOKENS_PER_SECOND if TOKENS_PER_SECOND > 0 else 0.0
+    started = time.perf_counter()
+    for i, token in enumerate(tokens):
+        # Sleep against the schedule rather than per token, so timer granularity does not add up
+        delay = started + i * interval - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield token
+
+def chunk_payload(completion_id: str, created: int, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if random.random() < ERROR_RATE:
+        return JSONResponse({"error": {"message": "Mock failure", "type": "server_error"}}, status_code=500)
+
+    model = body.get("model", "mock")
+    messages = body.get("messages", [])
+    tokens = completion_tokens(body.get("max_tokens"))
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if body.get("stream"):
+        async def event_stream():
+            yield chunk_payload(completion_id, created, model, {"role": "assistant", "content": ""})
+            async for token in generate(tokens):
+                yield chunk_payload(completion_id, created, model, {"content": token})
+            yield chunk_payload(completion_id, created, model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    parts = [token async for token in generate(tokens)]
+    num_prompt_tokens = prompt_tokens(messages)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(parts)},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": num_prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": num_prompt_tokens + len(tokens),
+        },
+    }
+
+def main():
+    global FIRST_TOKEN_MS, TOKENS_PER_SECOND, COMPLETION_TOKENS, JITTER, ERROR_RATE
+    parser = argparse.ArgumentParser(description="Groq-compatible chat completions stand-in for offline load tests. "
+                                                 "Point the API server at it with GROQ_BASE_URL=http://127.0.0.1:<port>")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--first-token-ms", type=float, default=FIRST_TOKEN_MS)
+    parser.add_argument("--tokens-per-second", type=float, default=TOKENS_PER_SECOND)
+    parser.add_argument("--completion-tokens", type=int, default=COMPLETION_TOKENS)
+    parser.add_argument("--jitter", type=float, default=JITTER)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    args = parser.parse_args()
+
+    FIRST_TOKEN_MS = args.first_token_ms
+    TOKENS_PER_SECOND = args.tokens_per_second
+    COMPLETION_TOKENS = args.completion_tokens
+    JITTER = args.jitter
+    ERROR_RATE = args.error_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,34 @@
 
 import os
 import sys
-from fastapi import FastAPI, HTTPException
+import json
+import time
+import asyncio
+import httpx
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 from dotenv import load_dotenv
-from groq import Groq
+from groq import AsyncGroq
 
 # Add phase 3 to path
 phase_3_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "phase_3_retrieval"))
 sys.path.append(phase_3_dir)
 
+# Add phase 4 to path (shared LLM-side helpers)
+phase_4_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "phase_4_llm"))
+sys.path.append(phase_4_dir)
+
 from retrieval_engine import RetrievalEngine
+from embedding_pool import EmbeddingWorkerPool
+from response_cache import SemanticResponseCache
+from metrics import MetricsRegistry
+from prompt_builder import PromptBuilder, load_token_counter
+from rag_service import RAGService, RAGRequest
 
 # Load environment
 load_dotenv(os.path.join(os.path.dirname(__file__), "..", "..", "phase_4_llm", ".env"))
@@ -27,90 +44,401 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize retrieval engine and Groq client
+# Share one memory-mapped embedding matrix across uvicorn workers instead of a copy per worker
+USE_MMAP_EMBEDDINGS = os.getenv("NEXTLEAP_MMAP_EMBEDDINGS", "0") == "1"
+# Vector index backend: "brute" (exact), "hnsw" or "ivfpq" (FAISS), "int8" or "float16" (quantized + rescoring);
+# params as JSON, e.g. {"ef_search": 128}
+INDEX_BACKEND = os.getenv("NEXTLEAP_INDEX_BACKEND", "brute")
+INDEX_PARAMS = json.loads(os.getenv("NEXTLEAP_INDEX_PARAMS", "{}"))
+# Query embedder runtime: "torch", "onnx" or "onnx-int8" (ONNX Runtime, exported by
+# phase_2_embedding/embedders.py --export); threads per model instance (0 = runtime default).
+# EMBEDDER_WORKERS > 0 runs the model in that many processes shared by this server worker
+EMBEDDER_BACKEND = os.getenv("NEXTLEAP_EMBEDDER_BACKEND", "torch")
+EMBEDDER_THREADS = int(os.getenv("NEXTLEAP_EMBEDDER_THREADS", "0"))
+EMBEDDER_WORKERS = int(os.getenv("NEXTLEAP_EMBEDDER_WORKERS", "0"))
+# Hybrid ranking with BM25 over the chunk text: "rrf", "weighted" or "none" (vector only)
+FUSION = os.getenv("NEXTLEAP_FUSION", "rrf")
+LEXICAL_WEIGHT = float(os.getenv("NEXTLEAP_LEXICAL_WEIGHT", "0.3"))
+# Restrict retrieval to one course when the question names exactly one
+ROUTE_COURSES = os.getenv("NEXTLEAP_ROUTE_COURSES", "0") == "1"
+# Query embedding cache shared by all requests in this worker (size 0 disables it)
+QUERY_CACHE_SIZE = int(os.getenv("NEXTLEAP_QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_TTL = float(os.getenv("NEXTLEAP_QUERY_CACHE_TTL", "3600"))
+# Micro-batching of query embeddings across concurrent requests (window 0 disables it)
+BATCH_WINDOW_MS = float(os.getenv("NEXTLEAP_BATCH_WINDOW_MS", "0"))
+MAX_BATCH_SIZE = int(os.getenv("NEXTLEAP_MAX_BATCH_SIZE", "32"))
+# Semantic answer cache in front of Groq (size 0 disables it)
+RESPONSE_CACHE_SIZE = int(os.getenv("NEXTLEAP_RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("NEXTLEAP_RESPONSE_CACHE_THRESHOLD", "0.95"))
+# Concurrency: retrieval (model inference + numpy) runs in a bounded thread pool off the event loop
+RETRIEVAL_WORKERS = int(os.getenv("NEXTLEAP_RETRIEVAL_WORKERS", "4"))
+RETRIEVAL_TIMEOUT = float(os.getenv("NEXTLEAP_RETRIEVAL_TIMEOUT", "10"))
+# Max in-flight Groq calls per worker, and how long a request may wait for a slot
+LLM_CONCURRENCY = int(os.getenv("NEXTLEAP_LLM_CONCURRENCY", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("NEXTLEAP_LLM_QUEUE_TIMEOUT", "5"))
+LLM_TIMEOUT = float(os.getenv("NEXTLEAP_LLM_TIMEOUT", "30"))
+LLM_MAX_RETRIES = int(os.getenv("NEXTLEAP_LLM_MAX_RETRIES", "1"))
+# Hot reload: poll the knowledge base version every N seconds (0 disables); POST /admin/reload
+# triggers a reload on demand and requires X-Admin-Token when NEXTLEAP_ADMIN_TOKEN is set
+RELOAD_POLL_SECONDS = float(os.getenv("NEXTLEAP_RELOAD_POLL_SECONDS", "0"))
+ADMIN_TOKEN = os.getenv("NEXTLEAP_ADMIN_TOKEN")
+# Startup: the model and knowledge base load on a background thread, so the server accepts
+# connections (and answers /health) right away; /ready reports progress. WARMUP runs one throwaway
+# query after loading; chat requests wait up to READY_TIMEOUT seconds for loading to finish
+WARMUP = os.getenv("NEXTLEAP_WARMUP", "1") == "1"
+READY_TIMEOUT = float(os.getenv("NEXTLEAP_READY_TIMEOUT", "30"))
+# Prompt assembly: chunks retrieved per request, the context token budget they are fitted into, and
+# the cosine score below which a chunk is left out. PROMPT_TOKENIZER is an optional tokenizer.json
+# for exact token counts (estimated from the text otherwise)
+RETRIEVAL_K = int(os.getenv("NEXTLEAP_RETRIEVAL_K", "5"))
+PROMPT_MAX_CONTEXT_TOKENS = int(os.getenv("NEXTLEAP_PROMPT_MAX_CONTEXT_TOKENS", "1200"))
+PROMPT_MIN_SCORE = float(os.getenv("NEXTLEAP_PROMPT_MIN_SCORE", "0.2"))
+PROMPT_TOKENIZER = os.getenv("NEXTLEAP_PROMPT_TOKENIZER")
+# Per-stage durations as a Server-Timing header on /chat and in the "done" event of /chat/stream
+TIMING_HEADER = os.getenv("NEXTLEAP_TIMING_HEADER", "0") == "1"
+
+# Initialize retrieval engine, Groq client and the chat pipeline on top of them
 retrieval_engine = None
 groq_client = None
+rag_service = None
+response_cache = SemanticResponseCache(max_size=RESPONSE_CACHE_SIZE, similarity_threshold=RESPONSE_CACHE_THRESHOLD)
+retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+prompt_builder = PromptBuilder(max_context_tokens=PROMPT_MAX_CONTEXT_TOKENS, min_score=PROMPT_MIN_SCORE,
+                               count_tokens=load_token_counter(PROMPT_TOKENIZER))
+reload_task = None
+
+# Prometheus metrics, served on /metrics
+metrics = MetricsRegistry()
+REQUEST_SECONDS = metrics.histogram("nextleap_request_seconds", "End-to-end request latency (until the last byte for streams)",
+                                    ("endpoint",))
+REQUESTS = metrics.counter("nextleap_requests_total", "Requests by endpoint and HTTP status", ("endpoint", "status"))
+REQUESTS_IN_FLIGHT = metrics.gauge("nextleap_requests_in_flight", "Requests currently being handled", ("endpoint",))
+STAGE_SECONDS = metrics.histogram("nextleap_stage_seconds", "Time spent per request stage "
+                                  "(embed, search, prompt, cache, llm_queue, llm_first_token, llm)", ("stage",))
+LLM_IN_FLIGHT = metrics.gauge("nextleap_llm_in_flight", "Groq calls holding a concurrency slot")
+CACHE_HITS = metrics.counter("nextleap_cache_hits_total", "Cache hits", ("cache",))
+CACHE_MISSES = metrics.counter("nextleap_cache_misses_total", "Cache misses", ("cache",))
+CACHE_HIT_RATIO = metrics.gauge("nextleap_cache_hit_ratio", "Hits / lookups since startup", ("cache",))
+CACHE_ENTRIES = metrics.gauge("nextleap_cache_entries", "Entries currently cached", ("cache",))
+EMBEDDING_BATCHES = metrics.counter("nextleap_embedding_batches_total", "Micro-batched query encode calls")
+EMBEDDING_BATCH_TEXTS = metrics.counter("nextleap_embedding_batch_texts_total", "Queries encoded through micro-batches")
+PROMPT_TOKENS = metrics.histogram("nextleap_prompt_tokens", "Prompt size per request by part (system, context, total)",
+                                  ("part",), buckets=(64, 128, 256, 512, 768, 1024, 1536, 2048, 3072, 4096, 8192))
+PROMPT_CHUNKS = metrics.counter("nextleap_prompt_chunks_total", "Retrieved chunks by what the prompt builder did "
+                                "with them (used, below_min_score, deduplicated, over_budget)", ("outcome",))
+LLM_TOKENS = metrics.counter("nextleap_llm_tokens_total", "Tokens billed by Groq (prompt, completion)", ("kind",))
+# Paths whose latency, status and concurrency are tracked
+INSTRUMENTED_PATHS = {"/chat", "/chat/stream"}
 
 @app.on_event("startup")
 async def startup_event():
-    global retrieval_engine, groq_client
+    global retrieval_engine, groq_client, rag_service, reload_task
     print("Initializing Retrieval Engine...")
-    retrieval_engine = RetrievalEngine()
+    retrieval_engine = RetrievalEngine(use_mmap=USE_MMAP_EMBEDDINGS, index_backend=INDEX_BACKEND,
+                                       index_params=INDEX_PARAMS, query_cache_size=QUERY_CACHE_SIZE,
+                                       query_cache_ttl=QUERY_CACHE_TTL, batch_window_ms=BATCH_WINDOW_MS,
+                                       max_batch_size=MAX_BATCH_SIZE, fusion=FUSION,
+                                       lexical_weight=LEXICAL_WEIGHT, route_courses=ROUTE_COURSES, lazy=True,
+                                       embedder_backend=EMBEDDER_BACKEND, embedder_threads=EMBEDDER_THREADS,
+                                       embedder_workers=EMBEDDER_WORKERS)
+    retrieval_engine.start_loading(warmup=WARMUP)
     
     api_key = os.getenv("GROQ_API_KEY")
     if api_key and "your_groq_api_key_here" not in api_key:
-        groq_client = Groq(api_key=api_key)
+        # One async client per worker: its httpx pool keeps connections to Groq alive between requests
+        http_client = httpx.AsyncClient(limits=httpx.Limits(max_connections=LLM_CONCURRENCY,
+                                                            max_keepalive_connections=LLM_CONCURRENCY))
+        groq_client = AsyncGroq(api_key=api_key, timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+                                http_client=http_client)
         print("Groq Client initialized.")
     else:
         print("Warning: GROQ_API_KEY not set. LLM features disabled.")
+    rag_service = RAGService(retrieval_engine, llm_client=groq_client, response_cache=response_cache,
+                             prompt_builder=prompt_builder, k=RETRIEVAL_K)
+    
+    if RELOAD_POLL_SECONDS > 0:
+        reload_task = asyncio.create_task(poll_for_reload())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if reload_task:
+        reload_task.cancel()
+    if groq_client:
+        await groq_client.close()
+    if retrieval_engine:
+        retrieval_engine.close()
+    retrieval_executor.shutdown(wait=False)
 
 class ChatRequest(BaseModel):
     message: str
+    # Optional: only retrieve from this course (exact catalog name)
+    course: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
+    # Prompt size and what happened to the retrieved chunks (see PromptBuilder)
+    prompt: Optional[dict] = None
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
-    if not retrieval_engine:
+def retrieve(query: str, course: Optional[str] = None) -> RAGRequest:
+    """
+    Blocking part of a chat request: query embedding, vector search, prompt assembly and the
+    response cache lookup. Runs on the retrieval thread pool.
+    """
+    rag_request = rag_service.prepare(query, filters={"course": course} if course else None)
+    observe_prompt(rag_request.prompt.stats)
+    return rag_request
+
+def server_timing(timings: dict) -> str:
+    return ", ".join(f"{stage};dur={1000 * seconds:.2f}" for stage, seconds in timings.items())
+
+def observe_stages(timings: dict):
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+def observe_prompt(stats: dict):
+    PROMPT_TOKENS.observe(stats["system_tokens"], part="system")
+    PROMPT_TOKENS.observe(stats["context_tokens"], part="context")
+    PROMPT_TOKENS.observe(stats["prompt_tokens"], part="total")
+    PROMPT_CHUNKS.inc(stats["chunks"], outcome="used")
+    for outcome in ("below_min_score", "deduplicated", "over_budget"):
+        PROMPT_CHUNKS.inc(stats[outcome], outcome=outcome)
+
+async def wait_until_ready():
+    """
+    Holds requests that arrive while the engine is still loading, up to READY_TIMEOUT.
+    """
+    if retrieval_engine.ready:
+        return
+    loop = asyncio.get_running_loop()
+    try:
+        ready = await loop.run_in_executor(None, retrieval_engine.wait_until_ready, READY_TIMEOUT)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if not ready:
+        raise HTTPException(status_code=503, detail="Knowledge base is still loading, please retry",
+                            headers={"Retry-After": "5"})
+
+async def prepare_chat(request: ChatRequest) -> RAGRequest:
+    """
+    Validates the request and runs retrieval off the event loop. The returned RAGRequest
+    already has its answer when no LLM call is needed (cache hit, or no LLM configured).
+    """
+    if not rag_service:
         raise HTTPException(status_code=500, detail="Retrieval engine not initialized")
     
     query = request.message.strip()
     if not query:
         raise HTTPException(status_code=400, detail="Message cannot be empty")
+    await wait_until_ready()
     
-    # Retrieve context
-    context_str = retrieval_engine.retrieve_context(query, k=5)
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(loop.run_in_executor(retrieval_executor, retrieve, query, request.course),
+                                      timeout=RETRIEVAL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Retrieval timed out")
+
+@asynccontextmanager
+async def llm_slot():
+    """
+    Bounds in-flight Groq calls. Requests that cannot get a slot within LLM_QUEUE_TIMEOUT get a 503.
+    """
+    try:
+        await asyncio.wait_for(llm_semaphore.acquire(), timeout=LLM_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Server busy, please retry")
+    try:
+        with LLM_IN_FLIGHT.track():
+            yield
+    finally:
+        llm_semaphore.release()
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest, response: Response):
+    rag_request = await prepare_chat(request)
+    timings = rag_request.timings
+    
+    if rag_request.answer is None:
+        started = time.perf_counter()
+        async with llm_slot():
+            timings["llm_queue"] = time.perf_counter() - started
+            try:
+                await rag_service.agenerate(rag_request)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
+        if rag_request.usage:
+            LLM_TOKENS.inc(rag_request.usage["prompt_tokens"], kind="prompt")
+            LLM_TOKENS.inc(rag_request.usage["completion_tokens"], kind="completion")
+    
+    observe_stages(timings)
+    if TIMING_HEADER:
+        response.headers["Server-Timing"] = server_timing(timings)
+    return ChatResponse(response=rag_request.answer, prompt=rag_request.prompt.stats)
+
+def sse_event(data: dict, event: str = None) -> str:
+    """
+    Formats one server-sent event. Payloads are JSON so newlines in tokens survive framing.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Same pipeline as /chat, but forwards LLM tokens as server-sent events as soon as Groq
+    produces them: "data: {"token": ...}" per delta, then "event: done" (or "event: error").
+    """
+    rag_request = await prepare_chat(request)
+    timings = rag_request.timings
     
-    if not groq_client:
-        return ChatResponse(response=f"Retrieval only (LLM not configured):\n{context_str}")
+    def done_event() -> str:
+        observe_stages(timings)
+        data = {"cached": rag_request.cached, "prompt": rag_request.prompt.stats}
+        if TIMING_HEADER:
+            data["timings_ms"] = {stage: round(1000 * seconds, 2) for stage, seconds in timings.items()}
+        return sse_event(data, event="done")
     
-    # Generate response
-    system_prompt = """You are a friendly and knowledgeable assistant for NextLeap, an ed-tech platform that helps people transition into Product Management, UI/UX Design, Data Analytics, and other tech roles.
-
-Your personality:
-- Warm and approachable, like a helpful friend who's excited to share what they know
-- Professional but conversational - avoid being overly formal or robotic
-- Encouraging and supportive, especially when discussing career transitions
-- Clear and concise in your explanations
-
-Instructions:
-1.  You have multiple Context sources from NextLeap's course catalog.
-    - If the user asks about a SPECIFIC course (e.g., "Product Management"), focus only on that course's context.
-    - If the user asks a GENERAL question (e.g., "What courses do you offer?"), summarize from all relevant contexts.
-2.  If the retrieved context has info for multiple courses and the user's question is ambiguous, briefly clarify which course you're referring to or list options.
-3.  If the answer isn't in the context, say something like: "I don't have that specific information in my knowledge base right now. Could you ask about something else, or would you like to know more about [related topic]?"
-4.  Use a friendly, conversational tone:
-    - ✅ "Great question! The PM Fellowship runs for 16 weeks..."
-    - ✅ "You'll learn tools like Figma, SQL, and JIRA..."
-    - ❌ "The duration of the course is 16 weeks." (too formal)
-5.  Be concise but helpful - don't overwhelm with too much info at once.
-"""
+    async def event_stream():
+        if rag_request.answer is not None:
+            yield sse_event({"token": rag_request.answer})
+            yield done_event()
+            return
+        
+        try:
+            started = time.perf_counter()
+            async with llm_slot():
+                timings["llm_queue"] = time.perf_counter() - started
+                async for token in rag_service.astream(rag_request):
+                    yield sse_event({"token": token})
+        except HTTPException as e:
+            yield sse_event({"detail": e.detail}, event="error")
+            return
+        except Exception as e:
+            yield sse_event({"detail": f"Error generating response: {str(e)}"}, event="error")
+            return
+        
+        yield done_event()
     
-    user_message = f"""Context:
-{context_str}
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-User Question: {query}
-"""
+async def reload_knowledge_base(force: bool = False) -> bool:
+    """
+    Loads the new snapshot on the retrieval pool; requests keep being served from the old
+    one until the engine swaps it in.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(retrieval_executor, retrieval_engine.reload, force)
+
+async def poll_for_reload():
+    while True:
+        await asyncio.sleep(RELOAD_POLL_SECONDS)
+        if not retrieval_engine.ready:
+            continue
+        try:
+            await reload_knowledge_base()
+        except Exception as e:
+            print(f"Error checking for knowledge base updates: {e}")
+
+@app.post("/admin/reload")
+async def admin_reload(force: bool = False, x_admin_token: str = Header(None)):
+    """
+    Re-reads the knowledge base if its version changed (or always with ?force=true).
+    """
+    if ADMIN_TOKEN and x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not retrieval_engine:
+        raise HTTPException(status_code=500, detail="Retrieval engine not initialized")
+    if not retrieval_engine.ready:
+        raise HTTPException(status_code=503, detail="Knowledge base is still loading")
+    
+    reloaded = await reload_knowledge_base(force)
+    return {"reloaded": reloaded, "kb_version": retrieval_engine.kb_version,
+            "chunks": len(retrieval_engine.chunks)}
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """
+    Records latency, status and in-flight count of the chat endpoints. Streaming responses
+    are measured until their last event has been sent.
+    """
+    endpoint = request.url.path
+    if endpoint not in INSTRUMENTED_PATHS:
+        return await call_next(request)
+    
+    started = time.perf_counter()
+    REQUESTS_IN_FLIGHT.inc(endpoint=endpoint)
+    def finish(status: int):
+        REQUESTS_IN_FLIGHT.dec(endpoint=endpoint)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=str(status))
     
     try:
-        chat_completion = groq_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            model="llama-3.3-70b-versatile",
-            temperature=0.1,
-            max_tokens=1024,
-        )
-        response_text = chat_completion.choices[0].message.content
-        return ChatResponse(response=response_text)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
+        response = await call_next(request)
+    except Exception:
+        finish(500)
+        raise
+    
+    body = response.body_iterator
+    async def observed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            finish(response.status_code)
+    response.body_iterator = observed_body()
+    return response
+
+def collect_cache_metrics():
+    """
+    Copies the cache and batcher counters (kept by those classes) into the registry.
+    """
+    caches = {"response": response_cache.stats()}
+    if retrieval_engine:
+        caches["query"] = retrieval_engine.query_cache.stats()
+        if retrieval_engine.batcher:
+            batcher = retrieval_engine.batcher.stats()
+            EMBEDDING_BATCHES.set(batcher["batches"])
+            EMBEDDING_BATCH_TEXTS.set(batcher["texts"])
+    for cache, stats in caches.items():
+        CACHE_HITS.set(stats["hits"], cache=cache)
+        CACHE_MISSES.set(stats["misses"], cache=cache)
+        CACHE_HIT_RATIO.set(stats["hit_rate"], cache=cache)
+        CACHE_ENTRIES.set(stats["size"], cache=cache)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    collect_cache_metrics()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once the model and knowledge base are loaded, 503 with the current
+    loading stage until then.
+    """
+    if not retrieval_engine:
+        return JSONResponse({"ready": False, "stage": "not_started"}, status_code=503)
+    status = retrieval_engine.load_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "llm_enabled": groq_client is not None}
+    """
+    Liveness: answers as soon as the process is up, even while the engine is still loading.
+    """
+    return {
+        "status": "ok",
+        "ready": retrieval_engine.ready if retrieval_engine else False,
+        "llm_enabled": groq_client is not None,
+        "kb_version": retrieval_engine.kb_version if retrieval_engine else None,
+        "query_cache": retrieval_engine.query_cache.stats() if retrieval_engine else None,
+        "response_cache": response_cache.stats(),
+        "embedding_batcher": retrieval_engine.batcher.stats() if retrieval_engine and retrieval_engine.batcher else None,
+        "embedding_workers": retrieval_engine.embedder.stats()
+                             if retrieval_engine and isinstance(retrieval_engine.embedder, EmbeddingWorkerPool) else None,
+    }
 
 if __name__ == "__main__":
     import uvicorn
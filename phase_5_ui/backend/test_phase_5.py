@@ -0,0 +1,261 @@
+
+import unittest
+import os
+import sys
+import json
+import zlib
+import sqlite3
+import tempfile
+import numpy as np
+from types import SimpleNamespace
+from unittest import mock
+from fastapi.testclient import TestClient
+
+# Add directory to sys.path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import server
+import vector_store
+from retrieval_engine import RetrievalEngine
+from rag_service import RAGService
+
+COURSES = ["Product Management Fellowship", "UI/UX Designer Fellowship", "Data Analyst Fellowship"]
+ANSWER = "The PM Fellowship runs for 16 weeks."
+
+class WordEmbedder:
+    """
+    Model-free stand-in for SentenceTransformer: hashed bag of words, so the tests need no download.
+    """
+    def __init__(self, dim=16):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        return vectors
+
+class FakeGroq:
+    """
+    AsyncGroq-shaped client: answers with ANSWER, one stream chunk per word. fail=True raises instead.
+    """
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.fail:
+            raise RuntimeError("Groq is down")
+        if not kwargs.get("stream"):
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=ANSWER))],
+                                   usage=SimpleNamespace(prompt_tokens=120, completion_tokens=8))
+
+        async def chunks():
+            words = ANSWER.split(" ")
+            for i, word in enumerate(words):
+                content = word + " " * (i < len(words) - 1)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+        return chunks()
+
+def build_knowledge_base(db_file, embedder, num_chunks=12):
+    chunks = [{"text": f"{COURSES[i % 3]} cohort {i} runs for {12 + i} weeks",
+               "metadata": {"course": COURSES[i % 3], "type": "faq", "source": "test"}} for i in range(num_chunks)]
+    conn = sqlite3.connect(db_file)
+    vector_store.create_schema(conn)
+    with conn:
+        vector_store.bulk_insert(conn, chunks, embedder.encode([chunk["text"] for chunk in chunks]))
+        vector_store.bump_version(conn)
+    conn.close()
+    return chunks
+
+def parse_events(body: str):
+    """
+    Splits a text/event-stream body into (event, data) pairs; event is None for plain data events.
+    """
+    events = []
+    for block in body.split("\n\n"):
+        if not block:
+            continue
+        event, data = None, None
+        for line in block.split("\n"):
+            field, _, value = line.partition(": ")
+            if field == "event":
+                event = value
+            elif field == "data":
+                data = json.loads(value)
+            else:
+                raise AssertionError(f"Unexpected SSE line: {line!r}")
+        events.append((event, data))
+    return events
+
+class TestServer(unittest.TestCase):
+    """
+    Endpoint tests against an engine over a small temporary knowledge base and a fake Groq
+    client. The startup hook is not run; the module globals it would set are patched in.
+    """
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.db_file = os.path.join(self.tmp_dir.name, "kb.db")
+        self.embedder = WordEmbedder()
+        self.chunks = build_knowledge_base(self.db_file, self.embedder)
+        self.engine = RetrievalEngine(db_file=self.db_file, embedder=self.embedder, query_cache_size=0)
+        self.groq = FakeGroq()
+        server.response_cache.clear()
+        for patch in (self.serve(self.engine, self.groq), mock.patch.object(server, "ADMIN_TOKEN", None)):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = TestClient(server.app)
+
+    def serve(self, engine, llm_client):
+        """
+        Patches in the globals the startup hook would set, with the chat pipeline over engine.
+        """
+        service = RAGService(engine, llm_client=llm_client, response_cache=server.response_cache,
+                             prompt_builder=server.prompt_builder, k=3)
+        return mock.patch.multiple(server, retrieval_engine=engine, groq_client=llm_client, rag_service=service)
+
+    def test_stream_frames_tokens_then_done(self):
+        """Every token is its own data event and the stream ends with one done event."""
+        response = self.client.post("/chat/stream", json={"message": "How long is the PM fellowship?"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertTrue(response.text.endswith("\n\n"))
+
+        events = parse_events(response.text)
+        tokens = [data["token"] for event, data in events[:-1] if event is None]
+        self.assertEqual(len(tokens), len(events) - 1)
+        self.assertEqual("".join(tokens), ANSWER)
+        event, data = events[-1]
+        self.assertEqual(event, "done")
+        self.assertFalse(data["cached"])
+        self.assertGreater(data["prompt"]["context_tokens"], 0)
+        self.assertTrue(self.groq.calls[0]["stream"])
+
+        # The streamed answer was cached: one data event with the whole answer, then done
+        events = parse_events(self.client.post("/chat/stream", json={"message": "How long is the PM fellowship?"}).text)
+        self.assertEqual(events[0], (None, {"token": ANSWER}))
+        self.assertEqual(events[1][0], "done")
+        self.assertTrue(events[1][1]["cached"])
+        self.assertEqual(len(self.groq.calls), 1)
+
+    def test_stream_reports_llm_errors_as_an_event(self):
+        self.groq.fail = True
+        response = self.client.post("/chat/stream", json={"message": "What tools do I learn?"})
+        self.assertEqual(response.status_code, 200)
+        events = parse_events(response.text)
+        self.assertEqual(len(events), 1)
+        event, data = events[0]
+        self.assertEqual(event, "error")
+        self.assertIn("Error generating response", data["detail"])
+
+    def test_stream_without_llm_sends_the_context(self):
+        with self.serve(self.engine, None):
+            events = parse_events(self.client.post("/chat/stream", json={"message": "Cohorts?"}).text)
+        self.assertEqual([event for event, _ in events], [None, "done"])
+        self.assertIn("Retrieval only", events[0][1]["token"])
+
+    def test_chat_answers_and_caches(self):
+        response = self.client.post("/chat", json={"message": "How long is the PM fellowship?"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["response"], ANSWER)
+        stats = response.json()["prompt"]
+        self.assertGreater(stats["chunks"], 0)
+        self.assertEqual(stats["llm_prompt_tokens"], 120)
+        self.assertEqual(self.client.post("/chat", json={"message": "How long is the PM fellowship?"}).json()["response"],
+                         ANSWER)
+        self.assertEqual(len(self.groq.calls), 1)
+        self.assertEqual(self.client.post("/chat", json={"message": "  "}).status_code, 400)
+
+        self.groq.fail = True
+        response = self.client.post("/chat", json={"message": "What tools do I learn?"})
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("Error generating response", response.json()["detail"])
+
+    def add_chunk(self, text):
+        conn = sqlite3.connect(self.db_file)
+        with conn:
+            vector_store.bulk_insert(conn, [{"text": text, "metadata": {"course": COURSES[2], "type": "faq"}}],
+                                     self.embedder.encode([text]))
+            vector_store.bump_version(conn)
+        conn.close()
+
+    def test_admin_reload(self):
+        response = self.client.post("/admin/reload")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"reloaded": False, "kb_version": self.engine.kb_version,
+                                           "chunks": len(self.chunks)})
+        self.client.post("/chat", json={"message": "How long is the PM fellowship?"})
+
+        old_version = self.engine.kb_version
+        self.add_chunk("Data Analyst Fellowship cohort 99 starts in May")
+        body = self.client.post("/admin/reload").json()
+        self.assertTrue(body["reloaded"])
+        self.assertNotEqual(body["kb_version"], old_version)
+        self.assertEqual(body["chunks"], len(self.chunks) + 1)
+        self.assertTrue(self.client.post("/admin/reload?force=true").json()["reloaded"])
+        # Answers cached for the previous version are not served any more
+        self.client.post("/chat", json={"message": "How long is the PM fellowship?"})
+        self.assertEqual(len(self.groq.calls), 2)
+
+        with mock.patch.object(server, "ADMIN_TOKEN", "secret"):
+            self.assertEqual(self.client.post("/admin/reload").status_code, 403)
+            self.assertEqual(self.client.post("/admin/reload", headers={"X-Admin-Token": "secret"}).status_code, 200)
+
+    def test_ready_reports_loading_then_ready(self):
+        engine = RetrievalEngine(db_file=self.db_file, embedder=self.embedder, query_cache_size=0, lazy=True)
+        with self.serve(engine, self.groq):
+            response = self.client.get("/ready")
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()["stage"], "not_started")
+            self.assertEqual(self.client.post("/admin/reload").status_code, 503)
+            self.assertFalse(self.client.get("/health").json()["ready"])
+
+            engine.load(warmup=False)
+            response = self.client.get("/ready")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["stage"], "ready")
+            self.assertEqual(response.json()["chunks"], len(self.chunks))
+            self.assertTrue(self.client.get("/health").json()["ready"])
+
+        with mock.patch.object(server, "retrieval_engine", None):
+            self.assertEqual(self.client.get("/ready").status_code, 503)
+
+    def test_corrupt_database_is_never_ready(self):
+        corrupt_file = os.path.join(self.tmp_dir.name, "corrupt.db")
+        with open(corrupt_file, 'wb') as f:
+            f.write(b"not a sqlite database" * 100)
+        engine = RetrievalEngine(db_file=corrupt_file, embedder=self.embedder, query_cache_size=0, lazy=True)
+        engine.start_loading().join(timeout=10)
+        with self.serve(engine, self.groq):
+            response = self.client.get("/ready")
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.json()["stage"], "failed")
+            self.assertIn("not a database", response.json()["error"])
+            self.assertEqual(self.client.post("/chat", json={"message": "Cohorts?"}).status_code, 503)
+
+    def test_metrics_count_chat_requests(self):
+        self.client.post("/chat/stream", json={"message": "Who are the mentors?"})
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn('nextleap_requests_total{endpoint="/chat/stream",status="200"}', response.text)
+        # Streams are measured until their last event, so nothing is left in flight
+        self.assertIn('nextleap_requests_in_flight{endpoint="/chat/stream"} 0', response.text)
+        self.assertIn('nextleap_stage_seconds_count{stage="llm_first_token"}', response.text)
+        self.assertIn('nextleap_cache_entries{cache="response"}', response.text)
+
+    def test_stage_timings_are_reported(self):
+        with mock.patch.object(server, "TIMING_HEADER", True):
+            response = self.client.post("/chat", json={"message": "How long is the PM fellowship?"})
+            stages = [part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")]
+            self.assertIn("search", stages)
+            self.assertIn("llm", stages)
+            events = parse_events(self.client.post("/chat/stream", json={"message": "Which tools?"}).text)
+        self.assertIn("llm_first_token", events[-1][1]["timings_ms"])
+
+if __name__ == '__main__':
+    unittest.main()
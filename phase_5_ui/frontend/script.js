@@ -30,6 +30,20 @@ function addBotMessage(message) {
     scrollToBottom();
 }
 
+// Add an empty bot message and return its text element so streamed tokens can be appended
+function addStreamingBotMessage() {
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message bot-message';
+    const contentDiv = document.createElement('div');
+    contentDiv.className = 'message-content';
+    const textElement = document.createElement('p');
+    contentDiv.appendChild(textElement);
+    messageDiv.appendChild(contentDiv);
+    chatMessages.appendChild(messageDiv);
+    scrollToBottom();
+    return textElement;
+}
+
 // Add typing indicator
 function addTypingIndicator() {
     const typingDiv = document.createElement('div');
@@ -66,6 +80,68 @@ function escapeHtml(text) {
     return div.innerHTML;
 }
 
+// Parse one server-sent event block ("event: ...\ndata: {...}")
+function parseSseEvent(rawEvent) {
+    let event = 'message';
+    let data = '';
+    for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
+        } else if (line.startsWith('data:')) {
+            data += line.slice(5).trim();
+        }
+    }
+    return { event, data: data ? JSON.parse(data) : {} };
+}
+
+// Stream the bot response from /chat/stream, rendering tokens as they arrive
+async function streamBotResponse(message) {
+    const response = await fetch(`${API_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ message }),
+    });
+
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let textElement = null;
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const rawEvent of events) {
+            const { event, data } = parseSseEvent(rawEvent);
+            if (event === 'error') {
+                throw new Error(data.detail || 'Streaming error');
+            }
+            if (event === 'done') {
+                return;
+            }
+            if (data.token) {
+                // First token replaces the typing indicator
+                if (!textElement) {
+                    removeTypingIndicator();
+                    textElement = addStreamingBotMessage();
+                }
+                textElement.textContent += data.token;
+                scrollToBottom();
+            }
+        }
+    }
+}
+
 // Send message to backend
 async function sendMessage() {
     const message = userInput.value.trim();
@@ -83,23 +159,8 @@ async function sendMessage() {
     addTypingIndicator();
 
     try {
-        const response = await fetch(`${API_URL}/chat`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ message }),
-        });
-
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-
-        const data = await response.json();
-        
-        // Remove typing indicator and add bot response
+        await streamBotResponse(message);
         removeTypingIndicator();
-        addBotMessage(data.response);
     } catch (error) {
         console.error('Error:', error);
         removeTypingIndicator();
@@ -129,7 +190,8 @@ async function checkBackendHealth() {
     try {
         const response = await fetch(`${API_URL}/health`);
         if (response.ok) {
-            console.log('✅ Backend is running');
+            const health = await response.json();
+            console.log(health.ready ? '✅ Backend is running' : '⏳ Backend is running, knowledge base still loading');
         }
     } catch (error) {
         console.warn('⚠️ Backend not reachable. Make sure to run the backend server.');